@@ -3,6 +3,7 @@ use std::pin::Pin;
 use actix_web::{FromRequest, HttpRequest};
 use bcrypt::verify;
 use bson::{doc, oid::ObjectId};
+use hmac::{Hmac, Mac};
 use plural_core::{
     crypto::{BASE66CHARS, decode_b66},
     db::Application,
@@ -18,11 +19,14 @@ use crate::error::ErrorResponse;
 lazy_static::lazy_static! {
     static ref TOKEN_PATTERN: Regex = Regex::new(
         #[allow(clippy::uninlined_format_args)]
-        format!(r"^([{}]{{1,16}})\.([{}]{{5,8}})\.([{}]{{20,27}})$",
+        format!(r"^(v2\.)?([{}]{{1,16}})\.([{}]{{5,8}})\.([{}]{{20,27}})$",
             BASE66CHARS, BASE66CHARS, BASE66CHARS
     ).as_str()).unwrap();
 }
 
+// ? v2 tokens are stored as an hmac of the whole token, see plural/crypto.py
+const TOKEN_V2_HASH_PREFIX: &str = "hmac-sha256$";
+
 #[derive(Debug)]
 pub struct Token {
     pub app:      Application,
@@ -46,6 +50,32 @@ async fn verify_token(
     }
 }
 
+fn verify_token_v2(
+    token: &str,
+    hashed: &str
+) -> Result<(), TokenValidationError> {
+    let key = &env().token_hmac_key;
+
+    let Some(digest) = hashed
+        .strip_prefix(TOKEN_V2_HASH_PREFIX)
+        .and_then(|digest| hex::decode(digest).ok())
+    else {
+        return Err(TokenValidationError::ExpiredToken);
+    };
+
+    if key.is_empty() {
+        return Err(TokenValidationError::ExpiredToken);
+    }
+
+    let mut mac = Hmac::<Sha256>::new_from_slice(key.as_bytes())
+        .map_err(|_| TokenValidationError::ExpiredToken)?;
+
+    mac.update(token.as_bytes());
+
+    mac.verify_slice(&digest)
+        .map_err(|_| TokenValidationError::ExpiredToken)
+}
+
 impl Token {
     pub async fn new(token: String) -> Result<Self, TokenValidationError> {
         if token == env().internal_master_token {
@@ -59,11 +89,13 @@ impl Token {
             return Err(TokenValidationError::InvalidFormat);
         };
 
-        let app_id = decode_b66(captures[1].to_string().as_str());
+        let v2 = captures.get(1).is_some();
 
-        let timestamp = decode_b66(captures[2].to_string().as_str());
+        let app_id = decode_b66(captures[2].to_string().as_str());
 
-        let key = decode_b66(captures[3].to_string().as_str());
+        let timestamp = decode_b66(captures[3].to_string().as_str());
+
+        let key = decode_b66(captures[4].to_string().as_str());
 
         let redis_key = format!("token:{}", {
             let mut hasher = Sha256::new();
@@ -87,6 +119,16 @@ impl Token {
         })
         .await
         {
+            Ok(Some(app)) if v2 => {
+                // ? an hmac is cheaper to check than a round trip to redis
+                verify_token_v2(&token, &app.token)?;
+
+                app
+            }
+            Ok(Some(app)) if app.token.starts_with(TOKEN_V2_HASH_PREFIX) => {
+                // ? reset to a v2 token, this one isn't valid anymore
+                return Err(TokenValidationError::ExpiredToken);
+            }
             Ok(Some(app)) => {
                 match redis().exists(&redis_key).await {
                     Ok(true) => {}
@@ -0,0 +1,91 @@
+"""
+per-request overhead of the X-Context call-site tag
+
+    python -m bench.context --iterations 200000
+
+compares resolving the call site with getframeinfo on every request,
+the cached call site, an explicit context, and the header turned off
+"""
+from __future__ import annotations
+
+from inspect import currentframe, getframeinfo
+from argparse import ArgumentParser
+from time import perf_counter_ns
+from os.path import relpath
+from typing import TYPE_CHECKING
+
+from plural.utils import call_site
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+def getframeinfo_context() -> str:
+    # ? how request tagged every call before call sites were cached
+    frame = currentframe()
+    for _ in range(2):
+        if frame is None:
+            return 'unknown'
+
+        frame = frame.f_back
+
+    info = getframeinfo(frame)
+
+    return f'{relpath(info.filename)}:{info.lineno} {info.function}'.removeprefix('src/')
+
+
+def build_headers(
+    tag: Callable[[], str] | None,
+    context: str | None = None
+) -> dict[str, str]:
+    # ? stands in for request, so the call site is always one frame up
+    headers = {'User-Agent': 'bench'}
+
+    if tag is not None:
+        headers['X-Context'] = context or tag()
+
+    return headers
+
+
+def measure(
+    iterations: int,
+    tag: Callable[[], str] | None,
+    context: str | None = None
+) -> float:
+    st = perf_counter_ns()
+
+    for _ in range(iterations):
+        build_headers(tag, context)
+
+    return (perf_counter_ns() - st) / iterations
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--iterations', type=int, default=200_000)
+    args = parser.parse_args()
+
+    cases = {
+        'getframeinfo (before)': (getframeinfo_context, None),
+        'cached call site': (call_site, None),
+        'explicit context': (call_site, 'bench.context'),
+        'header disabled': (None, None)
+    }
+
+    # ? warm up the call site cache and any lazy imports
+    for tag, context in cases.values():
+        measure(1000, tag, context)
+
+    baseline = None
+
+    for name, (tag, context) in cases.items():
+        per_call = measure(args.iterations, tag, context)
+        baseline = baseline or per_call
+
+        print(  # noqa: T201
+            f'{name:<24}{per_call:10.0f} ns/request'
+            f'{baseline / per_call:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
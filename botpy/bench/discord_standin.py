@@ -0,0 +1,503 @@
+"""
+in-memory stand-in for the parts of the discord api /plu/ral uses
+
+point DISCORD_URL at it to benchmark or load test the bot and api without a network,
+it's only used by benchmarks and isn't part of any service
+
+    python -m bench.discord_standin --port 8900 --latency lognormal:3.4,0.5 \\
+        --route-latency 'POST /webhooks/{webhook_id}/{webhook_token}=normal:120,30' \\
+        --server-error-rate 0.002
+    DISCORD_URL=http://127.0.0.1:8900/api/v10
+
+latencies are in milliseconds, as fixed:MS, uniform:LOW,HIGH, normal:MEAN,STDDEV,
+or lognormal:MU,SIGMA (of the natural log of the latency in milliseconds)
+
+per route counts, statuses and delays are served from /_standin/stats,
+and cleared with POST /_standin/reset
+"""
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from collections import Counter
+from contextlib import suppress
+from asyncio import run, sleep, Event
+from typing import TYPE_CHECKING, Any
+from random import Random
+from time import time
+
+from aiohttp.web import (
+    Application,
+    AppRunner,
+    Response,
+    Request,
+    TCPSite
+)
+from orjson import dumps, loads
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+
+__all__ = (
+    'DiscordStandin',
+    'Latency',
+)
+
+
+DISCORD_EPOCH = 1420070400000
+
+SERVER_ERRORS = (500, 502, 503, 504)
+CLIENT_ERRORS = ((403, 50013, 'Missing Permissions'), (404, 10008, 'Unknown Message'))
+
+type Handler = Callable[[Request], Awaitable[Response]]
+
+
+@dataclass(frozen=True)
+class Latency:
+    distribution: str = 'fixed'
+    parameters: tuple[float, ...] = (0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> Latency:
+        distribution, _, parameters = spec.partition(':')
+
+        latency = cls(
+            distribution,
+            tuple(map(float, parameters.split(','))) if parameters else ()
+        )
+
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+
+        if len(latency.parameters) != expected.get(distribution):
+            raise ValueError(f'invalid latency {spec!r}')
+
+        return latency
+
+    def sample(self, random: Random) -> float:
+        """a latency in seconds, never negative"""
+        match self.distribution:
+            case 'fixed':
+                ms = self.parameters[0]
+            case 'uniform':
+                ms = random.uniform(*self.parameters)
+            case 'normal':
+                ms = random.gauss(*self.parameters)
+            case 'lognormal':
+                ms = random.lognormvariate(*self.parameters)
+            case _:
+                raise ValueError(f'unknown distribution {self.distribution!r}')
+
+        return max(ms, 0) / 1000
+
+
+@dataclass
+class RouteStats:
+    count: int = 0
+    bytes: int = 0
+    delay: float = 0
+    statuses: Counter[int] = field(default_factory=Counter)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'bytes': self.bytes,
+            'mean_delay_ms': round(self.delay / self.count * 1000, 3) if self.count else 0,
+            'statuses': {str(status): count for status, count in self.statuses.items()}
+        }
+
+
+class DiscordStandin:
+    """
+    answers every route with a plausible object after a sampled delay,
+    optionally failing a share of requests, and accounts for every
+    request per route, so benchmarks and load tests can report them
+    """
+
+    def __init__(
+        self,
+        prefix: str = '/api/v10',
+        latency: Latency | None = None,
+        route_latency: dict[str, Latency] | None = None,
+        error_rate: float = 0,
+        server_error_rate: float = 0,
+        ratelimit_rate: float = 0,
+        seed: int | None = None
+    ) -> None:
+        self.prefix = prefix
+        self.latency = latency or Latency()
+        self.route_latency = route_latency or {}
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.ratelimit_rate = ratelimit_rate
+        self.random = Random(seed)
+        self.stats: dict[str, RouteStats] = {}
+        self.webhooks: dict[str, list[dict]] = {}
+        self._increment = 0
+
+    @property
+    def requests(self) -> dict[str, int]:
+        return {
+            route: stats.count
+            for route, stats in self.stats.items()
+        }
+
+    def reset(self) -> None:
+        self.stats.clear()
+
+    def snowflake(self) -> str:
+        self._increment = (self._increment + 1) % 4096
+
+        return str(
+            (int(time() * 1000) - DISCORD_EPOCH) << 22 |
+            self._increment
+        )
+
+    @staticmethod
+    def json(data: dict | list | None, status: int = 200) -> Response:
+        if data is None:
+            return Response(status=204)
+
+        return Response(
+            body=dumps(data),
+            status=status,
+            content_type='application/json'
+        )
+
+    @staticmethod
+    async def payload(request: Request) -> dict:
+        if not request.can_read_body:
+            return {}
+
+        if request.content_type != 'multipart/form-data':
+            return loads(await request.read() or b'{}')
+
+        payload = {}
+
+        async for part in await request.multipart():
+            if part.name == 'payload_json':
+                payload = loads(await part.read())
+            else:
+                await part.read()
+
+        return payload
+
+    def message(
+        self,
+        channel_id: str,
+        payload: dict,
+        message_id: str | None = None,
+        **fields  # noqa: ANN003
+    ) -> dict:
+        return {
+            'id': message_id or self.snowflake(),
+            'type': 0,
+            'channel_id': channel_id,
+            'content': payload.get('content') or '',
+            'author': {
+                'id': fields.get('webhook_id') or '1',
+                'username': payload.get('username') or 'standin',
+                'avatar': None,
+                'bot': True},
+            'embeds': payload.get('embeds') or [],
+            'attachments': [
+                {**attachment, 'id': self.snowflake()}
+                for attachment in payload.get('attachments') or []],
+            'mentions': [],
+            'timestamp': '2025-01-01T00:00:00.000000+00:00',
+            **fields
+        }
+
+    def webhook(self, channel_id: str, name: str) -> dict:
+        webhook_id = self.snowflake()
+
+        return {
+            'id': webhook_id,
+            'type': 1,
+            'name': name,
+            'channel_id': channel_id,
+            'application_id': '1',
+            'token': f'token{webhook_id}',
+            'url': f'https://discord.com/api/webhooks/{webhook_id}/token{webhook_id}'
+        }
+
+    async def create_message(self, request: Request) -> Response:
+        return self.json(self.message(
+            request.match_info['channel_id'],
+            await self.payload(request)))
+
+    async def edit_message(self, request: Request) -> Response:
+        return self.json(self.message(
+            request.match_info['channel_id'],
+            await self.payload(request),
+            request.match_info['message_id']))
+
+    async def get_message(self, request: Request) -> Response:
+        return self.json(self.message(
+            request.match_info.get('channel_id', '1'),
+            {},
+            request.match_info['message_id']))
+
+    async def no_content(self, _request: Request) -> Response:
+        return self.json(None)
+
+    async def get_webhooks(self, request: Request) -> Response:
+        return self.json(self.webhooks.get(request.match_info['channel_id'], []))
+
+    async def create_webhook(self, request: Request) -> Response:
+        channel_id = request.match_info['channel_id']
+        webhook = self.webhook(
+            channel_id,
+            (await self.payload(request)).get('name', 'webhook'))
+
+        self.webhooks.setdefault(channel_id, []).append(webhook)
+
+        return self.json(webhook)
+
+    async def execute_webhook(self, request: Request) -> Response:
+        message = self.message(
+            request.query.get('thread_id', '1'),
+            await self.payload(request),
+            webhook_id=request.match_info['webhook_id'])
+
+        return self.json(
+            message
+            if request.query.get('wait') == 'true' else
+            None)
+
+    async def edit_webhook_message(self, request: Request) -> Response:
+        return self.json(self.message(
+            request.query.get('thread_id', '1'),
+            await self.payload(request),
+            request.match_info['message_id'],
+            webhook_id=request.match_info['webhook_id']))
+
+    async def create_emoji(self, request: Request) -> Response:
+        payload = await self.payload(request)
+
+        return self.json({
+            'id': self.snowflake(),
+            'name': payload.get('name', 'emoji'),
+            'animated': payload.get('image', '').startswith('data:image/gif'),
+            'available': True
+        })
+
+    async def get_attachment(self, request: Request) -> Response:
+        return Response(
+            body=b'\0' * int(request.query.get('size', '1024')),
+            content_type='application/octet-stream'
+        )
+
+    async def get_emojis(self, _request: Request) -> Response:
+        return self.json({'items': []})
+
+    async def command(self, request: Request) -> Response:
+        payload = await self.payload(request)
+
+        return self.json({
+            **payload,
+            'id': request.match_info.get('command_id') or self.snowflake(),
+            'application_id': request.match_info['application_id'],
+            'version': self.snowflake()
+        })
+
+    async def overwrite_commands(self, request: Request) -> Response:
+        return self.json([
+            {
+                **command,
+                'id': self.snowflake(),
+                'application_id': request.match_info['application_id'],
+                'version': self.snowflake()}
+            for command in await self.payload(request) or []
+        ])
+
+    async def get_commands(self, _request: Request) -> Response:
+        return self.json([])
+
+    async def interaction_callback(self, request: Request) -> Response:
+        payload = await self.payload(request)
+
+        if request.query.get('with_response') != 'true':
+            return self.json(None)
+
+        return self.json({
+            'interaction': {
+                'id': request.match_info['interaction_id'],
+                'type': 2},
+            'resource': {
+                'type': payload.get('type'),
+                'message': self.message('1', payload.get('data') or {})}
+        })
+
+    async def refresh_urls(self, request: Request) -> Response:
+        return self.json({
+            'refreshed_urls': [
+                {'original': url, 'refreshed': url}
+                for url in (await self.payload(request)).get('attachment_urls', [])]
+        })
+
+    async def get_stats(self, _request: Request) -> Response:
+        return self.json({
+            route: stats.as_dict()
+            for route, stats in sorted(self.stats.items())
+        })
+
+    async def reset_stats(self, _request: Request) -> Response:
+        self.reset()
+        return self.json(None)
+
+    async def unknown(self, request: Request) -> Response:
+        # ? accounted by path, so benchmarks show what's missing
+        stats = self.stats.setdefault(
+            f'{request.method} {request.path} (no stand-in)', RouteStats())
+        stats.count += 1
+        stats.statuses[404] += 1
+
+        return self.json(
+            {'message': f'no stand-in for {request.method} {request.path}', 'code': 0},
+            404)
+
+    @property
+    def routes(self) -> list[tuple[str, str, Handler]]:
+        return [
+            ('POST', '/channels/{channel_id}/messages', self.create_message),
+            ('GET', '/channels/{channel_id}/messages/{message_id}', self.get_message),
+            ('PATCH', '/channels/{channel_id}/messages/{message_id}', self.edit_message),
+            ('DELETE', '/channels/{channel_id}/messages/{message_id}', self.no_content),
+            ('GET', '/channels/{channel_id}/webhooks', self.get_webhooks),
+            ('POST', '/channels/{channel_id}/webhooks', self.create_webhook),
+            ('POST', '/webhooks/{webhook_id}/{webhook_token}', self.execute_webhook),
+            ('GET', '/webhooks/{webhook_id}/{webhook_token}/messages/{message_id}', self.get_message),
+            ('PATCH', '/webhooks/{webhook_id}/{webhook_token}/messages/{message_id}', self.edit_webhook_message),
+            ('DELETE', '/webhooks/{webhook_id}/{webhook_token}/messages/{message_id}', self.no_content),
+            ('GET', '/applications/{application_id}/emojis', self.get_emojis),
+            ('POST', '/applications/{application_id}/emojis', self.create_emoji),
+            ('DELETE', '/applications/{application_id}/emojis/{emoji_id}', self.no_content),
+            ('GET', '/applications/{application_id}/commands', self.get_commands),
+            ('PUT', '/applications/{application_id}/commands', self.overwrite_commands),
+            ('POST', '/applications/{application_id}/commands', self.command),
+            ('PATCH', '/applications/{application_id}/commands/{command_id}', self.command),
+            ('DELETE', '/applications/{application_id}/commands/{command_id}', self.no_content),
+            ('POST', '/interactions/{interaction_id}/{interaction_token}/callback', self.interaction_callback),
+            ('POST', '/attachments/refresh-urls', self.refresh_urls)
+        ]
+
+    def app(self) -> Application:
+        app = Application(client_max_size=64 * 1024 * 1024)
+
+        for method, path, handler in self.routes:
+            app.router.add_route(method, f'{self.prefix}{path}', self._counted(handler))
+
+        # ? served outside the prefix, so attachment urls in recorded events can point here
+        app.router.add_get('/attachments/{path:.*}', self._counted(self.get_attachment))
+        app.router.add_get('/_standin/stats', self.get_stats)
+        app.router.add_post('/_standin/reset', self.reset_stats)
+        app.router.add_route('*', '/{path:.*}', self.unknown)
+
+        return app
+
+    def _injected_error(self) -> Response | None:
+        roll = self.random.random()
+
+        if roll < self.ratelimit_rate:
+            return self.json({
+                'message': 'You are being rate limited.',
+                'retry_after': round(self.random.uniform(0.1, 2), 3),
+                'global': False}, 429)
+
+        roll -= self.ratelimit_rate
+
+        if roll < self.server_error_rate:
+            return Response(
+                text='upstream connect error',
+                status=self.random.choice(SERVER_ERRORS))
+
+        roll -= self.server_error_rate
+
+        if roll < self.error_rate:
+            status, code, message = self.random.choice(CLIENT_ERRORS)
+            return self.json({'message': message, 'code': code}, status)
+
+        return None
+
+    def _counted(self, handler: Handler) -> Handler:
+        async def counted(request: Request) -> Response:
+            route = (
+                f'{request.method} '
+                f'{request.match_info.route.resource.canonical.removeprefix(self.prefix)}')
+
+            stats = self.stats.setdefault(route, RouteStats())
+            stats.count += 1
+            stats.bytes += request.content_length or 0
+
+            delay = self.route_latency.get(route, self.latency).sample(self.random)
+            stats.delay += delay
+
+            if delay:
+                await sleep(delay)
+
+            response = self._injected_error() or await handler(request)
+            stats.statuses[response.status] += 1
+
+            return response
+
+        return counted
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> AppRunner:
+        """start serving, `port` 0 picks a free port, see `url`"""
+        runner = AppRunner(self.app(), access_log=None)
+        await runner.setup()
+
+        await TCPSite(runner, host, port).start()
+
+        self.host, self.port = runner.addresses[0][:2]
+
+        return runner
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}{self.prefix}'
+
+
+async def _serve(standin: DiscordStandin, host: str, port: int) -> None:
+    runner = await standin.start(host, port)
+
+    print(f'discord stand-in listening on {standin.url}')  # noqa: T201
+
+    try:
+        await Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--prefix', default='/api/v10')
+    parser.add_argument('--latency', type=Latency.parse, default=Latency())
+    parser.add_argument(
+        '--route-latency', action='append', default=[], metavar='"METHOD PATH=LATENCY"',
+        help='latency for a single route, as reported in /_standin/stats')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of 403 and 404 responses')
+    parser.add_argument('--server-error-rate', type=float, default=0, help='share of 5xx responses')
+    parser.add_argument('--ratelimit-rate', type=float, default=0, help='share of 429 responses')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    standin = DiscordStandin(
+        args.prefix,
+        args.latency,
+        {
+            route: Latency.parse(spec)
+            for route, _, spec in (
+                option.rpartition('=')
+                for option in args.route_latency)},
+        args.error_rate,
+        args.server_error_rate,
+        args.ratelimit_rate,
+        args.seed
+    )
+
+    with suppress(KeyboardInterrupt):
+        run(_serve(standin, args.host, args.port))
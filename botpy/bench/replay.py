@@ -0,0 +1,401 @@
+"""
+replay recorded discord_events through the bot, against a local redis and mongo
+and a discord stand-in, and report throughput and latency percentiles
+
+    python -m bench.replay capture --redis-url redis://prod:6379 --count 5000 events.jsonl
+    python -m bench.replay run events.jsonl --fixture fixture.json --output results.json
+    python -m bench.replay run events.jsonl --fixture fixture.json --baseline baseline.json
+
+events are one stream entry per line, {"id": "...", "data": {...gateway event...}}
+
+the fixture seeds both databases before the replay, they have to be empty,
+or with --wipe every existing key and document in them is removed first.
+the bot always uses the plural mongo database, so point --mongo-url at a
+separate mongo from the one you develop against
+{
+    "mongo": {"<collection>": [<documents, as mongo extended json>]},
+    "redis": {
+        "json": {"<key>": <value>},
+        "sets": {"<key>": [<members>]},
+        "strings": {"<key>": "<value>"}
+    }
+}
+
+with --baseline, the exit code is 1 when throughput drops or any p95
+grows by more than --tolerance, so it can be used to gate ci
+"""
+from __future__ import annotations
+
+from asyncio import create_task, run, sleep
+from argparse import ArgumentParser, Namespace
+from statistics import quantiles
+from urllib.parse import urlparse
+from time import perf_counter, time_ns
+from contextlib import suppress
+from typing import Any
+from pathlib import Path
+from os import environ
+from sys import exit
+
+from orjson import dumps, loads, OPT_INDENT_2
+
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+# ? a valid looking token, nothing is sent to discord
+BENCH_TOKEN = 'MTAwMDAwMDAwMDAwMDAwMDAw.GAAAAA.' + 'a' * 38
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(durations: list[float]) -> dict[str, float]:
+    if len(durations) < 2:
+        return {
+            'count': len(durations),
+            **{f'p{p}': round(durations[0] if durations else 0, 4) for p in PERCENTILES}
+        }
+
+    cuts = quantiles(durations, n=100, method='inclusive')
+
+    return {
+        'count': len(durations),
+        **{f'p{p}': round(cuts[p - 1], 4) for p in PERCENTILES}
+    }
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float
+) -> list[str]:
+    regressions = []
+
+    if results['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(
+            f'throughput {baseline['throughput']:.1f} -> {results['throughput']:.1f} events/s')
+
+    for section in ('event_types', 'stages'):
+        for name, summary in results[section].items():
+            if (previous := baseline[section].get(name)) is None:
+                continue
+
+            # ? sub-millisecond stages are mostly noise
+            if summary['p95'] > max(previous['p95'] * (1 + tolerance), previous['p95'] + 1):
+                regressions.append(
+                    f'{section[:-1].replace('_', ' ')} {name} p95 '
+                    f'{previous['p95']:.2f} -> {summary['p95']:.2f} ms')
+
+    return regressions
+
+
+def print_results(results: dict[str, Any]) -> None:
+    lines = [
+        f'{results['events']} events in {results['duration']:.2f}s '
+        f'({results['throughput']:.1f} events/s)'
+    ]
+
+    for section in ('event_types', 'stages'):
+        lines.append(f'\n{section.replace('_', ' ')}'.ljust(28) + ''.join(
+            f'p{p}'.rjust(10) for p in PERCENTILES) + 'count'.rjust(8))
+
+        for name, summary in sorted(results[section].items()):
+            lines.append(f'  {name}'.ljust(28) + ''.join(
+                f'{summary[f'p{p}']:10.2f}' for p in PERCENTILES
+            ) + f'{summary['count']:8}')
+
+    lines.append('\ndiscord requests')
+    lines.extend(
+        f'  {route}'.ljust(70) + f'{count:8}'
+        for route, count in sorted(results['discord_requests'].items())
+    )
+
+    print('\n'.join(lines))  # noqa: T201
+
+
+def read_events(path: Path) -> list[tuple[str, dict]]:
+    events = []
+
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+
+        entry = loads(line)
+        data = entry['data']
+
+        events.append((
+            entry['id'],
+            loads(data) if isinstance(data, str) else data
+        ))
+
+    return events
+
+
+async def seed(fixture: dict, wipe: bool) -> None:
+    from bson.json_util import loads as bson_loads
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from plural.env import env
+    from plural.db import redis
+
+    client = AsyncIOMotorClient(env.mongo_url)
+
+    if wipe:
+        await redis.flushdb()
+        await client.drop_database('plural')
+    elif (
+        await redis.dbsize() or
+        await client['plural'].list_collection_names()
+    ):
+        raise SystemExit(
+            'refusing to seed over existing data, pass --wipe to remove '
+            'everything in the redis db and the plural mongo database first')
+
+    pipeline = redis.pipeline()
+
+    for key, value in fixture.get('redis', {}).get('json', {}).items():
+        pipeline.json().set(key, '$', value)
+
+    for key, members in fixture.get('redis', {}).get('sets', {}).items():
+        pipeline.sadd(key, *members)
+
+    for key, value in fixture.get('redis', {}).get('strings', {}).items():
+        pipeline.set(key, value)
+
+    await pipeline.execute()
+
+    for collection, documents in fixture.get('mongo', {}).items():
+        if documents:
+            await client['plural'][collection].insert_many(
+                bson_loads(dumps(documents)))
+
+
+def init_bench_otel() -> None:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.trace import set_tracer_provider
+
+    import plural.otel
+
+    # ? spans are still created, but never exported
+    plural.otel.otel_resource = Resource({'service.name': 'bot-bench'})
+    set_tracer_provider(TracerProvider(resource=plural.otel.otel_resource))
+
+
+async def replay(args: Namespace) -> dict[str, Any]:
+    from bench.discord_standin import DiscordStandin, Latency
+
+    standin = DiscordStandin(
+        latency=Latency.parse(args.discord_latency),
+        seed=0
+    )
+    runner = await standin.start()
+
+    # ? env is read on import, so nothing from plural or src is imported before this
+    environ['DISCORD_URL'] = standin.url
+    environ['REDIS_URL'] = args.redis_url
+    environ['MONGO_URL'] = args.mongo_url
+    environ.setdefault('BOT_TOKEN', BENCH_TOKEN)
+    environ.setdefault('DOMAIN', 'localhost')
+    environ.setdefault('MAX_AVATAR_SIZE', '8388608')
+    environ.setdefault('CDN_UPLOAD_TOKEN', 'bench')
+    environ.setdefault('DEV', '0')
+
+    init_bench_otel()
+
+    from plural.db.invalidation import invalidation_listener
+    from plural.db.buffer import flush_buffers
+    from plural.db import redis_init, mongo_init
+
+    await redis_init()
+
+    await seed(
+        loads(args.fixture.read_bytes()) if args.fixture else {},
+        args.wipe
+    )
+
+    await mongo_init()
+
+    from src.logclean import LOGCLEAN_GUILDS
+    from src.consumer import EventConsumer
+    from src.webhooks import WEBHOOKS
+    from src.listener import on_event
+    from src.logic import ProxyStages
+    from src.roller import ROLL_POOL
+    from src.http import GENERAL_SESSION, DISCORD
+
+    ROLL_POOL.start()
+    invalidations = create_task(invalidation_listener())
+
+    await WEBHOOKS.prewarm()
+    await LOGCLEAN_GUILDS.load()
+
+    events = read_events(args.events)
+    warmup, events = events[:args.warmup], events[args.warmup:]
+
+    if not events:
+        raise ValueError('no events left to replay after warmup')
+
+    event_types: dict[str, list[float]] = {}
+    stages: dict[str, list[float]] = {}
+    recording = False
+
+    def observe_stages(durations: dict[str, float]) -> None:
+        if recording:
+            for name, duration in durations.items():
+                stages.setdefault(name, []).append(duration)
+
+    ProxyStages.observers.append(observe_stages)
+
+    async def handler(redis_id: str, event: dict, start_time: int) -> None:
+        st = perf_counter()
+
+        try:
+            await on_event(redis_id, event, start_time)
+        finally:
+            if recording:
+                event_types.setdefault(event['t'], []).append(
+                    (perf_counter() - st) * 1000)
+
+    async def drive(entries: list[tuple[str, dict]]) -> None:
+        consumer = EventConsumer(
+            handler,
+            args.concurrency,
+            args.concurrency + args.batch_size
+        )
+
+        for redis_id, event in entries:
+            await consumer.wait_for_capacity()
+            consumer.submit(redis_id, event, time_ns())
+
+        await consumer.join()
+
+    try:
+        await drive(warmup)
+        await flush_buffers()
+
+        standin.reset()
+        recording = True
+
+        st = perf_counter()
+        await drive(events)
+        duration = perf_counter() - st
+
+        recording = False
+        await flush_buffers()
+    finally:
+        ProxyStages.observers.remove(observe_stages)
+        invalidations.cancel()
+        ROLL_POOL.shutdown()
+
+        # ? let background emoji and webhook tasks settle before closing sessions
+        await sleep(0.1)
+
+        with suppress(Exception):
+            await GENERAL_SESSION.close()
+            await DISCORD.close()
+
+        await runner.cleanup()
+
+    return {
+        'events': len(events),
+        'duration': round(duration, 4),
+        'throughput': round(len(events) / duration, 2),
+        'concurrency': args.concurrency,
+        'event_types': {
+            name: summarize(durations)
+            for name, durations in event_types.items()},
+        'stages': {
+            name: summarize(durations)
+            for name, durations in stages.items()},
+        'discord_requests': standin.requests
+    }
+
+
+async def capture(args: Namespace) -> None:
+    from redis.asyncio import Redis
+
+    redis = Redis.from_url(args.redis_url, decode_responses=True)
+
+    try:
+        entries = await redis.xrevrange('discord_events', count=args.count)
+    finally:
+        await redis.aclose()
+
+    args.events.write_bytes(b''.join(
+        dumps({'id': redis_id, 'data': loads(fields['data'])}) + b'\n'
+        for redis_id, fields in reversed(entries)
+    ))
+
+    print(f'captured {len(entries)} events to {args.events}')  # noqa: T201
+
+
+def check_local(args: Namespace) -> None:
+    for url in (args.redis_url, args.mongo_url):
+        if urlparse(url).hostname not in LOCAL_HOSTS and not args.allow_remote:
+            raise SystemExit(
+                f'refusing to use {url}, pass --allow-remote if this is a throwaway database')
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    capture_parser = commands.add_parser('capture', help='save recent stream entries to a file')
+    capture_parser.add_argument('events', type=Path)
+    capture_parser.add_argument('--redis-url', default=environ.get('REDIS_URL', 'redis://localhost:6379'))
+    capture_parser.add_argument('--count', type=int, default=1000)
+
+    run_parser = commands.add_parser('run', help='replay captured events and report latencies')
+    run_parser.add_argument('events', type=Path)
+    run_parser.add_argument('--fixture', type=Path)
+    run_parser.add_argument('--redis-url', default='redis://localhost:6379/15')
+    run_parser.add_argument('--mongo-url', default='mongodb://localhost:27017')
+    run_parser.add_argument('--allow-remote', action='store_true')
+    run_parser.add_argument(
+        '--wipe', action='store_true',
+        help='remove everything in both databases before seeding, instead of requiring them to be empty')
+    run_parser.add_argument('--concurrency', type=int, default=32)
+    run_parser.add_argument('--batch-size', type=int, default=32)
+    run_parser.add_argument(
+        '--discord-latency', default='fixed:0',
+        help='stand-in latency, see python -m bench.discord_standin --help')
+    run_parser.add_argument('--warmup', type=int, default=0, help='events replayed before measuring')
+    run_parser.add_argument('--output', type=Path, help='write results as json, to use as a baseline')
+    run_parser.add_argument('--baseline', type=Path)
+    run_parser.add_argument('--tolerance', type=float, default=0.15)
+
+    args = parser.parse_args()
+
+    if args.command == 'capture':
+        run(capture(args))
+        return
+
+    check_local(args)
+
+    results = run(replay(args))
+
+    print_results(results)
+
+    if args.output is not None:
+        args.output.write_bytes(dumps(results, option=OPT_INDENT_2))
+
+    if args.baseline is None:
+        return
+
+    if regressions := compare(
+        results,
+        loads(args.baseline.read_bytes()),
+        args.tolerance
+    ):
+        print('\nregressions against baseline:')  # noqa: T201
+        print('\n'.join(f'  {regression}' for regression in regressions))  # noqa: T201
+        exit(1)
+
+    print('\nno regressions against baseline')  # noqa: T201
+
+
+if __name__ == '__main__':
+    from uvloop import EventLoopPolicy
+    from asyncio import set_event_loop_policy
+
+    set_event_loop_policy(EventLoopPolicy())
+
+    main()
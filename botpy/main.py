@@ -19,9 +19,9 @@ async def main() -> None:
             event_listener(),
             start_healthcheck())
     except BaseException as e:
-        from src.http import GENERAL_SESSION, DISCORD_SESSION
+        from src.http import GENERAL_SESSION, DISCORD
         await GENERAL_SESSION.close()
-        await DISCORD_SESSION.close()
+        await DISCORD.close()
         raise e
 
 
@@ -5,23 +5,29 @@ from contextlib import suppress
 from traceback import print_exc
 from time import time_ns
 
+from orjson import loads
 from redis import ResponseError
 from aiohttp.web import (
     Application,
     AppRunner,
     Response,
     Request,
-    TCPSite
+    TCPSite,
+    json_response
 )
 
 from plural.db import redis_init, mongo_init
 from plural.env import INSTANCE
 from plural.otel import span
 
+from .consumer import EventConsumer
+from .models import env
+
 
 READY = False
 SHUTDOWN = False
 RUNNING: set[Task] = set()
+CONSUMER: EventConsumer | None = None
 
 
 def create_strong_task(coroutine: Coroutine) -> Task:
@@ -40,7 +46,7 @@ def shutdown() -> None:
 
 
 async def event_listener() -> None:
-    global READY, SHUTDOWN
+    global READY, SHUTDOWN, CONSUMER
     with span(f'initializing bot instance {INSTANCE}'):
         await redis_init()
         await mongo_init()
@@ -48,12 +54,26 @@ async def event_listener() -> None:
     for signal in (SIGINT, SIGTERM):
         get_event_loop().add_signal_handler(signal, shutdown)
 
+    from plural.db.invalidation import invalidation_listener
+    from plural.db.buffer import flush_buffers
     from plural.db import redis
 
+    from .emojis import emoji_reconciler
+    from .cache import cache_tracking
     from .listener import on_event
-    from .logic import emoji_index_init
+    from .webhooks import WEBHOOKS
+    from .logclean import LOGCLEAN_GUILDS
+    from .roller import ROLL_POOL
+
+    ROLL_POOL.start()
+
+    await gather(
+        WEBHOOKS.prewarm(),
+        LOGCLEAN_GUILDS.load())
 
-    await emoji_index_init()
+    invalidations = create_task(invalidation_listener())
+    tracking = create_task(cache_tracking()) if env.cache_tracking else None
+    reconciler = create_task(emoji_reconciler())
 
     with suppress(ResponseError):
         await redis.xgroup_create(
@@ -63,15 +83,25 @@ async def event_listener() -> None:
             mkstream=True
         )
 
+    CONSUMER = EventConsumer(
+        on_event,
+        env.event_concurrency,
+        env.event_concurrency + env.event_batch_size
+    )
+
     READY = True
 
     while not SHUTDOWN:
         try:
+            # ? don't read more than we can start soon, anything left
+            # ? in the stream can be picked up by another instance
+            await CONSUMER.wait_for_capacity()
+
             data = await redis.xreadgroup(
                 groupname='plural_consumers',
                 consumername='plural_worker',
                 streams={'discord_events': '>'},
-                count=1,
+                count=min(env.event_batch_size, CONSUMER.capacity),
                 block=2500,
             )
 
@@ -79,7 +109,7 @@ async def event_listener() -> None:
                 continue
 
             for key, event in data[0][1]:
-                await create_strong_task(on_event(key, event['data'], start_time=time_ns()))
+                CONSUMER.submit(key, loads(event['data']), time_ns())
         except ResponseError:
             # ? redis may have restarted and lost the stream
             await redis.xgroup_create(
@@ -92,14 +122,30 @@ async def event_listener() -> None:
                 current_span.record_exception(e)
                 print_exc()
 
+    if CONSUMER.in_flight or CONSUMER.backlog:
+        print(  # noqa: T201
+            f'Waiting for {CONSUMER.in_flight + CONSUMER.backlog} events to finish...')
+
+    await CONSUMER.join()
+
     if RUNNING:
         print(f'Waiting for {len(RUNNING)} tasks to finish...')  # noqa: T201
 
     await gather(*RUNNING)
 
-    from src.http import GENERAL_SESSION, DISCORD_SESSION
+    await flush_buffers()
+
+    invalidations.cancel()
+    reconciler.cancel()
+
+    if tracking is not None:
+        tracking.cancel()
+
+    ROLL_POOL.shutdown()
+
+    from src.http import GENERAL_SESSION, DISCORD
     await GENERAL_SESSION.close()
-    await DISCORD_SESSION.close()
+    await DISCORD.close()
 
 
 async def healthcheck(
@@ -109,9 +155,28 @@ async def healthcheck(
     return Response(status=204 if READY else 503)
 
 
+async def consumer_stats(
+    _request: Request
+) -> Response:
+    if CONSUMER is None:
+        return Response(status=503)
+
+    return json_response(CONSUMER.stats)
+
+
+async def cache_stats(
+    _request: Request
+) -> Response:
+    from .cache import LOCAL_CACHE
+
+    return json_response(LOCAL_CACHE.stats)
+
+
 async def start_healthcheck() -> None:
     app = Application()
     app.router.add_get('/healthcheck', healthcheck)
+    app.router.add_get('/healthcheck/consumer', consumer_stats)
+    app.router.add_get('/healthcheck/cache', cache_stats)
 
     runner = AppRunner(app)
     await runner.setup()
@@ -1,13 +1,177 @@
+from __future__ import annotations
+
+from asyncio import TaskGroup, sleep
+from collections import OrderedDict
 from dataclasses import dataclass
-from datetime import timedelta
-from typing import Self
-from time import time
+from traceback import print_exc
+from typing import TYPE_CHECKING, Self
+from time import monotonic
 
 from plural.db import redis
 
+from .models import env
+
+if TYPE_CHECKING:
+    from datetime import timedelta
+
+    from redis.asyncio.connection import AbstractConnection
+
+
+TRACKING_TTL = 60
+TRACKING_KEEPALIVE = 30
+TRACKING_PREFIX = 'discord:'
+INVALIDATE_CHANNEL = '__redis__:invalidate'
+
+
+class LocalCache:
+    """
+    bounded lru of redis json values, each fresh for `ttl` seconds
+
+    while redis client tracking is running, entries are dropped as soon
+    as redis invalidates the key, so they're kept for `TRACKING_TTL` instead
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.tracking = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+
+    @property
+    def stats(self) -> dict[str, int | bool]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'tracking': self.tracking
+        }
+
+    def get(self, key: str) -> tuple[bool, dict | None]:
+        if (entry := self._entries.get(key)) is None:
+            self.misses += 1
+            return False, None
+
+        expires_at, data = entry
+
+        if expires_at < monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, data
+
+    def set(
+        self,
+        key: str,
+        data: dict | None,
+        invalidations: int | None = None
+    ) -> None:
+        """
+        `invalidations` is the count from before the value was read,
+        if anything was invalidated since then, the value may be stale
+        """
+        tracked = self.tracking and (
+            invalidations is None or
+            invalidations == self.invalidations)
+
+        self._entries[key] = (
+            monotonic() + (TRACKING_TTL if tracked else self.ttl),
+            data
+        )
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self.invalidations += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.invalidations += 1
+        self._entries.clear()
+
 
-# ? i'm so good at names
-_cache_cache: dict[str, tuple[float, dict | None]] = {}
+LOCAL_CACHE = LocalCache(env.cache_max_entries, env.cache_ttl)
+
+
+async def _listen(listener: AbstractConnection) -> None:
+    while True:
+        kind, _, keys = await listener.read_response()
+
+        if kind != 'message':
+            continue
+
+        # ? keys is null when redis was flushed
+        if keys is None:
+            LOCAL_CACHE.clear()
+            continue
+
+        for key in keys:
+            LOCAL_CACHE.invalidate(key)
+
+
+async def _keepalive(tracker: AbstractConnection) -> None:
+    # ? tracking stops silently if this connection is closed
+    while True:
+        await sleep(TRACKING_KEEPALIVE)
+        await tracker.send_command('PING')
+        await tracker.read_response()
+
+
+async def cache_tracking() -> None:
+    """
+    redis client side caching in broadcast mode,
+    invalidations are redirected to a separate subscribed connection
+    """
+    pool = redis.connection_pool
+
+    while True:
+        listener = pool.connection_class(**pool.connection_kwargs)
+        tracker = pool.connection_class(**pool.connection_kwargs)
+
+        try:
+            await listener.connect()
+            await tracker.connect()
+
+            await listener.send_command('CLIENT', 'ID')
+            client_id = await listener.read_response()
+
+            await listener.send_command('SUBSCRIBE', INVALIDATE_CHANNEL)
+            await listener.read_response()
+
+            await tracker.send_command(
+                'CLIENT', 'TRACKING', 'ON',
+                'REDIRECT', client_id,
+                'BCAST', 'PREFIX', TRACKING_PREFIX)
+            await tracker.read_response()
+
+            LOCAL_CACHE.tracking = True
+
+            async with TaskGroup() as group:
+                group.create_task(_listen(listener))
+                group.create_task(_keepalive(tracker))
+        except Exception:  # noqa: BLE001
+            print_exc()
+        finally:
+            # ? anything cached while tracking may already be stale
+            LOCAL_CACHE.tracking = False
+            LOCAL_CACHE.clear()
+
+            await listener.disconnect()
+            await tracker.disconnect()
+
+        await sleep(1)
 
 
 @dataclass
@@ -23,10 +187,16 @@ class Cache:
 
     @classmethod
     async def get(cls, key: str, force_fetch: bool = False) -> Self | None:
-        timestamp, data = _cache_cache.get(key, (0, {}))
-        if force_fetch or timestamp < time() - 0.200:
+        found, data = (
+            LOCAL_CACHE.get(key)
+            if not force_fetch else
+            (False, None))
+
+        if not found:
+            invalidations = LOCAL_CACHE.invalidations
             data = await redis.json().get(key)
-            _cache_cache[key] = (time(), data)
+            LOCAL_CACHE.set(key, data, invalidations)
+
         return cls(**data) if data is not None else None
 
     async def fetch_meta(self, key: str, parent: str = 'guild') -> list[Self]:
@@ -54,6 +224,6 @@ class Cache:
 
         await pipeline.execute()
 
-        _cache_cache[key] = (time(), self.__dict__)
+        LOCAL_CACHE.set(key, self.__dict__)
 
         return self
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from asyncio import Event, Semaphore, Task, create_task
+from collections import deque
+from traceback import print_exc
+from typing import TYPE_CHECKING
+
+from plural.otel import span
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine
+
+
+type EventHandler = Callable[[str, dict, int], Coroutine]
+
+
+class EventConsumer:
+    """
+    runs stream events concurrently, up to `concurrency` at a time,
+    while events that share a channel are still handled in the order
+    they were read from the stream
+    """
+
+    def __init__(
+        self,
+        handler: EventHandler,
+        concurrency: int,
+        max_backlog: int
+    ) -> None:
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_backlog = max_backlog
+        self.in_flight = 0
+        self.backlog = 0
+        self._semaphore = Semaphore(concurrency)
+        self._queues: dict[str, deque[tuple[str, dict, int]]] = {}
+        self._tasks: set[Task] = set()
+        self._capacity = Event()
+        self._capacity.set()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.max_backlog - self.backlog, 0)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'in_flight': self.in_flight,
+            'backlog': self.backlog,
+            'channels': len(self._queues),
+            'concurrency': self.concurrency
+        }
+
+    @staticmethod
+    def ordering_key(redis_id: str, event: dict) -> str:
+        # ? events without a channel have nothing to be ordered against
+        channel_id = (event.get('d') or {}).get('channel_id')
+
+        return (
+            f'channel:{channel_id}'
+            if channel_id is not None else
+            f'event:{redis_id}'
+        )
+
+    async def wait_for_capacity(self) -> None:
+        await self._capacity.wait()
+
+    def submit(
+        self,
+        redis_id: str,
+        event: dict,
+        start_time: int
+    ) -> None:
+        key = self.ordering_key(redis_id, event)
+
+        self.backlog += 1
+
+        if self.backlog >= self.max_backlog:
+            self._capacity.clear()
+
+        if (queue := self._queues.get(key)) is not None:
+            queue.append((redis_id, event, start_time))
+            return
+
+        self._queues[key] = deque([(redis_id, event, start_time)])
+
+        task = create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: str) -> None:
+        queue = self._queues[key]
+
+        try:
+            while queue:
+                redis_id, event, start_time = queue.popleft()
+
+                async with self._semaphore:
+                    self.backlog -= 1
+                    self.in_flight += 1
+
+                    if self.backlog < self.max_backlog:
+                        self._capacity.set()
+
+                    try:
+                        await self.handler(redis_id, event, start_time)
+                    except Exception as e:  # noqa: BLE001
+                        with span('proxy error') as current_span:
+                            current_span.record_exception(e)
+                            print_exc()
+                    finally:
+                        self.in_flight -= 1
+        finally:
+            del self._queues[key]
+
+    async def join(self) -> None:
+        while self._tasks:
+            for task in list(self._tasks):
+                await task
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+from datetime import datetime, UTC
+from collections import OrderedDict
+from asyncio import Task, create_task, gather
+
+from pydantic import BaseModel, PrivateAttr
+from beanie import PydanticObjectId  # noqa: TC002
+
+from plural.db.invalidation import on_invalidate, track_derived
+from plural.db import (
+    ProxyMember,
+    Usergroup,
+    Autoproxy,
+    Group,
+    redis
+)
+
+from .matcher import TagMatcher
+
+
+MAX_CACHED_CONTEXTS = 4096
+CONTEXT_TTL = 600
+
+
+class ProxyContext(BaseModel):
+    """
+    everything `get_proxy_data` reads from mongo for a single user
+
+    contexts are shared between events and must be treated as read-only
+    """
+
+    user_id: int
+    usergroup: Usergroup | None = None
+    groups: list[Group] = []
+    autoproxies: list[Autoproxy] = []
+    members: list[ProxyMember] = []
+
+    _members: dict[PydanticObjectId, ProxyMember] | None = PrivateAttr(None)
+    _member_groups: dict[PydanticObjectId, Group] | None = PrivateAttr(None)
+    _matcher: TagMatcher | None = PrivateAttr(None)
+
+    @property
+    def redis_key(self) -> str:
+        return f'proxy_context:{self.user_id}'
+
+    @property
+    def member_groups(self) -> dict[PydanticObjectId, Group]:
+        # ? first group wins when a member is somehow in more than one
+        if self._member_groups is None:
+            self._member_groups = {
+                member_id: group
+                for group in reversed(self.groups)
+                for member_id in group.members
+            }
+
+        return self._member_groups
+
+    @property
+    def matcher(self) -> TagMatcher:
+        if self._matcher is None:
+            self._matcher = TagMatcher(
+                member
+                for group in self.groups
+                for member_id in group.members
+                if (member := self.get_member(member_id)) is not None
+            )
+
+        return self._matcher
+
+    def get_member(self, member_id: PydanticObjectId) -> ProxyMember | None:
+        if self._members is None:
+            self._members = {
+                member.id: member
+                for member in self.members
+            }
+
+        return self._members.get(member_id)
+
+    def get_autoproxies(self, guild_id: int) -> dict[int | None, Autoproxy]:
+        """server and global autoproxies, copied so they can be modified and saved"""
+        # ? mongo expires autoproxies on its own, without an invalidation
+        now = datetime.now(UTC)
+
+        return {
+            autoproxy.guild: autoproxy.model_copy()
+            for autoproxy in self.autoproxies
+            if autoproxy.guild in {guild_id, None} and (
+                autoproxy.ts is None or
+                (autoproxy.ts.replace(tzinfo=UTC)
+                 if autoproxy.ts.tzinfo is None else
+                 autoproxy.ts) > now)
+        }
+
+    def depends_on(self, collection: str, document_id: str) -> bool:
+        match collection:
+            case 'users':
+                return str(self.user_id) == document_id
+            case 'usergroups':
+                return (
+                    self.usergroup is not None and
+                    str(self.usergroup.id) == document_id)
+            case 'groups':
+                return any(
+                    str(group.id) == document_id
+                    for group in self.groups)
+            case 'members':
+                return any(
+                    str(member.id) == document_id
+                    for member in self.members)
+
+        return False
+
+    def dependencies(self) -> list[tuple[str, str]]:
+        return [
+            ('users', str(self.user_id)),
+            *((
+                ('usergroups', str(self.usergroup.id)),)
+              if self.usergroup is not None else ()),
+            *(('groups', str(group.id)) for group in self.groups),
+            *(('members', str(member.id)) for member in self.members)
+        ]
+
+
+_CONTEXTS: OrderedDict[int, ProxyContext] = OrderedDict()
+_TASKS: set[Task] = set()
+_generation = 0
+
+
+def _invalidate(collection: str, document_id: str) -> None:
+    global _generation
+    _generation += 1
+
+    if document_id == '*':
+        _CONTEXTS.clear()
+        return
+
+    stale = [
+        context
+        for context in _CONTEXTS.values()
+        if context.depends_on(collection, document_id)
+    ]
+
+    if not stale:
+        return
+
+    for context in stale:
+        del _CONTEXTS[context.user_id]
+
+    # ? the writer already deleted these from redis, but a context read
+    # ? from mongo before the write may have been stored after it
+    task = create_task(redis.delete(*(
+        context.redis_key
+        for context in stale
+    )))
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+
+
+@on_invalidate('users')
+def _invalidate_user(user_id: str) -> None:
+    _invalidate('users', user_id)
+
+
+@on_invalidate('usergroups')
+def _invalidate_usergroup(usergroup_id: str) -> None:
+    _invalidate('usergroups', usergroup_id)
+
+
+@on_invalidate('groups')
+def _invalidate_group(group_id: str) -> None:
+    _invalidate('groups', group_id)
+
+
+@on_invalidate('members')
+def _invalidate_member(member_id: str) -> None:
+    _invalidate('members', member_id)
+
+
+def _store(context: ProxyContext) -> None:
+    _CONTEXTS[context.user_id] = context
+    _CONTEXTS.move_to_end(context.user_id)
+
+    while len(_CONTEXTS) > MAX_CACHED_CONTEXTS:
+        _CONTEXTS.popitem(last=False)
+
+
+async def _fetch_context(user_id: int) -> ProxyContext:
+    usergroup = await Usergroup.find_one({
+        'users': user_id
+    })
+
+    if usergroup is None:
+        return ProxyContext(user_id=user_id)
+
+    groups, autoproxies = await gather(
+        Group.find({
+            '$or': [
+                {'account': usergroup.id},
+                {f'users.{user_id}': {'$exists': True}}]
+        }).to_list(),
+        Autoproxy.find({
+            'user': usergroup.id
+        }).to_list()
+    )
+
+    members = await ProxyMember.find({
+        '_id': {'$in': list({
+            member_id
+            for group in groups
+            for member_id in group.members
+        })}
+    }).to_list() if groups else []
+
+    return ProxyContext(
+        user_id=user_id,
+        usergroup=usergroup,
+        groups=groups,
+        autoproxies=autoproxies,
+        members=members
+    )
+
+
+async def get_proxy_context(user_id: int) -> ProxyContext:
+    if (context := _CONTEXTS.get(user_id)) is not None:
+        _CONTEXTS.move_to_end(user_id)
+        return context
+
+    # ? anything invalidated while we were waiting on redis or mongo
+    # ? may have been read before the write, so it isn't cached
+    generation = _generation
+
+    if (cached := await redis.get(f'proxy_context:{user_id}')) is not None:
+        context = ProxyContext.model_validate_json(cached)
+
+        if generation == _generation:
+            _store(context)
+
+        return context
+
+    context = await _fetch_context(user_id)
+
+    if generation != _generation:
+        return context
+
+    _store(context)
+
+    pipeline = redis.pipeline()
+    pipeline.set(
+        context.redis_key,
+        context.model_dump_json(),
+        ex=CONTEXT_TTL
+    )
+    track_derived(
+        pipeline,
+        context.redis_key,
+        context.dependencies(),
+        CONTEXT_TTL
+    )
+    await pipeline.execute()
+
+    if generation != _generation:
+        await redis.delete(context.redis_key)
+
+    return context
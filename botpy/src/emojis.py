@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+from asyncio import Task, create_task, gather, shield, sleep
+from collections import OrderedDict
+from dataclasses import dataclass
+from secrets import token_hex
+from time import time
+
+from orjson import dumps, loads
+
+from plural.errors import HTTPException
+from plural.otel import span, get_counter
+from plural.db import redis
+
+from .http import (
+    Route,
+    request,
+    bytes_to_base64_data,
+    get_bot_id_from_token,
+    GENERAL_SESSION
+)
+from .models import env
+
+
+# ? refs held longer than this are assumed to be from a process that died
+EMOJI_LEASE = 300
+EMOJI_CACHE_BYTES = 33_554_432
+EMOJI_RECONCILE_INTERVAL = 900
+
+
+@dataclass(frozen=True)
+class ProbableEmoji:
+    name: str
+    id: int
+    animated: bool
+
+    def __str__(self) -> str:
+        return f'<{'a' if self.animated else ''}:{self.name}:{self.id}>'
+
+    @property
+    def clone_name(self) -> str:
+        # ? pooled emojis are kept, so the name has to be unique per source emoji
+        return f'{self.name[:18]}_{_base36(self.id)}'
+
+    async def read(self) -> bytes:
+        async with GENERAL_SESSION.get(
+            f'https://cdn.discordapp.com/emojis/{self.id}.{'gif' if self.animated else 'png'}'
+        ) as response:
+
+            if response.ok:
+                return await response.read()
+
+            raise HTTPException(f'Failed to fetch emoji: {response.status}')
+
+
+@dataclass(frozen=True)
+class ClonedEmoji:
+    """
+    an application emoji, held until the message is sent
+
+    pooled emojis are released back to the pool, others are deleted
+    """
+    source_id: int
+    emoji: ProbableEmoji
+    token: str
+    pooled: bool = True
+
+    @property
+    def application_id(self) -> int:
+        return _application_id(self.token)
+
+    @property
+    def pool_entry(self) -> bytes:
+        return dumps({
+            'source_id': self.source_id,
+            'name': self.emoji.name,
+            'id': self.emoji.id,
+            'animated': self.emoji.animated})
+
+
+class EmojiImages:
+    """lru of encoded emoji images, bounded by their total size"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._images: OrderedDict[tuple[int, bool], str] = OrderedDict()
+
+    def get(self, emoji: ProbableEmoji) -> str | None:
+        key = (emoji.id, emoji.animated)
+
+        if (image := self._images.get(key)) is not None:
+            self._images.move_to_end(key)
+
+        return image
+
+    def set(self, emoji: ProbableEmoji, image: str) -> None:
+        key = (emoji.id, emoji.animated)
+
+        if (previous := self._images.pop(key, None)) is not None:
+            self.size -= len(previous)
+
+        if len(image) > self.max_bytes:
+            return
+
+        self._images[key] = image
+        self.size += len(image)
+
+        while self.size > self.max_bytes:
+            self.size -= len(self._images.popitem(last=False)[1])
+
+    async def read(self, emoji: ProbableEmoji) -> str:
+        if (image := self.get(emoji)) is None:
+            image = bytes_to_base64_data(await emoji.read())
+            self.set(emoji, image)
+
+        return image
+
+
+EMOJI_IMAGES = EmojiImages(EMOJI_CACHE_BYTES)
+
+_ACQUIRE_SCRIPT = redis.register_script("""
+local found = {}
+for index = 2, #ARGV do
+    local emoji = redis.call('HGET', KEYS[1], ARGV[index])
+    if emoji then
+        redis.call('HINCRBY', KEYS[2], ARGV[index], 1)
+        redis.call('ZADD', KEYS[3], ARGV[1], ARGV[index])
+        found[#found + 1] = emoji
+    end
+end
+return found
+""")
+
+_ADD_SCRIPT = redis.register_script("""
+local existing = redis.call('HGET', KEYS[1], ARGV[4])
+if existing then
+    return {existing}
+end
+redis.call('HSET', KEYS[1], ARGV[4], ARGV[5])
+redis.call('ZADD', KEYS[3], ARGV[1], ARGV[4])
+local result = {ARGV[5]}
+local excess = redis.call('HLEN', KEYS[1]) - tonumber(ARGV[3])
+if excess <= 0 then
+    return result
+end
+for _, source in ipairs(redis.call('ZRANGE', KEYS[3], 0, -1)) do
+    if excess <= 0 then
+        break
+    end
+    if source ~= ARGV[4] and (
+        tonumber(redis.call('HGET', KEYS[2], source) or 0) <= 0 or
+        tonumber(redis.call('ZSCORE', KEYS[3], source)) < tonumber(ARGV[2])
+    ) then
+        result[#result + 1] = redis.call('HGET', KEYS[1], source)
+        redis.call('HDEL', KEYS[1], source)
+        redis.call('HDEL', KEYS[2], source)
+        redis.call('ZREM', KEYS[3], source)
+        excess = excess - 1
+    end
+end
+return result
+""")
+
+_RELEASE_SCRIPT = redis.register_script("""
+for index = 1, #ARGV do
+    if redis.call('HINCRBY', KEYS[1], ARGV[index], -1) <= 0 then
+        redis.call('HDEL', KEYS[1], ARGV[index])
+    end
+end
+""")
+
+# ? only removes entries that still hold the emoji that was found dead,
+# ? another instance may have cloned a replacement since
+_DISCARD_SCRIPT = redis.register_script("""
+for index = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[index]) == ARGV[index + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[index])
+        redis.call('HDEL', KEYS[2], ARGV[index])
+        redis.call('ZREM', KEYS[3], ARGV[index])
+    end
+end
+""")
+
+_CLONING: dict[tuple[int, int], Task[None]] = {}
+_TASKS: set[Task] = set()
+
+
+def _base36(value: int) -> str:
+    digits = []
+
+    while True:
+        value, digit = divmod(value, 36)
+        digits.append('0123456789abcdefghijklmnopqrstuvwxyz'[digit])
+
+        if not value:
+            return ''.join(reversed(digits))
+
+
+def _application_id(token: str) -> int:
+    return (
+        get_bot_id_from_token(token)
+        if token != env.bot_token
+        else env.application_id
+    )
+
+
+def _pool_keys(application_id: int) -> list[str]:
+    return [
+        f'emoji_pool:{application_id}',
+        f'emoji_pool:{application_id}:refs',
+        f'emoji_pool:{application_id}:lru'
+    ]
+
+
+def _load(emoji: bytes | str) -> tuple[int, ProbableEmoji]:
+    data = loads(emoji)
+
+    return data['source_id'], ProbableEmoji(
+        name=data['name'],
+        id=data['id'],
+        animated=data['animated']
+    )
+
+
+def _delete_later(emojis: list[ProbableEmoji], token: str) -> None:
+    if not emojis:
+        return
+
+    get_counter('emoji_pool.evictions').add(len(emojis))
+
+    task = create_task(gather(*[
+        request(Route(
+            'DELETE',
+            '/applications/{application_id}/emojis/{emoji_id}',
+            token=token,
+            emoji_id=emoji.id))
+        for emoji in emojis],
+        return_exceptions=True
+    ))
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+
+
+async def _acquire(
+    application_id: int,
+    source_ids: list[int],
+    token: str
+) -> dict[int, ClonedEmoji]:
+    if not source_ids:
+        return {}
+
+    response = await _ACQUIRE_SCRIPT(
+        _pool_keys(application_id),
+        [time(), *source_ids]
+    )
+
+    return {
+        source_id: ClonedEmoji(source_id, emoji, token)
+        for source_id, emoji in map(_load, response)
+    }
+
+
+async def _create(
+    emoji: ProbableEmoji,
+    token: str,
+    name: str
+) -> ProbableEmoji:
+    response = await request(
+        Route(
+            'POST',
+            '/applications/{application_id}/emojis',
+            token=token),
+        json={
+            'name': name,
+            'image': await EMOJI_IMAGES.read(emoji)}
+    )
+
+    return ProbableEmoji(
+        name=response['name'],
+        id=int(response['id']),
+        animated=response['animated']
+    )
+
+
+async def _clone(
+    application_id: int,
+    emoji: ProbableEmoji,
+    token: str
+) -> None:
+    cloned = await _create(emoji, token, emoji.clone_name)
+
+    stored, *evicted = await _ADD_SCRIPT(
+        _pool_keys(application_id),
+        [
+            time(),
+            time() - EMOJI_LEASE,
+            env.emoji_pool_size,
+            emoji.id,
+            ClonedEmoji(emoji.id, cloned, token).pool_entry]
+    )
+
+    evicted = [emoji_ for _, emoji_ in map(_load, evicted)]
+
+    # ? another instance cloned the same emoji first, ours isn't needed
+    if _load(stored)[1] != cloned:
+        evicted.append(cloned)
+
+    _delete_later(evicted, token)
+
+
+async def _clone_temporary(
+    emojis: list[ProbableEmoji],
+    token: str
+) -> tuple[dict[int, ClonedEmoji], int]:
+    # ? the name only has to be unique among this message's clones
+    # ? and any other message being sent by the same application
+    responses = await gather(*[
+        _create(emoji, token, f'{emoji.name[:22]}_{token_hex(3)}')
+        for emoji in emojis],
+        return_exceptions=True)
+
+    cloned = {
+        emoji.id: ClonedEmoji(emoji.id, response, token, pooled=False)
+        for emoji, response in zip(emojis, responses, strict=True)
+        if not isinstance(response, BaseException)
+    }
+
+    return cloned, len(emojis) - len(cloned)
+
+
+async def _clone_once(
+    application_id: int,
+    emoji: ProbableEmoji,
+    token: str
+) -> None:
+    key = (application_id, emoji.id)
+
+    if (task := _CLONING.get(key)) is None:
+        task = _CLONING[key] = create_task(_clone(application_id, emoji, token))
+        task.add_done_callback(lambda _: _CLONING.pop(key, None))
+
+    await shield(task)
+
+
+async def acquire_emojis(
+    emojis: list[ProbableEmoji],
+    token: str
+) -> tuple[dict[int, ClonedEmoji], int]:
+    """
+    pooled application emojis for each source emoji, cloning any that
+    aren't in the pool yet
+
+    userproxy applications are owned by users, who have emojis of their
+    own, so their clones aren't pooled and are deleted once released
+
+    returns the emojis by source id, and how many failed to clone,
+    every returned emoji must be released with `release_emojis`
+    """
+    sources = {emoji.id: emoji for emoji in emojis}
+
+    if token != env.bot_token:
+        with span(f'cloning {len(sources)} emojis'):
+            return await _clone_temporary(list(sources.values()), token)
+
+    application_id = _application_id(token)
+
+    acquired = await _acquire(application_id, list(sources), token)
+
+    missing = [
+        emoji
+        for source_id, emoji in sources.items()
+        if source_id not in acquired
+    ]
+
+    get_counter('emoji_pool.hits').add(len(acquired))
+    get_counter('emoji_pool.misses').add(len(missing))
+
+    if not missing:
+        return acquired, 0
+
+    with span(f'cloning {len(missing)} emojis'):
+        await gather(*[
+            _clone_once(application_id, emoji, token)
+            for emoji in missing],
+            return_exceptions=True)
+
+    # ? a failed clone may still have been cloned by another instance
+    cloned = await _acquire(
+        application_id,
+        [emoji.id for emoji in missing],
+        token
+    )
+
+    return {**acquired, **cloned}, len(missing) - len(cloned)
+
+
+async def release_emojis(
+    emojis: list[ClonedEmoji]
+) -> None:
+    if not emojis:
+        return
+
+    # ? move to new object, so if (and when) this function is called again
+    # ? it won't try to release them a second time
+    copy = [
+        emojis.pop()
+        for _ in range(len(emojis))
+    ]
+
+    applications: dict[int, list[int]] = {}
+
+    for emoji in copy:
+        if emoji.pooled:
+            applications.setdefault(
+                emoji.application_id, []
+            ).append(emoji.source_id)
+
+    await gather(
+        *[
+            _RELEASE_SCRIPT(
+                [_pool_keys(application_id)[1]],
+                source_ids)
+            for application_id, source_ids in applications.items()],
+        *[
+            request(Route(
+                'DELETE',
+                '/applications/{application_id}/emojis/{emoji_id}',
+                token=emoji.token,
+                emoji_id=emoji.emoji.id))
+            for emoji in copy
+            if not emoji.pooled]
+    )
+
+
+async def reconcile_emojis() -> None:
+    """
+    remove pool entries whose emoji was deleted outside of the pool
+
+    discord sends messages with a deleted emoji's markup as plain text,
+    so a dead entry would otherwise be handed out until it's evicted
+    """
+    keys = _pool_keys(env.application_id)
+
+    # ? one instance per interval is enough
+    if not await redis.set(
+        f'{keys[0]}:reconcile', 1,
+        nx=True,
+        ex=EMOJI_RECONCILE_INTERVAL
+    ):
+        return
+
+    # ? read before listing, so every entry read was cloned before the list
+    if not (pool := await redis.hgetall(keys[0])):
+        return
+
+    response = await request(Route(
+        'GET',
+        '/applications/{application_id}/emojis',
+        token=env.bot_token))
+
+    existing = {int(emoji['id']) for emoji in response['items']}
+
+    dead = [
+        (source_id, entry)
+        for source_id, entry in pool.items()
+        if _load(entry)[1].id not in existing
+    ]
+
+    if not dead:
+        return
+
+    get_counter('emoji_pool.discarded').add(len(dead))
+
+    await _DISCARD_SCRIPT(keys, [value for pair in dead for value in pair])
+
+
+async def emoji_reconciler() -> None:
+    while True:
+        await sleep(EMOJI_RECONCILE_INTERVAL)
+
+        with span('reconciling emoji pool') as current_span:
+            try:
+                await reconcile_emojis()
+            except Exception as e:  # noqa: BLE001
+                current_span.record_exception(e)
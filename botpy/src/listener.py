@@ -1,22 +1,20 @@
 from asyncio import gather, sleep
 from contextlib import suppress
 
-from orjson import loads
-
+from plural.db.invalidation import publish_invalidation
 from plural.db import redis, Message, ProxyMember
 from plural.errors import Forbidden
 from plural.otel import span
 
 from .logic import process_proxy, get_webhook
+from .webhooks import fetch_webhooks
 from .http import Route, request
 from .logclean import logclean
 from .cache import Cache
 from .models import env
 
 
-async def on_event(redis_id: str, event_json: str, start_time: int) -> None:
-    event = loads(event_json)
-
+async def on_event(redis_id: str, event: dict, start_time: int) -> None:
     match event['t']:
         case 'MESSAGE_CREATE':
             await gather(
@@ -107,9 +105,10 @@ async def on_reaction_add(event: dict, start_time: int) -> None:
     ):
         return
 
-    db_message = await Message.find_one({
-        'proxy_id': int(event['message_id'])
-    })
+    db_message = await Message.find_by_id(
+        int(event['channel_id']),
+        int(event['message_id'])
+    )
 
     if db_message is None:
         return
@@ -168,8 +167,7 @@ async def on_reaction_add(event: dict, start_time: int) -> None:
 
 async def on_webhooks_update(
     event: dict,
-    start_time: int,
-    internal: bool = False
+    start_time: int
 ) -> None:
     with span(
         'webhooks update',
@@ -179,25 +177,9 @@ async def on_webhooks_update(
             'guild_id': event['guild_id']
         }
     ):
-        pipeline = redis.pipeline()
-
-        await pipeline.delete(f'discord:webhooks:{event['channel_id']}')
-
         try:
-            webhooks = await request(Route(
-                'GET',
-                '/channels/{channel_id}/webhooks',
-                token=env.bot_token,
-                channel_id=event['channel_id']))
+            await fetch_webhooks(event['channel_id'])
         except Forbidden:
-            if internal:
-                raise
             return
 
-        await pipeline.json().set(
-            f'discord:webhooks:{event['channel_id']}',
-            '$',
-            webhooks
-        )
-
-        await pipeline.execute()
+        await publish_invalidation(('webhooks', event['channel_id']))
@@ -1,14 +1,47 @@
+from __future__ import annotations
+
+from asyncio import Task, create_task
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 from hashlib import sha256
 
-from regex import search
+from regex import compile
 
+from plural.db.invalidation import on_invalidate
 from plural.db import Guild, ProxyLog
 from plural.otel import span
 
 from src.http import request, Route
 from src.models import env
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+DYNO_FOOTER_PATTERN = compile(
+    r'Author: (?P<author>\d+) \| Message ID: (?P<message>\d+)')
+DYNO_DESCRIPTION_PATTERN = compile(
+    r'\*\*(?:Message|Image) sent by <@(?P<author>\d+)> Deleted in <#(?P<channel>\d+)>\*\*(?:\n(?P<content>[\s\S]+))?')
+CARLBOT_DESCRIPTION_PATTERN = compile(
+    r'(?:(?P<content>[\s\S]+)\n\n)?Message ID: (?P<message>\d+)')
+CARLBOT_FOOTER_PATTERN = compile(
+    r'ID: (?P<author>\d+)')
+PROBOT_DESCRIPTION_PATTERN = compile(
+    r':wastebasket: \*\*Message sent by <@(?P<author>\d+)> deleted in <#(?P<channel>\d+)>.\*\*\n(?P<content>[\s\S]+)')
+CATALOGGER_CHANNEL_PATTERN = compile(
+    r'<#(?P<channel>\d+)>')
+CATALOGGER_AUTHOR_PATTERN = compile(
+    r'<@(?P<author1>\d+)>\n(?P<author_name>.{2,32})\nID: (?P<author2>\d+)')
+CATALOGGER_FOOTER_PATTERN = compile(
+    r'ID: (?P<message>\d+)')
+CATALOGGER_DESCRIPTION_PATTERN = compile(
+    r'(?P<content>[\s\S]+)|None')
+
+type Extractor = Callable[[dict], LogExtract | None]
+
+# ? checked in the order they're registered
+EXTRACTORS: dict[str, Extractor] = {}
+
 
 @dataclass
 class LogExtract:
@@ -38,25 +71,76 @@ class LogExtract:
         )
 
 
+class LogcleanGuilds:
+    """
+    ids of every guild with logclean enabled
+
+    loaded once on startup and kept in sync with guild invalidations,
+    so log messages in every other guild are ignored without any i/o
+    """
+
+    def __init__(self) -> None:
+        self.guild_ids: set[int] = set()
+        self._generations: dict[int, int] = {}
+        self._generation = 0
+        self._tasks: set[Task] = set()
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self.guild_ids
+
+    async def load(self) -> None:
+        self.guild_ids = await Guild.logclean_guild_ids()
+
+    async def _refresh(self, guild_id: int, generation: int) -> None:
+        guild = await Guild.get(guild_id, ignore_cache=True)
+
+        # ? a newer refresh was started while this one was waiting
+        if self._generations.get(guild_id) != generation:
+            return
+
+        del self._generations[guild_id]
+
+        if guild is not None and guild.config.logclean:
+            self.guild_ids.add(guild_id)
+        else:
+            self.guild_ids.discard(guild_id)
+
+    def invalidate(self, guild_id: str) -> None:
+        if guild_id == '*':
+            task = create_task(self.load())
+        else:
+            self._generation += 1
+            self._generations[int(guild_id)] = self._generation
+
+            task = create_task(self._refresh(int(guild_id), self._generation))
+
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+LOGCLEAN_GUILDS = LogcleanGuilds()
+
+
+@on_invalidate('guilds')
+def _invalidate_guild(guild_id: str) -> None:
+    LOGCLEAN_GUILDS.invalidate(guild_id)
+
+
+def extractor(function: Extractor) -> Extractor:
+    EXTRACTORS[function.__name__] = function
+    return function
+
+
 async def logclean(event: dict, start_time: int) -> None:
     if (
         event.get('author') is None or
         not event['author'].get('bot') or
-        event.get('guild_id') is None
+        event.get('guild_id') is None or
+        int(event['guild_id']) not in LOGCLEAN_GUILDS
     ):
         return
 
-    guild = await Guild.get(int(event['guild_id']))
-
-    if guild is None or not guild.config.logclean:
-        return
-
-    for matcher in [
-        dyno,
-        carlbot,
-        probot,
-        catalogger
-    ]:
+    for matcher in EXTRACTORS.values():
         if (extract := matcher(event)) is None:
             continue
 
@@ -84,6 +168,7 @@ async def logclean(event: dict, start_time: int) -> None:
         ))
 
 
+@extractor
 def dyno(event: dict) -> LogExtract | None:
     if (
         event.get('webhook_id') is None or
@@ -95,8 +180,7 @@ def dyno(event: dict) -> LogExtract | None:
     ):
         return None
 
-    match = search(
-        r'Author: (?P<author>\d+) \| Message ID: (?P<message>\d+)',
+    match = DYNO_FOOTER_PATTERN.search(
         event['embeds'][0]['footer']['text']
     )
 
@@ -109,9 +193,8 @@ def dyno(event: dict) -> LogExtract | None:
         message_id=int(match.group('message')),
     )
 
-    match = search(
-        r'\*\*(?:Message|Image) sent by <@(?P<author>\d+)> Deleted in <#(?P<channel>\d+)>\*\*(?:\n(?P<content>[\s\S]+))?',
-        event['embeds'][0]['description'],
+    match = DYNO_DESCRIPTION_PATTERN.search(
+        event['embeds'][0]['description']
     )
 
     if match is None:
@@ -126,6 +209,7 @@ def dyno(event: dict) -> LogExtract | None:
     return extract
 
 
+@extractor
 def carlbot(event: dict) -> LogExtract | None:
     if (
         event.get('embeds') is None or
@@ -136,8 +220,7 @@ def carlbot(event: dict) -> LogExtract | None:
     ):
         return None
 
-    match = search(
-        r'(?:(?P<content>[\s\S]+)\n\n)?Message ID: (?P<message>\d+)',
+    match = CARLBOT_DESCRIPTION_PATTERN.search(
         event['embeds'][0]['description']
     )
 
@@ -150,8 +233,7 @@ def carlbot(event: dict) -> LogExtract | None:
         message_id=int(match.group('message'))
     )
 
-    match = search(
-        r'ID: (?P<author>\d+)',
+    match = CARLBOT_FOOTER_PATTERN.search(
         event['embeds'][0]['footer']['text']
     )
 
@@ -163,6 +245,7 @@ def carlbot(event: dict) -> LogExtract | None:
     return extract
 
 
+@extractor
 def probot(event: dict) -> LogExtract | None:
     if (
         event.get('embeds') is None or
@@ -172,8 +255,7 @@ def probot(event: dict) -> LogExtract | None:
     ):
         return None
 
-    match = search(
-        r':wastebasket: \*\*Message sent by <@(?P<author>\d+)> deleted in <#(?P<channel>\d+)>.\*\*\n(?P<content>[\s\S]+)',
+    match = PROBOT_DESCRIPTION_PATTERN.search(
         event['embeds'][0]['description']
     )
 
@@ -187,6 +269,7 @@ def probot(event: dict) -> LogExtract | None:
     )
 
 
+@extractor
 def catalogger(event: dict) -> LogExtract | None:
     if (
         event.get('embeds') is None or
@@ -201,8 +284,7 @@ def catalogger(event: dict) -> LogExtract | None:
     ):
         return None
 
-    match = search(
-        r'<#(?P<channel>\d+)>',
+    match = CATALOGGER_CHANNEL_PATTERN.search(
         event['embeds'][0]['fields'][0]['value']
     )
 
@@ -217,8 +299,7 @@ def catalogger(event: dict) -> LogExtract | None:
         channel_id=int(match.group('channel'))
     )
 
-    match = search(
-        r'<@(?P<author1>\d+)>\n(?P<author_name>.{2,32})\nID: (?P<author2>\d+)',
+    match = CATALOGGER_AUTHOR_PATTERN.search(
         event['embeds'][0]['fields'][1]['value']
     )
 
@@ -231,8 +312,7 @@ def catalogger(event: dict) -> LogExtract | None:
 
     extract.author_id = int(match.group('author1'))
 
-    match = search(
-        r'ID: (?P<message>\d+)',
+    match = CATALOGGER_FOOTER_PATTERN.search(
         event['embeds'][0]['footer']['text']
     )
 
@@ -241,8 +321,7 @@ def catalogger(event: dict) -> LogExtract | None:
 
     extract.message_id = int(match.group('message'))
 
-    match = search(
-        r'(?P<content>[\s\S]+)|None',
+    match = CATALOGGER_DESCRIPTION_PATTERN.search(
         event['embeds'][0]['description']
     )
 
@@ -1,23 +1,24 @@
-from asyncio import gather, sleep, timeout, get_event_loop
-from concurrent.futures import ProcessPoolExecutor
+from asyncio import gather, sleep
+from collections.abc import Callable, Generator
 from urllib.parse import urlparse, parse_qs
 from datetime import timedelta, datetime
-from collections.abc import Callable
 from dataclasses import dataclass
-from contextlib import suppress
+from contextlib import contextmanager, suppress
 from types import CoroutineType
 from time import perf_counter
-from typing import Self, Any
+from typing import ClassVar, Self, Any
 from hashlib import sha256
-from time import time_ns
-from io import BytesIO
+from io import BytesIO, BufferedRandom
+from tempfile import TemporaryFile
 
-from regex import match, escape, sub, compile, IGNORECASE
+from regex import escape, sub, compile
 from beanie import PydanticObjectId
 from orjson import dumps
 
+from plural.db.completion import publish_proxy_completion
+from plural.db.buffer import MESSAGES, PROXY_LOGS
 from plural.db.enums import AutoproxyMode, ReplyFormat
-from plural.otel import span, cx, get_counter, inject
+from plural.otel import span, cx, get_counter, get_histogram, inject
 from plural.errors import (
     PluralExceptionCritical,
     PluralException,
@@ -37,23 +38,18 @@ from plural.db import (
     redis
 )
 
-from .http import Route, request, File, bytes_to_base64_data, GENERAL_SESSION
+from .emojis import ProbableEmoji, ClonedEmoji, acquire_emojis, release_emojis
+from .http import Route, request, File, GENERAL_SESSION
+from .webhooks import WEBHOOKS
 from .permission import Permission
+from .context import get_proxy_context
 from .cache import Cache
 from .models import env
-from .caith import roll
+from .roller import ROLL_POOL
 
 
 EMOJI_SHARDS = 10
-MENTION_PATTERN = compile(
-    r'<(?:'  # ? handles when proxy tags are <text> and ensures mentions are preserved
-    r'(?:[@#/][!&]?\d+)|'        # ? users, channels, roles
-    r'(?:/(?:\w+ ?){1,3}:)\d+|'  # ? slash commands
-    r'(?:a?:[^:]+:\d+)|'         # ? custom emoji
-    r'(?:t:\d+:[tTdDfFR])|'      # ? timestamps
-    r'(?:id:customize)|'         # ? guild navigation
-    r'(?:sound:\d+)|'            # ? soundmoji (might be deprecated)
-    r'(?:https?://[^\s]+))>')    # ? urls
+ATTACHMENT_MEMORY_BUDGET = 8_388_608
 INLINE_REPLY_PATTERN = compile(
     r'^-# \[↪\]\(<https:\/\/discord\.com\/channels\/\d+\/\d+\/\d+>\) (?:<@(\d+)>)?')
 EMOJI_PATTERN = compile(r'<(a)?:(\w{2,32}):(\d+)>')
@@ -76,6 +72,7 @@ class ProxyData:
     content: str
     reason: str
     group: Group
+    usergroup: Usergroup
     tag: ProxyMember.ProxyTag | None = None
     traceparent: str | None = None
 
@@ -97,50 +94,51 @@ class ProxyData:
 
 
 @dataclass
-class CheckMemberResult:
-    content: str
-    proxy_tag: int
-    reason: str
+class ProxyResult:
+    success: bool
+    emojis: list[ClonedEmoji]
 
 
-@dataclass(frozen=True)
-class ProbableEmoji:
-    name: str
-    id: int
-    animated: bool
+class ProxyStages:
+    """
+    how long each stage of a proxy took, in milliseconds
 
-    def __str__(self) -> str:
-        return f'<{'a' if self.animated else ''}:{self.name}:{self.id}>'
+    stages are set as attributes on the current span as they finish,
+    and recorded to a histogram once the proxy is done
+    """
 
-    async def read(self) -> bytes:
-        async with GENERAL_SESSION.get(
-            f'https://cdn.discordapp.com/emojis/{self.id}.{'gif' if self.animated else 'png'}'
-        ) as response:
+    # ? called with the durations of every finished proxy,
+    # ? so benchmarks can see them without an otel exporter
+    observers: ClassVar[list[Callable[[dict[str, float]], None]]] = []
 
-            if response.ok:
-                return await response.read()
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = {}
 
-            raise HTTPException(f'Failed to fetch emoji: {response.status}')
+    @contextmanager
+    def __call__(self, name: str) -> Generator[None]:
+        st = perf_counter()
 
+        try:
+            yield
+        finally:
+            self.durations[name] = round((perf_counter() - st) * 1000, 4)
+            cx().set_attribute(f'proxy.stage.{name}', self.durations[name])
 
-@dataclass
-class ClonedEmoji:
-    id: int
-    token: str
+    @property
+    def attributes(self) -> dict[str, float]:
+        return {
+            f'proxy.stage.{name}': duration
+            for name, duration in self.durations.items()
+        }
 
-    async def delete(self) -> None:
-        await request(Route(
-            'DELETE',
-            '/applications/{application_id}/emojis/{emoji_id}',
-            token=self.token,
-            emoji_id=self.id
-        ))
+    def record(self) -> None:
+        histogram = get_histogram('proxy.stage.duration', 'ms')
 
+        for name, duration in self.durations.items():
+            histogram.record(duration, {'stage': name})
 
-@dataclass
-class ProxyResult:
-    success: bool
-    emojis: list[ClonedEmoji]
+        for observer in self.observers:
+            observer(self.durations)
 
 
 @dataclass
@@ -157,35 +155,6 @@ class ProxyResponse:
         return cls(False, '', {}, {}, '', publish_latency)
 
 
-_emoji_index = redis.register_script("""
-local current = tonumber(redis.call('GET', KEYS[1]) or 0)
-local new_value = (current + 1) % 1000
-redis.call('SET', KEYS[1], new_value)
-return current
-""")
-
-
-async def emoji_index_init() -> None:
-    await redis.set('emoji_index', 0, nx=True)
-
-
-async def emoji_index() -> str:
-    return f'{await _emoji_index(['emoji_index']):03}'
-
-
-async def to_process[T](
-    executor: ProcessPoolExecutor,
-    func: Callable[..., T],
-    *args  # noqa: ANN002
-) -> T:
-    return await get_event_loop(
-    ).run_in_executor(
-        executor,
-        func,
-        *args
-    )
-
-
 async def save_debug_log(
     event: dict,
     debug_log: list[str],
@@ -216,116 +185,23 @@ async def save_debug_log(
     await pipeline.execute()
 
 
-async def delete_emojis(
-    emojis: list[ClonedEmoji]
-) -> None:
-    if not emojis:
-        return
-
-    # ? move to new object, so if (and when) this function is called again
-    # ? it won't try to delete them a second time
-    copy = [
-        emojis.pop()
-        for _ in range(len(emojis))
-    ]
-
-    with span(f'deleting {len(copy)} emojis'):
-        await gather(*[
-            emoji.delete()
-            for emoji in
-            copy
-        ])
-
-
-def check_member(
-    event: dict,
-    member: ProxyMember,
-    debug_log: list[str]
-) -> CheckMemberResult | None:
-    for index, proxy_tag in enumerate(member.proxy_tags):
-        if not proxy_tag.prefix and not proxy_tag.suffix:
-            continue
-
-        prefix, suffix = (
-            (proxy_tag.prefix, proxy_tag.suffix)
-            if proxy_tag.regex else
-            (escape(proxy_tag.prefix), escape(proxy_tag.suffix))
-        )
-
-        try:
-            check = match(
-                f'^({prefix})([\\s\\S]*)({suffix})$',
-                event['content'],
-                IGNORECASE if not proxy_tag.case_sensitive else 0,
-                timeout=0.0005)
-        except TimeoutError:
-            debug_log.append(
-                'Regex timeout on proxy tag '
-                f'{proxy_tag.prefix}text{proxy_tag.suffix}.')
-            continue
-
-        if (
-            check is None or
-            not (check.group(2) or event.get('attachments'))
-        ):
-            continue
-
-        mentions = len(MENTION_PATTERN.findall(check.string))
-
-        if mentions:
-            proxied_mentions = len(MENTION_PATTERN.findall(check.group(2)))
-            if (
-                mentions != proxied_mentions and
-                mentions != sum((
-                    proxied_mentions,
-                    len(MENTION_PATTERN.findall(proxy_tag.prefix)),
-                    len(MENTION_PATTERN.findall(proxy_tag.suffix))
-                ))
-            ):
-                debug_log.append(
-                    f'Proxy tag {proxy_tag.name} '
-                    'Failed to preserve all mentions.')
-                continue
-
-        return CheckMemberResult(
-            content=check.group(2),
-            proxy_tag=index,
-            reason=''.join([
-                'Matched proxy tag ',
-                f'`{proxy_tag.prefix}`' if proxy_tag.prefix else '',
-                '​`text`​',  # ? zero width spaces to separate markdown
-                f'`{proxy_tag.suffix}`' if proxy_tag.suffix else '',
-            ])
-        )
-
-    return None
-
-
 async def get_proxy_data(
     event: dict,
     debug_log: list[str]
 ) -> ProxyData | None:
-    usergroup = await Usergroup.find_one({
-        'users': int(event['author']['id'])
-    })
+    context = await get_proxy_context(int(event['author']['id']))
 
-    if usergroup is None:
+    if (usergroup := context.usergroup) is None:
         debug_log.append(
             'User has not registered with /plu/ral.')
         return None
 
-    autoproxies = {
-        autoproxy.guild: autoproxy
-        for autoproxy in await Autoproxy.find({
-            'user': usergroup.id,
-            'guild': {'$in': [int(event['guild_id']), None]},
-        }).to_list()
-    }
+    autoproxies = context.get_autoproxies(int(event['guild_id']))
 
     autoproxy = autoproxies.get(
         int(event['guild_id'])
     ) or autoproxies.get(None)
-    autoproxy_members: dict[int | None, ProxyMember] = {}
+    autoproxy_member: ProxyMember | None = None
 
     if (
         autoproxy and
@@ -336,13 +212,17 @@ async def get_proxy_data(
         return None
 
     if autoproxy:
-        member = await ProxyMember.get(autoproxy.member)
+        autoproxy_member = (
+            context.get_member(autoproxy.member)
+            if autoproxy.member is not None else
+            None
+        )
         debug_log.append(
             f'{'Server' if autoproxy.guild else 'Global'} '
             'Autoproxy found ' + (
                 'with no member'
-                if member is None else
-                f'for {member.name}'
+                if autoproxy_member is None else
+                f'for {autoproxy_member.name}'
             )
         )
     else:
@@ -355,10 +235,17 @@ async def get_proxy_data(
             'Reproxy command used.'
         )
 
-        member = await ProxyMember.get(PydanticObjectId(event['__plural_member']))
+        member_id = PydanticObjectId(event['__plural_member'])
+        member = (
+            context.get_member(member_id) or
+            await ProxyMember.get(member_id)
+        )
 
         if member is not None:
-            group = await member.get_group()
+            group = (
+                context.member_groups.get(member.id) or
+                await member.get_group()
+            )
 
             proxy_tag = None
             tag_index: int | None = event['__plural_proxy_tag']
@@ -372,6 +259,7 @@ async def get_proxy_data(
                 content=event['content'],
                 reason='Reproxy command',
                 group=group,
+                usergroup=usergroup,
                 tag=proxy_tag,
                 traceparent=event.get('__plural_traceparent')
             )
@@ -380,11 +268,7 @@ async def get_proxy_data(
             'Reproxy member not found.'
         )
 
-    groups = await Group.find({
-        '$or': [
-            {'account': usergroup.id},
-            {f'users.{event['author']['id']}': {'$exists': True}}]
-    }).to_list()
+    groups = context.groups
 
     if not groups:
         debug_log.append(
@@ -408,7 +292,7 @@ async def get_proxy_data(
     if (
         autoproxy and
         autoproxy.mode == AutoproxyMode.LOCKED and
-        (member := await ProxyMember.get(autoproxy.member))
+        (member := autoproxy_member)
     ):
         group = next(
             (group
@@ -427,71 +311,73 @@ async def get_proxy_data(
                 autoproxy=autoproxy,
                 content=event['content'],
                 reason='Locked autoproxy',
-                group=group
+                group=group,
+                usergroup=usergroup
             )
 
-    recent_members = await ProxyMember.find({
-        '_id': {'$in': [
-            PydanticObjectId(member_id)
-            for member_id in
-            await redis.zrange(
+    member_groups = context.member_groups
+
+    matches = context.matcher.match(
+        event['content'],
+        bool(event.get('attachments')),
+        debug_log
+    )
+
+    if len(matches) > 1:
+        # ? recently used members take priority over ambiguous tags
+        recent = {
+            PydanticObjectId(member_id): index
+            for index, member_id in enumerate(await redis.zrange(
                 f'recent_proxies:{event['author']['id']}',
                 0, -1,
                 desc=True
-            )]}
-    }).to_list()
-
-    for member in recent_members:
-        for autoproxy_ in autoproxies.values():
-            if autoproxy_.member == member.id:
-                autoproxy_members[autoproxy_.guild] = member
-
-        if (result := check_member(event, member, debug_log)) is not None:
-            group = next(
-                (group
-                 for group in groups
-                 if member.id in group.members),
-                None
-            )
+            ))
+        }
 
-            if group is None:
-                debug_log.append(
-                    f'Member `{member.name}` not in any group. This should not happen.')
-                continue
+        matches = dict(sorted(
+            matches.items(),
+            key=lambda item: recent.get(item[0], len(recent))
+        ))
 
-            if group.channels and not (channel_ids & group.channels):
-                if autoproxy and autoproxy.guild is not None and autoproxies.get(None):
-                    debug_log.append(
-                        'Autoproxy member restricted to other channels. '
-                        'Falling back to global autoproxy.')
-                    autoproxy = autoproxies[None]
-                continue
+    for member_id, result in matches.items():
+        group = member_groups[member_id]
 
-            if (
-                group.channels and
-                autoproxy and
-                autoproxy.guild is None and
-                autoproxy.member != member.id and
-                autoproxies.get(int(event['guild_id'])) is None
-            ):
+        if group.channels and not (channel_ids & group.channels):
+            if autoproxy and autoproxy.guild is not None and autoproxies.get(None):
                 debug_log.append(
-                    'Matched member in restricted group and different from autoproxy. '
-                    'Auto-creating server autoproxy.')
-                autoproxy = await Autoproxy(
-                    user=usergroup.id,
-                    guild=int(event['guild_id']),
-                    member=member.id,
-                    ts=None
-                ).save()
+                    'Autoproxy member restricted to other channels. '
+                    'Falling back to global autoproxy.')
+                autoproxy = autoproxies[None]
+            continue
 
-            return ProxyData(
-                member=member,
-                autoproxy=autoproxy,
-                content=result.content,
-                reason=result.reason,
-                group=group,
-                tag=member.proxy_tags[result.proxy_tag]
-            )
+        member = context.get_member(member_id)
+
+        if (
+            group.channels and
+            autoproxy and
+            autoproxy.guild is None and
+            autoproxy.member != member.id and
+            autoproxies.get(int(event['guild_id'])) is None
+        ):
+            debug_log.append(
+                'Matched member in restricted group and different from autoproxy. '
+                'Auto-creating server autoproxy.')
+            autoproxy = await Autoproxy(
+                user=usergroup.id,
+                guild=int(event['guild_id']),
+                member=member.id,
+                ts=None
+            ).save()
+
+        return ProxyData(
+            member=member,
+            autoproxy=autoproxy,
+            content=result.content,
+            reason=result.reason,
+            group=group,
+            usergroup=usergroup,
+            tag=member.proxy_tags[result.proxy_tag]
+        )
 
     for group in groups:
         if group.channels and not (channel_ids & group.channels):
@@ -509,68 +395,23 @@ async def get_proxy_data(
                     'Server autoproxy member restricted to other channels. '
                     'Falling back to global autoproxy.')
                 autoproxy = autoproxies[None]
-            continue
-
-        member_ids = group.members - {member.id for member in recent_members}
-
-        if not member_ids:
-            continue
 
-        for member in await ProxyMember.find({
-            '_id': {'$in': list(member_ids)}
-        }).to_list():
-            for autoproxy_ in autoproxies.values():
-                if autoproxy_.member == member.id:
-                    autoproxy_members[autoproxy_.guild] = member
-
-            if (result := check_member(event, member, debug_log)) is not None:
-                if (
-                    group.channels and
-                    autoproxy and
-                    autoproxy.guild is None and
-                    autoproxy.member != member.id and
-                    autoproxies.get(int(event['guild_id'])) is None
-                ):
-                    debug_log.append(
-                        'Matched member in restricted group and different from autoproxy. '
-                        'Auto-creating server autoproxy.')
-                    autoproxy = await Autoproxy(
-                        user=usergroup.id,
-                        guild=int(event['guild_id']),
-                        member=member.id,
-                        ts=None
-                    ).save()
-
-                return ProxyData(
-                    member=member,
-                    autoproxy=autoproxy,
-                    content=result.content,
-                    reason=result.reason,
-                    group=group,
-                    tag=member.proxy_tags[result.proxy_tag]
-                )
-
-    if autoproxy is not None and autoproxy_members.get(autoproxy.guild) is not None:
-        group = next(
-            (group
-             for group in groups
-             if autoproxy_members[autoproxy.guild].id
-             in group.members),
-            None
-        )
-
-        if group is None:
-            debug_log.append(
-                f'Member `{autoproxy_members[autoproxy.guild].name}` not in any group. This should not happen.'
-            )
+    if (
+        autoproxy is not None and
+        autoproxy.member is not None and
+        (group := member_groups.get(autoproxy.member)) is not None and
+        not (group.channels and not (channel_ids & group.channels))
+    ):
+        member = context.get_member(autoproxy.member)
 
-        if group and not (group.channels and not (channel_ids & group.channels)):
+        if member is not None:
             return ProxyData(
-                member=autoproxy_members[autoproxy.guild],
+                member=member,
                 autoproxy=autoproxy,
                 content=event['content'],
                 reason=f'{'Server' if autoproxy.guild else 'Global'} Autoproxy',
-                group=group
+                group=group,
+                usergroup=usergroup
             )
 
     if autoproxy is None or autoproxy.member is None:
@@ -585,27 +426,6 @@ async def get_proxy_data(
     return None
 
 
-async def _new_webhook(
-    channel_id: str,
-    name: str
-) -> dict:
-    webhook = await request(
-        Route(
-            'POST',
-            '/channels/{channel_id}/webhooks',
-            token=env.bot_token,
-            channel_id=channel_id),
-        json={
-            'name': name
-        }
-    )
-
-    if webhook.get('url') is None:
-        raise ValueError('Webhook creation failed.')
-
-    return webhook
-
-
 async def get_webhook(
     event: dict,
     use_next: bool,
@@ -628,28 +448,10 @@ async def get_webhook(
 
     channel_id = channel.data.get('id')
 
-    webhooks: list[dict] | None = await redis.json().get(
-        f'discord:webhooks:{channel_id}'
-    )
-
-    if webhooks is None:
-        from .listener import on_webhooks_update
-
-        await on_webhooks_update({
-            'channel_id': channel_id,
-            'guild_id': event['guild_id']
-        }, time_ns(), True)
-
-        webhooks: list[dict] | None = await redis.json().get(
-            f'discord:webhooks:{channel_id}'
-        )
+    webhooks = await WEBHOOKS.get(channel_id)
 
     if webhook_id is not None:
-        webhook = next((
-            webhook
-            for webhook in webhooks
-            if webhook.get('id') == webhook_id
-        ), None)
+        webhook = webhooks.get_by_id(webhook_id)
 
         if webhook is None:
             raise ValueError(f'Webhook with id {webhook_id} not found.')
@@ -666,20 +468,12 @@ async def get_webhook(
     if webhook_index > 2:
         raise ValueError('Webhook index exceeded.')
 
-    webhook = next(
-        (webhook
-         for webhook in webhooks
-         if (
-             webhook.get('name') == webhook_name and
-             webhook.get('url') is not None
-         )),
-        {}
-    )
+    webhook = webhooks.by_name.get(webhook_name)
 
-    if not webhook and len(webhooks) >= 15:
+    if webhook is None and len(webhooks.webhooks) >= 15:
         raise OverWebhookLimit('Webhook limit reached.')
 
-    return webhook or await _new_webhook(
+    return webhook or await WEBHOOKS.create(
         channel_id,
         webhook_name
     )
@@ -748,20 +542,12 @@ async def insert_emojis(
             for value in response
         ]
     else:
-        redis_response = [0] * len([
-            emoji
-            for emojis_ in emojis_used.values()
-            for emoji in emojis_
-        ])
+        redis_response = [0] * len(unsharded_used)
 
     to_clone = [
         emoji
         for emoji, exists in
-        zip([
-            emoji
-            for emojis_ in emojis_used.values()
-            for emoji in emojis_
-        ], redis_response, strict=True)
+        zip(unsharded_used, redis_response, strict=True)
         if not exists
     ]
 
@@ -773,61 +559,20 @@ async def insert_emojis(
             'Max emoji clone limit (10) reached.')
         to_clone = to_clone[:10]
 
-    app_emojis: dict[int, ProbableEmoji] = {}
+    app_emojis, failed = await acquire_emojis(to_clone, token)
 
-    async def _clone_emoji(emoji: ProbableEmoji) -> None:
-        response = await request(
-            Route(
-                'POST',
-                '/applications/{application_id}/emojis',
-                token=token),
-            json={
-                'name': f'{emoji.name[:28]}_{await emoji_index()}',
-                'image': bytes_to_base64_data(await emoji.read())})
-        app_emojis[emoji.id] = ProbableEmoji(
-            name=response['name'],
-            id=int(response['id']),
-            animated=response['animated']
-        )
-
-    with span(f'cloning {len(to_clone)} emojis'):
-        clone_responses = await gather(*[
-            _clone_emoji(emoji)
-            for emoji in
-            to_clone],
-            return_exceptions=True)
-
-        if (count := sum(
-            1
-            for response in
-            clone_responses
-            if isinstance(response, BaseException)
-        )):
-            await delete_emojis([
-                ClonedEmoji(
-                    id=emoji.id,
-                    token=token)
-                for emoji in
-                app_emojis.values()])
-            debug_log.append(f'Failed to clone {count} emoji.')
-            return content
-
-    for emoji, exists in zip(unsharded_used, redis_response, strict=True):
-        if exists or emoji.id not in app_emojis:
-            continue
+    if failed:
+        await release_emojis(list(app_emojis.values()))
+        debug_log.append(f'Failed to clone {failed} emoji.')
+        return content
 
+    for emoji in to_clone:
         content = content.replace(
             str(emoji),
-            str(app_emojis[emoji.id])
+            str(app_emojis[emoji.id].emoji)
         )
 
-    emojis.extend([
-        ClonedEmoji(
-            id=emoji.id,
-            token=token)
-        for emoji in
-        app_emojis.values()
-    ])
+    emojis.extend(app_emojis.values())
 
     cx().set_attribute(
         'proxy.cloned_emojis',
@@ -995,17 +740,6 @@ def format_reply(
     return None
 
 
-def do_roll(input: str) -> tuple[str, str, str, float]:
-    for forbidden in {'ir', 'ie'}:
-        if forbidden in input.split(':')[0]:
-            raise ValueError(f'Forbidden command: {forbidden}')
-
-    st = perf_counter()
-    history, result = roll(input)
-    et = perf_counter()
-    return input, result, history, round((et-st)*1000, 4)
-
-
 async def insert_blocks(
     content: str,
     debug_log: list[str]
@@ -1014,8 +748,6 @@ async def insert_blocks(
 
     rolls = []
 
-    executor = ProcessPoolExecutor()
-
     for block in BLOCK_PATTERN.finditer(content):
         if CHANNEL_MENTION_PATTERN.match(block.group(1).strip()):
             continue  # ! do redirection
@@ -1027,33 +759,24 @@ async def insert_blocks(
 
         rolls.append((
             block.group(0),
-            to_process(executor, do_roll, block.group(1))
+            block.group(1)
         ))
 
     if not rolls:
         if roll_log:
             debug_log.append('\n  '.join(roll_log))
-        executor.shutdown()
         return content, {}, True
 
     st = perf_counter()
-    try:
-        async with timeout(1):
-            results = await gather(
-                *(roll[1] for roll in rolls),
-                return_exceptions=True)
-    except TimeoutError:
-        roll_log.append('Rolls timed out.')
-        debug_log.append('\n  '.join(roll_log))
-        executor.shutdown()
-        return content, {}, True
-    executor.shutdown()
+    results = await gather(
+        *(ROLL_POOL.roll(roll[1]) for roll in rolls),
+        return_exceptions=True)
     et = perf_counter()
 
     final_results = []
 
     for block, value in zip(
-        (roll[0] for roll in rolls),  # noqa: F402
+        (roll[0] for roll in rolls),
         results,
         strict=True
     ):
@@ -1167,10 +890,91 @@ def filesize_check(
     return True
 
 
+async def fetch_attachments(
+    attachments: list[dict],
+    limit: int,
+    debug_log: list[str]
+) -> list[File] | None:
+    # ? attachments are downloaded concurrently, each one is kept in memory
+    # ? up to its share of the budget, then moved to a temporary file
+    spool_size = ATTACHMENT_MEMORY_BUDGET // max(len(attachments), 1)
+    max_size = min(limit, 20_971_520)
+    received = 0
+
+    async def _fetch(attachment: dict) -> File:
+        nonlocal received
+
+        data: BytesIO | BufferedRandom = BytesIO()
+
+        try:
+            async with GENERAL_SESSION.get(attachment['url']) as response:
+                if not response.ok:
+                    raise HTTPException(
+                        f'Failed to fetch attachment: {response.status}')
+
+                async for chunk in response.content.iter_chunked(65_536):
+                    received += len(chunk)
+
+                    if received > max_size:
+                        raise ValueError('Attachments exceed size limit.')
+
+                    if (
+                        isinstance(data, BytesIO) and
+                        data.tell() + len(chunk) > spool_size
+                    ):
+                        spilled = TemporaryFile()  # noqa: SIM115
+                        spilled.write(data.getbuffer())
+                        data = spilled
+
+                    data.write(chunk)
+        except BaseException:
+            data.close()
+            raise
+
+        size = data.tell()
+        data.seek(0)
+
+        return File(
+            data=data,
+            filename=attachment['filename'],
+            description=attachment.get('description'),
+            spoiler=attachment['filename'].startswith('SPOILER_'),
+            duration_secs=attachment.get('duration_secs'),
+            waveform=attachment.get('waveform'),
+            size=size)
+
+    responses = await gather(*[
+        _fetch(attachment)
+        for attachment in attachments
+    ], return_exceptions=True)
+
+    files = [
+        response
+        for response in responses
+        if isinstance(response, File)
+    ]
+
+    if len(files) == len(attachments):
+        return files
+
+    for file in files:
+        file.close()
+
+    if received > max_size:
+        filesize_check(received, limit, debug_log)
+    else:
+        debug_log.append(
+            'Failed to download attachments.')
+
+    return None
+
+
 async def _process_proxy(
     event: dict,
     start_time: int,
-    emojis: list[ClonedEmoji]
+    emojis: list[ClonedEmoji],
+    files: list[File],
+    stage: ProxyStages
 ) -> ProxyResult:
     publish_latency = True
     debug_log: list[str] = []
@@ -1199,7 +1003,8 @@ async def _process_proxy(
         await save_debug_log(event, debug_log)
         return ProxyResult(False, emojis)
 
-    proxy = await get_proxy_data(event, debug_log)
+    with stage('resolve'):
+        proxy = await get_proxy_data(event, debug_log)
 
     if proxy is None:
         await save_debug_log(event, debug_log)
@@ -1211,6 +1016,8 @@ async def _process_proxy(
     if event.get('attachments'):
         publish_latency = False
 
+    latch = None
+
     if proxy.autoproxy is not None:
         if event['content'].startswith('\\'):
             # ? if autoproxy is enabled and,
@@ -1231,13 +1038,19 @@ async def _process_proxy(
             proxy.autoproxy.mode == AutoproxyMode.LATCH
         ):
             proxy.autoproxy.member = proxy.member.id
-            await proxy.autoproxy.save()
-
-    permission = await Permission.for_member(
-        event,
-        debug_log,
-        str(env.application_id)
-    )
+            latch = proxy.autoproxy.save()
+
+    # ? none of these depend on each other
+    with stage('checks'):
+        permission, guild, channel, _ = await gather(
+            Permission.for_member(
+                event,
+                debug_log,
+                str(env.application_id)),
+            Cache.get(f'discord:guild:{event['guild_id']}'),
+            Cache.get(f'discord:channel:{event['channel_id']}'),
+            latch or sleep(0)
+        )
 
     if not permission & Permission.SEND_MESSAGES:
         debug_log.append(
@@ -1263,10 +1076,6 @@ async def _process_proxy(
         await save_debug_log(event, debug_log)
         return ProxyResult(False, emojis)
 
-    guild = await Cache.get(f'discord:guild:{event['guild_id']}')
-
-    channel = await Cache.get(f'discord:channel:{event['channel_id']}')
-
     if guild is None:  # ? should never happen if permission passed
         debug_log.append(
             'Guild not found in cache.')
@@ -1297,29 +1106,19 @@ async def _process_proxy(
         await save_debug_log(event, debug_log)
         return ProxyResult(False, emojis)
 
-    files = [
-        File(
-            data=BytesIO(data),
-            filename=attachment['filename'],
-            description=attachment.get('description'),
-            spoiler=attachment['filename'].startswith('SPOILER_'),
-            duration_secs=attachment.get('duration_secs'),
-            waveform=attachment.get('waveform'),
-            size=len(data))
-        for attachment in event.get('attachments', [])
-        if (data := await (
-            await GENERAL_SESSION.get(attachment['url'])
-        ).read())
-    ]
+    with stage('attachments'):
+        fetched = await fetch_attachments(
+            event.get('attachments', []),
+            filesize_limit,
+            debug_log
+        )
 
-    if not filesize_check(
-        sum(file.size or 0 for file in files),
-        filesize_limit,
-        debug_log
-    ):
+    if fetched is None:
         await save_debug_log(event, debug_log)
         return ProxyResult(False, emojis)
 
+    files.extend(fetched)
+
     with span(  # ? only start the span once we're proxying
         'proxying message',
         start_time=start_time,
@@ -1331,12 +1130,24 @@ async def _process_proxy(
             'proxy.reason': proxy.reason,
             'proxy.cloned_emojis': 0,
             'proxy.attachment_size': total_filesize,
+            **stage.attributes
         }
     ):
-        await redis.set(
-            f'pending_proxy:{event['channel_id']}:{event['id']}',
-            '1', ex=timedelta(seconds=30)
-        )
+        PROXY_LOGS.insert(ProxyLog(
+            author_id=int(event['author']['id']),
+            message_id=int(event['id']),
+            author_name=event['author']['username'],
+            channel_id=int(event['channel_id']),
+            content=sha256(event['content'].encode()).hexdigest()
+        ))
+
+        # ? only needs to exist before the original is deleted,
+        # ? so it's set alongside the first handler
+        prepare = [
+            redis.set(
+                f'pending_proxy:{event['channel_id']}:{event['id']}',
+                '1', ex=timedelta(seconds=30))
+        ]
 
         handlers = ({
             'userproxy': userproxy_handler,
@@ -1351,18 +1162,14 @@ async def _process_proxy(
 
         original_deleted = False
 
-        await ProxyLog(
-            author_id=int(event['author']['id']),
-            message_id=int(event['id']),
-            author_name=event['author']['username'],
-            channel_id=int(event['channel_id']),
-            content=sha256(event['content'].encode()).hexdigest()
-        ).save()
-
         for name, handler in handlers.items():
-            response = await handler(
-                event, proxy, debug_log, emojis
-            )
+            with stage(name):
+                response, *_ = await gather(
+                    handler(event, proxy, debug_log, emojis),
+                    *prepare
+                )
+
+            prepare = []
 
             if response.publish_latency is False:
                 publish_latency = False
@@ -1373,30 +1180,31 @@ async def _process_proxy(
                     return ProxyResult(False, emojis)
                 continue
 
-            tasks = [
-                request(
-                    Route(
-                        'DELETE',
-                        '/channels/{channel_id}/messages/{message_id}',
-                        token=env.bot_token,
-                        channel_id=event['channel_id'],
-                        message_id=event['id']),
-                    reason='/plu/ral proxy')
-                if not original_deleted else
-                sleep(0),
-                await create_request(
-                    response.endpoint,
-                    response.token,
-                    response.json,
-                    response.params,
-                    files
+            with stage('send'):
+                tasks = [
+                    request(
+                        Route(
+                            'DELETE',
+                            '/channels/{channel_id}/messages/{message_id}',
+                            token=env.bot_token,
+                            channel_id=event['channel_id'],
+                            message_id=event['id']),
+                        reason='/plu/ral proxy')
+                    if not original_deleted else
+                    sleep(0),
+                    await create_request(
+                        response.endpoint,
+                        response.token,
+                        response.json,
+                        response.params,
+                        files
+                    )
+                ]
+
+                discord_responses = await gather(
+                    *tasks,
+                    return_exceptions=True
                 )
-            ]
-
-            discord_responses = await gather(
-                *tasks,
-                return_exceptions=True
-            )
 
             match discord_responses:
                 case (BaseException(), BaseException()):
@@ -1415,7 +1223,7 @@ async def _process_proxy(
                         'Failed to delete original message.')
                     return ProxyResult(False, emojis)
                 case (_delete, BaseException()):
-                    await delete_emojis(emojis)
+                    await release_emojis(emojis)
                     original_deleted = True
 
                     if name == 'webhook':
@@ -1456,19 +1264,23 @@ async def _process_proxy(
                 str(debug_log)
             )
 
-        await Message(
+        pipeline = redis.pipeline()
+
+        db_message = Message(
             original_id=int(event['id']),
             proxy_id=int(message['id']),
             author_id=int(event['author']['id']),
-            user=(await Usergroup.get_by_user(int(event['author']['id']))).id,
+            user=proxy.usergroup.id,
             channel_id=int(event['channel_id']),
             member_id=proxy.member.id,
             reason=proxy.reason,
             webhook_id=message.get('webhook_id'),
-            reference_id=event.get('referenced_message', {}).get('id')
-        ).save()
+            reference_id=event.get('referenced_message', {}).get('id'))
 
-        pipeline = redis.pipeline()
+        # ? indexed with the pipeline, so it can be read before it's inserted
+        db_message.index(pipeline)
+        publish_proxy_completion(pipeline, db_message)
+        MESSAGES.insert(db_message)
 
         latency = (
             ((int(message['id']) >> 22) + 1420070400000) -
@@ -1498,6 +1310,12 @@ async def _process_proxy(
             timedelta(days=1), nx=True)
 
         if name == 'webhook':
+            WEBHOOKS.mark_recent(
+                pipeline,
+                channel.data.get('parent_id')
+                if channel.data.get('type') in {11, 12} else
+                event['channel_id'])
+
             pipeline.json().set(
                 f'discord:channel:{event["channel_id"]}',
                 '$.data.__plural_last_member',
@@ -1515,11 +1333,13 @@ async def _process_proxy(
             {'type': name}
         )
 
-        await gather(
-            pipeline.execute(),
-            # ? delete emojis here so they're a child of this span
-            delete_emojis(emojis),
-            save_debug_log(event, debug_log, message['id']))
+        with stage('finalize'):
+            await gather(
+                pipeline.execute(),
+                # ? release emojis here so they're a child of this span
+                release_emojis(emojis),
+                save_debug_log(event, debug_log, message['id']))
+
         return ProxyResult(True, emojis)
 
 
@@ -1534,9 +1354,12 @@ async def webhook_handler(
     )
 
     try:
-        webhook = await get_webhook(
-            event,
-            channel.data.get('__plural_last_member') != proxy.last_member_string)
+        webhook, guild = await gather(
+            get_webhook(
+                event,
+                channel.data.get('__plural_last_member') != proxy.last_member_string),
+            Guild.get_by_id(int(event['guild_id']))
+        )
     except (NotFound, Forbidden):
         debug_log.append(
             'Bot does not have permission to create webhooks.')
@@ -1561,8 +1384,7 @@ async def webhook_handler(
             return ProxyResponse.failure(False)
 
     embeds = []
-
-    usergroup = await Usergroup.get_by_user(int(event['author']['id']))
+    usergroup = proxy.usergroup
 
     proxy.content, roll_embed, publish_latency = (
         await insert_blocks(proxy.content, debug_log)
@@ -1605,7 +1427,7 @@ async def webhook_handler(
             'username': proxy.member.get_display_name(
                 usergroup,
                 proxy.group,
-                await Guild.get_by_id(int(event['guild_id']))),
+                guild),
             'avatar_url': proxy.avatar_url,
             'allowed_mentions': allowed_mentions(
                 proxy,
@@ -1718,8 +1540,7 @@ async def userproxy_handler(
     publish_latency = publish_latency and block_publish_latency
 
     embeds = []
-
-    usergroup = await Usergroup.get_by_user(int(event['author']['id']))
+    usergroup = proxy.usergroup
 
     if roll_embed and usergroup.config.roll_embed:
         embeds.append(roll_embed)
@@ -1753,16 +1574,25 @@ async def process_proxy(
     start_time: int
 ) -> ProxyResult:
     emojis = []
+    files = []
+    stage = ProxyStages()
     try:
         result = await _process_proxy(
             event,
             start_time,
-            emojis
+            emojis,
+            files,
+            stage
         )
 
-        await delete_emojis(emojis)
+        await release_emojis(emojis)
 
         return result
     except BaseException as e:
-        await delete_emojis(emojis)
+        await release_emojis(emojis)
         raise e
+    finally:
+        stage.record()
+
+        for file in files:
+            file.close()
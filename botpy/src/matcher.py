@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from dataclasses import dataclass
+
+from regex import compile, error, IGNORECASE
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from beanie import PydanticObjectId
+    from regex import Pattern
+
+    from plural.db import ProxyMember
+
+
+MENTION_PATTERN = compile(
+    r'<(?:'  # ? handles when proxy tags are <text> and ensures mentions are preserved
+    r'(?:[@#/][!&]?\d+)|'        # ? users, channels, roles
+    r'(?:/(?:\w+ ?){1,3}:)\d+|'  # ? slash commands
+    r'(?:a?:[^:]+:\d+)|'         # ? custom emoji
+    r'(?:t:\d+:[tTdDfFR])|'      # ? timestamps
+    r'(?:id:customize)|'         # ? guild navigation
+    r'(?:sound:\d+)|'            # ? soundmoji (might be deprecated)
+    r'(?:https?://[^\s]+))>')    # ? urls
+
+
+@dataclass
+class CheckMemberResult:
+    content: str
+    proxy_tag: int
+    reason: str
+
+
+@dataclass(frozen=True, eq=False, slots=True)
+class CompiledTag:
+    member_id: PydanticObjectId
+    index: int
+    order: int
+    prefix: str
+    suffix: str
+    case_sensitive: bool
+    mentions: int
+    pattern: Pattern | None
+
+    @property
+    def name(self) -> str:
+        return '​'.join([
+            f'`{self.prefix}`' if self.prefix else '',
+            '`text`',
+            f'`{self.suffix}`' if self.suffix else ''
+        ])
+
+    @property
+    def reason(self) -> str:
+        return ''.join([
+            'Matched proxy tag ',
+            f'`{self.prefix}`' if self.prefix else '',
+            '​`text`​',  # ? zero width spaces to separate markdown
+            f'`{self.suffix}`' if self.suffix else '',
+        ])
+
+
+class TrieNode:
+    __slots__ = ('children', 'tags')
+
+    def __init__(self) -> None:
+        self.children: dict[str, TrieNode] = {}
+        self.tags: list[CompiledTag] = []
+
+
+class Trie:
+    """literal prefixes (or reversed suffixes), walked one character at a time"""
+
+    def __init__(self, case_sensitive: bool) -> None:
+        self.root = TrieNode()
+        self.case_sensitive = case_sensitive
+        self.depth = 0
+
+    def insert(self, key: str, tag: CompiledTag) -> None:
+        node = self.root
+
+        for char in key:
+            if not self.case_sensitive:
+                char = char.lower()
+
+            node = node.children.setdefault(char, TrieNode())
+
+        node.tags.append(tag)
+        self.depth = max(self.depth, len(key))
+
+    def walk(self, chars: Iterable[str]) -> list[CompiledTag]:
+        node, found = self.root, list(self.root.tags)
+
+        for depth, char in enumerate(chars):
+            if depth >= self.depth:
+                break
+
+            node = node.children.get(
+                char if self.case_sensitive else char.lower())
+
+            if node is None:
+                break
+
+            found.extend(node.tags)
+
+        return found
+
+
+class TagMatcher:
+    """
+    every proxy tag available to a user, compiled once
+
+    literal tags are found with a prefix trie and a suffix trie,
+    regex tags are precompiled, so a message is checked against
+    every member in a single pass
+    """
+
+    def __init__(self, members: Iterable[ProxyMember]) -> None:
+        self.member_ids: set[PydanticObjectId] = set()
+        self.prefixes = (Trie(True), Trie(False))
+        self.suffixes = (Trie(True), Trie(False))
+        self.regex_tags: list[CompiledTag] = []
+        self.size = 0
+
+        for member in members:
+            if member.id in self.member_ids:
+                continue
+
+            self.member_ids.add(member.id)
+
+            for index, proxy_tag in enumerate(member.proxy_tags):
+                self._add(member.id, index, proxy_tag)
+
+    def _add(
+        self,
+        member_id: PydanticObjectId,
+        index: int,
+        proxy_tag: ProxyMember.ProxyTag
+    ) -> None:
+        if not proxy_tag.prefix and not proxy_tag.suffix:
+            return
+
+        try:
+            pattern = (
+                compile(
+                    f'^({proxy_tag.prefix})([\\s\\S]*)({proxy_tag.suffix})$',
+                    IGNORECASE if not proxy_tag.case_sensitive else 0)
+                if proxy_tag.regex else
+                None)
+        except error:
+            return
+
+        tag = CompiledTag(
+            member_id=member_id,
+            index=index,
+            order=self.size,
+            prefix=proxy_tag.prefix,
+            suffix=proxy_tag.suffix,
+            case_sensitive=proxy_tag.case_sensitive,
+            mentions=sum((
+                len(MENTION_PATTERN.findall(proxy_tag.prefix)),
+                len(MENTION_PATTERN.findall(proxy_tag.suffix)))),
+            pattern=pattern
+        )
+
+        self.size += 1
+
+        if tag.pattern is not None:
+            self.regex_tags.append(tag)
+            return
+
+        self.prefixes[not tag.case_sensitive].insert(tag.prefix, tag)
+        self.suffixes[not tag.case_sensitive].insert(tag.suffix[::-1], tag)
+
+    def _literal_matches(self, content: str) -> list[tuple[CompiledTag, str]]:
+        prefixed = {
+            tag
+            for trie in self.prefixes
+            for tag in trie.walk(content)
+        }
+
+        return [
+            (tag, content[len(tag.prefix):len(content) - len(tag.suffix)])
+            for trie in self.suffixes
+            for tag in trie.walk(reversed(content))
+            if (
+                tag in prefixed and
+                len(tag.prefix) + len(tag.suffix) <= len(content))
+        ]
+
+    def _regex_matches(
+        self,
+        content: str,
+        debug_log: list[str]
+    ) -> list[tuple[CompiledTag, str]]:
+        matches = []
+
+        for tag in self.regex_tags:
+            try:
+                check = tag.pattern.match(content, timeout=0.0005)
+            except TimeoutError:
+                debug_log.append(
+                    'Regex timeout on proxy tag '
+                    f'{tag.prefix}text{tag.suffix}.')
+                continue
+
+            if check is not None:
+                matches.append((tag, check.group(2)))
+
+        return matches
+
+    def match(
+        self,
+        content: str,
+        has_attachments: bool,
+        debug_log: list[str]
+    ) -> dict[PydanticObjectId, CheckMemberResult]:
+        """first passing tag of every matching member, in the order members were given"""
+        candidates = sorted(
+            self._literal_matches(content) +
+            self._regex_matches(content, debug_log),
+            key=lambda candidate: candidate[0].order
+        )
+
+        results: dict[PydanticObjectId, CheckMemberResult] = {}
+        mentions: int | None = None
+
+        for tag, proxied in candidates:
+            if tag.member_id in results or not (proxied or has_attachments):
+                continue
+
+            if mentions is None:
+                mentions = len(MENTION_PATTERN.findall(content))
+
+            if mentions:
+                proxied_mentions = len(MENTION_PATTERN.findall(proxied))
+                if (
+                    mentions != proxied_mentions and
+                    mentions != proxied_mentions + tag.mentions
+                ):
+                    debug_log.append(
+                        f'Proxy tag {tag.name} '
+                        'Failed to preserve all mentions.')
+                    continue
+
+            results[tag.member_id] = CheckMemberResult(
+                content=proxied,
+                proxy_tag=tag.index,
+                reason=tag.reason
+            )
+
+        return results
@@ -1,7 +1,31 @@
+from typing import Self
+from os import environ
+
 from plural.env import Env as BaseEnv
 
 
 class Env(BaseEnv):
+    event_concurrency: int
+    event_batch_size: int
+    roll_workers: int
+    cache_max_entries: int
+    cache_ttl: float
+    cache_tracking: bool
+    emoji_pool_size: int
+
+    @classmethod
+    def new(cls) -> Self:
+        return cls.model_validate({
+            **BaseEnv.new().model_dump(),
+            'event_concurrency': int(environ.get('EVENT_CONCURRENCY', '32')),
+            'event_batch_size': int(environ.get('EVENT_BATCH_SIZE', '32')),
+            'roll_workers': int(environ.get('ROLL_WORKERS', '2')),
+            'cache_max_entries': int(environ.get('CACHE_MAX_ENTRIES', '65536')),
+            'cache_ttl': int(environ.get('CACHE_TTL_MS', '200')) / 1000,
+            'cache_tracking': environ.get('CACHE_TRACKING', '0') != '0',
+            'emoji_pool_size': int(environ.get('EMOJI_POOL_SIZE', '1900'))
+        })
+
     @property
     def application_id(self) -> int:
         if getattr(self, '_application_id', None) is None:
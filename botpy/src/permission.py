@@ -1,7 +1,12 @@
-from typing import Self, NamedTuple
+from collections import OrderedDict
+from typing import Self
+from time import monotonic
 from enum import Flag
 
-from .cache import Cache
+from orjson import loads
+
+from plural.db.invalidation import on_invalidate
+from plural.db import redis
 
 
 class Permission(Flag):
@@ -124,101 +129,211 @@ class Permission(Flag):
         debug_log: list[str],
         member_id: str
     ) -> Self:
-        channel = await Cache.get(
-            f'discord:channel:{event['channel_id']}'
-        )
+        key = (str(event['guild_id']), str(event['channel_id']), str(member_id))
 
-        guild = await Cache.get(
-            f'discord:guild:{event['guild_id']}'
-        )
+        if (cached := _PERMISSIONS.get(key)) is not None:
+            expires_at, permissions = cached
 
-        member = await Cache.get(
-            f'discord:member:{event['guild_id']}:{member_id}'
-        )
+            if expires_at > monotonic():
+                _PERMISSIONS.move_to_end(key)
+                return permissions
 
-        if channel is None:
-            debug_log.append('Channel not found in cache')
-            return cls(0)
+            _forget(key)
 
-        if guild is None:
-            debug_log.append('Guild not found in cache')
-            return cls(0)
+        generation = _generation
+        result = await _compute(*key)
 
-        if member is None:
-            debug_log.append('Member not found in cache')
+        if isinstance(result, str):
+            debug_log.append(result)
             return cls(0)
 
-        if guild.data.get('owner_id') == str(member_id):
-            return cls.all()
+        permissions = cls(result[0])
+
+        # ? a cache key may have changed after it was read
+        if generation == _generation:
+            _remember(key, permissions, result[1])
+
+        return permissions
+
+
+ALL_PERMISSIONS = Permission.all().value
+ADMINISTRATOR = Permission.ADMINISTRATOR.value
+MAX_CACHED_PERMISSIONS = 16384
+# ? the gateway publishes cache updates, this only
+# ? catches keys that expire without an update
+PERMISSION_TTL = 300
+PERMISSION_SCRIPT = redis.register_script("""
+local channel = redis.call('JSON.GET', KEYS[1], '$.data')
+local owner = redis.call('JSON.GET', KEYS[2], '$.data.owner_id')
+local member = redis.call('JSON.GET', KEYS[3], '$.data')
+local parent = false
+
+if channel then
+    local data = cjson.decode(channel)[1]
+    if (
+        type(data) == 'table' and
+        (data.type == 11 or data.type == 12) and
+        type(data.parent_id) == 'string'
+    ) then
+        parent = redis.call(
+            'JSON.GET', 'discord:channel:' .. data.parent_id, '$.data')
+    end
+end
+
+local result = {channel, owner, member, parent}
+
+for _, role_id in ipairs(redis.call('SMEMBERS', KEYS[4])) do
+    table.insert(result, role_id)
+    table.insert(result, redis.call(
+        'JSON.GET', 'discord:role:' .. role_id, '$.data.permissions'
+    ) or '[]')
+end
+
+return result
+""")
+
+# ? (guild id, channel id, member id) -> (expiry, permissions)
+_PERMISSIONS: OrderedDict[tuple[str, str, str], tuple[float, Permission]] = OrderedDict()
+# ? cache key -> permissions computed from it, and the reverse
+_DEPENDENTS: dict[str, set[tuple[str, str, str]]] = {}
+_DEPENDENCIES: dict[tuple[str, str, str], list[str]] = {}
+_generation = 0
+
+
+@on_invalidate('discord')
+def _invalidate_key(key: str) -> None:
+    global _generation
+    _generation += 1
+
+    if key == '*':
+        _PERMISSIONS.clear()
+        _DEPENDENTS.clear()
+        _DEPENDENCIES.clear()
+        return
+
+    for dependent in _DEPENDENTS.pop(key, set()):
+        _forget(dependent)
+
+
+def _forget(key: tuple[str, str, str]) -> None:
+    _PERMISSIONS.pop(key, None)
+
+    for dependency in _DEPENDENCIES.pop(key, []):
+        if (dependents := _DEPENDENTS.get(dependency)) is not None:
+            dependents.discard(key)
+
+            if not dependents:
+                del _DEPENDENTS[dependency]
 
-        roles = await guild.fetch_meta('roles')
 
-        # ? everyone role as base
-        permissions = next(
-            Permission(int(role.data['permissions']))
-            for role in roles
-            if role.data.get('id') == guild.data.get('id')
+def _remember(
+    key: tuple[str, str, str],
+    permissions: Permission,
+    dependencies: list[str]
+) -> None:
+    _forget(key)
+
+    _PERMISSIONS[key] = (monotonic() + PERMISSION_TTL, permissions)
+    _DEPENDENCIES[key] = dependencies
+
+    for dependency in dependencies:
+        _DEPENDENTS.setdefault(dependency, set()).add(key)
+
+    while len(_PERMISSIONS) > MAX_CACHED_PERMISSIONS:
+        _forget(next(iter(_PERMISSIONS)))
+
+
+def _first(raw: str | None) -> object:
+    # ? JSON.GET with a path returns every match as a list
+    return next(iter(loads(raw)), None) if raw is not None else None
+
+
+async def _compute(
+    guild_id: str,
+    channel_id: str,
+    member_id: str
+) -> tuple[int, list[str]] | str:
+    """
+    (permissions, cache keys they were computed from),
+    or the reason they couldn't be computed
+    """
+    channel, owner_id, member, parent, *role_table = (
+        await PERMISSION_SCRIPT(keys=[
+            f'discord:channel:{channel_id}',
+            f'discord:guild:{guild_id}',
+            f'discord:member:{guild_id}:{member_id}',
+            f'discord:guild:{guild_id}:roles'
+        ])
+    )
+
+    if (channel := _first(channel)) is None:
+        return 'Channel not found in cache'
+
+    if owner_id is None:
+        return 'Guild not found in cache'
+
+    if (member := _first(member)) is None:
+        return 'Member not found in cache'
+
+    member_roles = member.get('roles', [])
+
+    dependencies = [
+        f'discord:guild:{guild_id}',
+        f'discord:channel:{channel_id}',
+        f'discord:member:{guild_id}:{member_id}',
+        *(f'discord:role:{role_id}'
+          for role_id in (guild_id, *member_roles))
+    ]
+
+    if _first(owner_id) == member_id:
+        return ALL_PERMISSIONS, dependencies
+
+    roles = {
+        role_id: int(_first(permissions) or 0)
+        for role_id, permissions in zip(
+            role_table[::2],
+            role_table[1::2],
+            strict=True
         )
+    }
 
-        for role in [
-            role
-            for role in roles
-            if role.data.get('id') in
-            member.data.get('roles', [])
-        ]:
-            permissions |= Permission(int(role.data['permissions']))
-
-        if permissions & cls.ADMINISTRATOR:
-            return cls.all()
-
-        if channel.data.get('type') in {11, 12}:
-            channel = await Cache.get(
-                f'discord:channel:{channel.data.get("parent_id")}'
-            )
-
-            if channel is None:
-                debug_log.append('Parent channel not found in cache')
-                return cls(0)
-
-        overwrites = {
-            overwrite.id: overwrite
-            for overwrite in [
-                Overwrite(
-                    id=data.get('id'),
-                    type=data.get('type'),
-                    allow=Permission(int(data.get('allow', 0))),
-                    deny=Permission(int(data.get('deny', 0)))
-                )
-                for data in
-                channel.data.get('permission_overwrites', [])
-            ]
-        }
-
-        # ? @everyone first
-        if (overwrite := overwrites.pop(guild.data.get('id'), None)) is not None:
-            permissions &= ~overwrite.deny
-            permissions |= overwrite.allow
-
-        allow = Permission.NONE
-        deny = Permission.NONE
-
-        for role_id in member.data.get('roles', []):
-            if (overwrite := overwrites.pop(role_id, None)) is not None:
-                allow |= overwrite.allow
-                deny |= overwrite.deny
-
-        permissions &= ~deny
-        permissions |= allow
-
-        if (overwrite := overwrites.pop(member_id, None)) is not None:
-            permissions &= ~overwrite.deny
-            permissions |= overwrite.allow
+    # ? everyone role as base
+    permissions = roles.get(guild_id, 0)
 
-        return permissions
+    for role_id in member_roles:
+        permissions |= roles.get(role_id, 0)
+
+    if permissions & ADMINISTRATOR:
+        return ALL_PERMISSIONS, dependencies
+
+    if channel.get('type') in {11, 12}:
+        if (channel := _first(parent)) is None:
+            return 'Parent channel not found in cache'
+
+        dependencies.append(f'discord:channel:{channel['id']}')
+
+    overwrites = {
+        data.get('id'): (int(data.get('allow', 0)), int(data.get('deny', 0)))
+        for data in channel.get('permission_overwrites', [])
+    }
+
+    # ? @everyone first
+    if (overwrite := overwrites.pop(guild_id, None)) is not None:
+        permissions &= ~overwrite[1]
+        permissions |= overwrite[0]
+
+    allow = deny = 0
+
+    for role_id in member_roles:
+        if (overwrite := overwrites.pop(role_id, None)) is not None:
+            allow |= overwrite[0]
+            deny |= overwrite[1]
+
+    permissions &= ~deny
+    permissions |= allow
 
+    if (overwrite := overwrites.pop(member_id, None)) is not None:
+        permissions &= ~overwrite[1]
+        permissions |= overwrite[0]
 
-class Overwrite(NamedTuple):
-    id: str
-    type: int
-    allow: Permission
-    deny: Permission
+    return permissions, dependencies
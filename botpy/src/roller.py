@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+from asyncio import Queue, Task, create_task, get_running_loop, sleep, timeout
+from signal import signal, SIGINT, SIG_IGN
+from multiprocessing import get_context
+from typing import TYPE_CHECKING, Any
+from time import perf_counter
+
+from plural.otel import get_histogram, get_up_down_counter
+from plural.errors import PluralException
+
+from .models import env
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+
+# ? spawn so workers don't inherit the event loop or open sockets
+CONTEXT = get_context('spawn')
+ROLL_TIMEOUT = 1
+WORKER_STARTUP_TIMEOUT = 30
+
+
+class RollError(PluralException):
+    ...
+
+
+def do_roll(input: str) -> tuple[str, str, str, float]:
+    from .caith import roll
+
+    for forbidden in {'ir', 'ie'}:
+        if forbidden in input.split(':')[0]:
+            raise ValueError(f'Forbidden command: {forbidden}')
+
+    st = perf_counter()
+    history, result = roll(input)
+    et = perf_counter()
+    return input, result, history, round((et-st)*1000, 4)
+
+
+def _worker(connection: Connection) -> None:
+    from .caith import roll  # noqa: F401 # ? import before the first roll
+
+    # ? shutdown is handled by the bot process
+    signal(SIGINT, SIG_IGN)
+
+    connection.send((True, None))
+
+    while True:
+        try:
+            input = connection.recv()
+        except EOFError:
+            return
+
+        try:
+            connection.send((True, do_roll(input)))
+        except Exception as e:  # noqa: BLE001
+            connection.send((False, str(e)))
+
+
+class RollWorker:
+    def __init__(self) -> None:
+        self.connection, child = CONTEXT.Pipe()
+        self.process = CONTEXT.Process(
+            target=_worker,
+            args=(child,),
+            daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    async def _receive(self, limit: float) -> tuple[bool, Any]:
+        loop = get_running_loop()
+        readable = loop.create_future()
+
+        def on_readable() -> None:
+            if not readable.done():
+                readable.set_result(None)
+
+        loop.add_reader(self.connection.fileno(), on_readable)
+
+        try:
+            async with timeout(limit):
+                await readable
+        finally:
+            loop.remove_reader(self.connection.fileno())
+
+        return self.connection.recv()
+
+    async def ready(self) -> None:
+        await self._receive(WORKER_STARTUP_TIMEOUT)
+
+    async def roll(
+        self,
+        input: str,
+        limit: float
+    ) -> tuple[str, str, str, float]:
+        self.connection.send(input)
+
+        success, value = await self._receive(limit)
+
+        if not success:
+            raise RollError(value)
+
+        return value
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.connection.close()
+
+
+class RollPool:
+    """
+    pre-started roll worker processes, kept for the lifetime of the bot
+
+    a worker that times out or dies is replaced on its own,
+    the rest of the pool keeps running
+    """
+
+    def __init__(self, size: int, limit: float) -> None:
+        self.size = size
+        self.limit = limit
+        self._idle: Queue[RollWorker] = Queue()
+        self._workers: set[RollWorker] = set()
+        self._starting: set[Task] = set()
+
+    def start(self) -> None:
+        for _ in range(self.size - len(self._workers)):
+            self._add_worker()
+
+    def _add_worker(self) -> None:
+        worker = RollWorker()
+        self._workers.add(worker)
+
+        task = create_task(self._start_worker(worker))
+        self._starting.add(task)
+        task.add_done_callback(self._starting.discard)
+
+    async def _start_worker(self, worker: RollWorker) -> None:
+        # ? only hand out workers once caith is imported,
+        # ? so startup time doesn't count against the roll timeout
+        try:
+            await worker.ready()
+        except (TimeoutError, EOFError, OSError):
+            await sleep(1)
+            self._replace_worker(worker)
+            return
+
+        self._idle.put_nowait(worker)
+
+    def _replace_worker(self, worker: RollWorker) -> None:
+        worker.kill()
+        self._workers.discard(worker)
+        self._add_worker()
+
+    async def roll(self, input: str) -> tuple[str, str, str, float]:
+        if not self._workers:
+            self.start()
+
+        queue_depth = get_up_down_counter('roll.queue_depth')
+
+        st = perf_counter()
+        queue_depth.add(1)
+        try:
+            # ? workers that keep failing to start are never handed out
+            async with timeout(self.limit):
+                worker = await self._idle.get()
+        except TimeoutError:
+            raise RollError('Roll timed out.') from None
+        finally:
+            queue_depth.add(-1)
+
+        get_histogram('roll.queue_wait', 'ms').record(
+            (perf_counter() - st) * 1000)
+
+        st = perf_counter()
+
+        try:
+            result = await worker.roll(input, self.limit)
+        except TimeoutError:
+            self._replace_worker(worker)
+            raise RollError('Roll timed out.') from None
+        except (EOFError, OSError):
+            self._replace_worker(worker)
+            raise RollError('Roll worker exited unexpectedly.') from None
+        except RollError:
+            self._idle.put_nowait(worker)
+            raise
+        except BaseException:
+            # ? a cancelled roll may leave a response in the pipe
+            self._replace_worker(worker)
+            raise
+
+        self._idle.put_nowait(worker)
+
+        get_histogram('roll.latency', 'ms').record(
+            (perf_counter() - st) * 1000)
+
+        return result
+
+    def shutdown(self) -> None:
+        for task in self._starting:
+            task.cancel()
+
+        for worker in self._workers:
+            worker.kill()
+
+        self._workers.clear()
+        self._idle = Queue()
+
+
+ROLL_POOL = RollPool(env.roll_workers, ROLL_TIMEOUT)
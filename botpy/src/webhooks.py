@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from asyncio import Task, create_task, shield
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from time import time
+
+from redis.exceptions import ResponseError
+
+from plural.db.invalidation import on_invalidate
+from plural.db import redis
+
+from .http import Route, request
+from .models import env
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine
+
+    from redis.asyncio.client import Pipeline
+
+
+MAX_CACHED_CHANNELS = 8192
+RECENT_CHANNELS_KEY = 'webhook_channels:recent'
+MAX_RECENT_CHANNELS = 16384
+PREWARM_CHANNELS = 2048
+
+
+@dataclass
+class ChannelWebhooks:
+    webhooks: list[dict]
+    # ? usable webhooks by name, so proxy webhooks are found without a scan
+    by_name: dict[str, dict] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        for webhook in self.webhooks:
+            self._resolve(webhook)
+
+    def _resolve(self, webhook: dict) -> None:
+        if webhook.get('url') is not None and webhook.get('name'):
+            self.by_name.setdefault(webhook['name'], webhook)
+
+    def add(self, webhook: dict) -> None:
+        self.webhooks.append(webhook)
+        self._resolve(webhook)
+
+    def get_by_id(self, webhook_id: str) -> dict | None:
+        return next((
+            webhook
+            for webhook in self.webhooks
+            if webhook.get('id') == webhook_id
+        ), None)
+
+
+async def fetch_webhooks(channel_id: str) -> list[dict]:
+    """webhooks from discord, written to the redis cache"""
+    webhooks = await request(Route(
+        'GET',
+        '/channels/{channel_id}/webhooks',
+        token=env.bot_token,
+        channel_id=channel_id
+    ))
+
+    await redis.json().set(
+        f'discord:webhooks:{channel_id}',
+        '$',
+        webhooks
+    )
+
+    return webhooks
+
+
+async def _new_webhook(
+    channel_id: str,
+    name: str
+) -> dict:
+    webhook = await request(
+        Route(
+            'POST',
+            '/channels/{channel_id}/webhooks',
+            token=env.bot_token,
+            channel_id=channel_id),
+        json={
+            'name': name
+        }
+    )
+
+    if webhook.get('url') is None:
+        raise ValueError('Webhook creation failed.')
+
+    return webhook
+
+
+class WebhookDirectory:
+    """
+    webhooks of recently proxied channels, kept in memory
+
+    only one fetch or creation per channel is in flight at a time,
+    so messages sent together in a new channel share a webhook,
+    and channels are dropped when discord sends a webhooks update
+    """
+
+    def __init__(self, max_channels: int) -> None:
+        self.max_channels = max_channels
+        self._channels: OrderedDict[str, ChannelWebhooks] = OrderedDict()
+        self._fetching: dict[str, Task[ChannelWebhooks]] = {}
+        self._creating: dict[tuple[str, str], Task[dict]] = {}
+        self._generation = 0
+
+    def _store(self, channel_id: str, channel: ChannelWebhooks) -> None:
+        self._channels[channel_id] = channel
+        self._channels.move_to_end(channel_id)
+
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+
+    async def _load(self, channel_id: str) -> ChannelWebhooks:
+        # ? anything invalidated while we were waiting may be stale
+        generation = self._generation
+
+        webhooks: list[dict] | None = await redis.json().get(
+            f'discord:webhooks:{channel_id}'
+        )
+
+        if webhooks is None:
+            webhooks = await fetch_webhooks(channel_id)
+
+        channel = ChannelWebhooks(webhooks)
+
+        if generation == self._generation:
+            self._store(channel_id, channel)
+
+        return channel
+
+    def _single_flight[T](
+        self,
+        tasks: dict,
+        key: str | tuple[str, str],
+        coroutine_factory: Callable[[], Coroutine[None, None, T]]
+    ) -> Task[T]:
+        if (task := tasks.get(key)) is None:
+            task = tasks[key] = create_task(coroutine_factory())
+            task.add_done_callback(self._done(tasks, key))
+
+        return task
+
+    @staticmethod
+    def _done(
+        tasks: dict,
+        key: str | tuple[str, str]
+    ) -> Callable[[Task], None]:
+        def callback(task: Task) -> None:
+            tasks.pop(key, None)
+
+            # ? errors are raised to whoever is waiting, a refresh
+            # ? nobody is waiting on just tries again on the next proxy
+            if not task.cancelled():
+                task.exception()
+
+        return callback
+
+    async def get(self, channel_id: str) -> ChannelWebhooks:
+        if (channel := self._channels.get(channel_id)) is not None:
+            self._channels.move_to_end(channel_id)
+            return channel
+
+        return await shield(self._single_flight(
+            self._fetching,
+            channel_id,
+            lambda: self._load(channel_id)))
+
+    async def _create(self, channel_id: str, name: str) -> dict:
+        webhook = await _new_webhook(channel_id, name)
+
+        if (channel := self._channels.get(channel_id)) is not None:
+            channel.add(webhook)
+
+        # ? discord sends a webhooks update soon after,
+        # ? until then other instances can find it in redis
+        with suppress(ResponseError):
+            await redis.json().arrappend(
+                f'discord:webhooks:{channel_id}',
+                '$',
+                webhook
+            )
+
+        return webhook
+
+    async def create(self, channel_id: str, name: str) -> dict:
+        return await shield(self._single_flight(
+            self._creating,
+            (channel_id, name),
+            lambda: self._create(channel_id, name)))
+
+    def invalidate(self, channel_id: str) -> None:
+        self._generation += 1
+
+        if channel_id == '*':
+            self._channels.clear()
+            return
+
+        if self._channels.pop(channel_id, None) is None:
+            return
+
+        # ? the channel was in use, so read it again from redis
+        # ? before the next proxy needs it
+        self._single_flight(
+            self._fetching,
+            channel_id,
+            lambda: self._load(channel_id))
+
+    def mark_recent(self, pipeline: Pipeline, channel_id: str) -> None:
+        pipeline.zadd(RECENT_CHANNELS_KEY, {channel_id: time()})
+        pipeline.zremrangebyrank(RECENT_CHANNELS_KEY, 0, -MAX_RECENT_CHANNELS - 1)
+
+    async def prewarm(self) -> None:
+        channel_ids: list[str] = await redis.zrevrange(
+            RECENT_CHANNELS_KEY, 0, PREWARM_CHANNELS - 1
+        )
+
+        if not channel_ids:
+            return
+
+        pipeline = redis.pipeline()
+
+        for channel_id in channel_ids:
+            pipeline.json().get(f'discord:webhooks:{channel_id}')
+
+        # ? oldest first, so the most recent channels are kept
+        for channel_id, webhooks in reversed(list(zip(
+            channel_ids,
+            await pipeline.execute(),
+            strict=True
+        ))):
+            if webhooks is not None and channel_id not in self._channels:
+                self._store(channel_id, ChannelWebhooks(webhooks))
+
+
+WEBHOOKS = WebhookDirectory(MAX_CACHED_CHANNELS)
+
+
+@on_invalidate('webhooks')
+def _invalidate_webhooks(channel_id: str) -> None:
+    WEBHOOKS.invalidate(channel_id)
@@ -12,6 +12,7 @@ pub struct Env {
     pub max_avatar_size: u32,
     pub dev: bool,
     pub internal_master_token: String,
+    pub token_hmac_key: String,
     pub admins: Vec<u64>,
     pub patreon_secret: String,
     pub info_bot_token: String,
@@ -37,6 +38,7 @@ impl Default for Env {
             dev,
             internal_master_token: var("INTERNAL_MASTER_TOKEN")
                 .expect("INTERNAL_MASTER_TOKEN is not set"),
+            token_hmac_key: var("TOKEN_HMAC_KEY").unwrap_or("".to_string()),
             admins: var("ADMINS")
                 .unwrap_or("".to_string())
                 .split(',')
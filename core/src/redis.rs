@@ -5,6 +5,7 @@ pub use fred::{
     error::Error as RedisError,
     interfaces::{
         KeysInterface,
+        PubsubInterface,
         RedisJsonInterface,
         SetsInterface,
         StreamsInterface
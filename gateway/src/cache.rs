@@ -15,6 +15,7 @@ use plural_core::{
         Expiration,
         KeysInterface,
         Pipeline,
+        PubsubInterface,
         RedisClient,
         RedisError,
         RedisJsonInterface,
@@ -53,6 +54,9 @@ static PUBLISHED_EVENTS: [&str; 4] = [
     "WEBHOOKS_UPDATE"
 ];
 
+// ? consumers drop anything derived from these keys, e.g. permissions
+static INVALIDATION_CHANNEL: &str = "plural:invalidate";
+
 pub static UNSUPPORTED_EVENTS: [&str; 3] = ["READY", "RESUMED", "UNKNOWN"];
 
 pub enum Response {
@@ -100,9 +104,45 @@ pub async fn cache_and_publish(json: Value) -> Result<Response, RedisError> {
 
     let _: () = pipeline.all().await?;
 
+    // ? only after the pipeline, so consumers can't read the old value
+    for key in invalidated_keys(&json) {
+        let _: i64 = redis()
+            .publish(INVALIDATION_CHANNEL, format!("gateway:discord:{key}"))
+            .await?;
+    }
+
     response
 }
 
+fn invalidated_keys(json: &Value) -> Vec<String> {
+    let data = &json["d"];
+
+    match json["t"].as_str().unwrap_or("UNKNOWN") {
+        "GUILD_CREATE" | "GUILD_UPDATE" | "GUILD_DELETE" => data["id"]
+            .as_str()
+            .map(|guild_id| format!("discord:guild:{guild_id}")),
+        "GUILD_ROLE_CREATE" | "GUILD_ROLE_UPDATE" => data["role"]["id"]
+            .as_str()
+            .map(|role_id| format!("discord:role:{role_id}")),
+        "GUILD_ROLE_DELETE" => data["role_id"]
+            .as_str()
+            .map(|role_id| format!("discord:role:{role_id}")),
+        "CHANNEL_CREATE" | "CHANNEL_UPDATE" | "CHANNEL_DELETE" |
+        "THREAD_CREATE" | "THREAD_UPDATE" | "THREAD_DELETE" => data["id"]
+            .as_str()
+            .map(|channel_id| format!("discord:channel:{channel_id}")),
+        "GUILD_MEMBER_UPDATE" => data["guild_id"]
+            .as_str()
+            .zip(data["user"]["id"].as_str())
+            .map(|(guild_id, user_id)| {
+                format!("discord:member:{guild_id}:{user_id}")
+            }),
+        _ => None
+    }
+    .into_iter()
+    .collect()
+}
+
 async fn is_duplicate(json: &Value) -> Result<bool, RedisError> {
     let hash = {
         let mut hasher = FxHasher::default();
@@ -0,0 +1,251 @@
+"""
+per-interaction cpu time of verifying and parsing an interaction body
+
+    python -m bench.ingest --iterations 5000
+
+compares the key validator decoding the body for the application id,
+trying it as a webhook event and then as an interaction, before fastapi
+parses it again for the route, with checking the signature over the raw
+bytes and validating the one decoded payload
+"""
+from __future__ import annotations
+
+from time import process_time_ns
+from contextlib import suppress
+from argparse import ArgumentParser
+from typing import TYPE_CHECKING
+from json import loads as json_loads
+from asyncio import run
+from os import environ
+
+from orjson import dumps, loads
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from nacl.signing import SigningKey
+
+
+SAMPLE_ID = '123456789012345678'
+TIMESTAMP = '1700000000'
+
+
+def sample_payloads(application_id: int) -> dict[str, dict]:
+    user = {
+        'id': SAMPLE_ID,
+        'username': 'bench',
+        'discriminator': '0',
+        'global_name': 'bench',
+        'avatar': None
+    }
+
+    base = {
+        'id': SAMPLE_ID,
+        'application_id': str(application_id),
+        'token': 'a' * 200,
+        'version': 1,
+        'app_permissions': '2248473465835073',
+        'locale': 'en-US',
+        'guild_locale': 'en-US',
+        'guild_id': SAMPLE_ID,
+        'channel_id': SAMPLE_ID,
+        'entitlements': [],
+        'authorizing_integration_owners': {'0': SAMPLE_ID, '1': SAMPLE_ID},
+        'context': 0,
+        'attachment_size_limit': 10485760,
+        'member': {
+            'user': user,
+            'roles': [SAMPLE_ID] * 5,
+            'joined_at': '2024-01-01T00:00:00.000000+00:00',
+            'deaf': False,
+            'mute': False,
+            'flags': 0,
+            'permissions': '2248473465835073'
+        }
+    }
+
+    return {
+        'command': {
+            **base,
+            'type': 2,
+            'data': {
+                'id': SAMPLE_ID,
+                'name': 'member',
+                'type': 1,
+                'options': [{
+                    'name': 'avatar',
+                    'type': 1,
+                    'options': [{'name': 'member', 'type': 3, 'value': 'bench'}]
+                }]
+            }
+        },
+        'component': {
+            **base,
+            'type': 3,
+            'data': {'custom_id': 'bench_button', 'component_type': 2},
+            'message': {
+                'id': SAMPLE_ID,
+                'channel_id': SAMPLE_ID,
+                'type': 0,
+                'content': 'bench ' * 200,
+                'author': user,
+                'timestamp': '2024-01-01T00:00:00.000000+00:00',
+                'edited_timestamp': None,
+                'tts': False,
+                'mention_everyone': False,
+                'mentions': [],
+                'mention_roles': [],
+                'attachments': [],
+                'embeds': [],
+                'pinned': False,
+                'flags': 64,
+                'components': [{
+                    'type': 1,
+                    'components': [
+                        {'type': 2, 'style': 1, 'custom_id': f'bench_{index}', 'label': 'bench'}
+                        for index in range(5)]
+                }]
+            }
+        }
+    }
+
+
+def legacy_ingest(
+    body: bytes,
+    signature: str,
+    public_key: str
+) -> object:
+    # ? how an interaction was verified and parsed before it was parsed once
+    from pydantic_core import ValidationError
+    from nacl.signing import VerifyKey
+
+    from src.discord import Interaction, WebhookEvent
+
+    request_body = body.decode()
+    int(loads(request_body)['application_id'])
+
+    VerifyKey(bytes.fromhex(public_key)).verify(
+        f'{TIMESTAMP}{request_body}'.encode(),
+        bytes.fromhex(signature))
+
+    with suppress(ValidationError):
+        WebhookEvent.model_validate_json(request_body)
+
+    Interaction.model_validate_json(request_body)
+
+    # ? fastapi then parsed the body again for the route argument
+    return Interaction.model_validate(json_loads(body))
+
+
+def single_parse_ingest(
+    body: bytes,
+    signature: str,
+    public_key: str  # noqa: ARG001
+) -> object:
+    from src.core.auth import INTERACTION_KEYS
+    from src.discord import Interaction
+    from src.core.models import env
+
+    payload = loads(body)
+    int(payload['application_id'])
+
+    # ? what the cached key lookup returns, without the coroutine overhead
+    INTERACTION_KEYS.get(env.application_id).verify_key.verify(
+        TIMESTAMP.encode() + body,
+        bytes.fromhex(signature))
+
+    return Interaction.model_validate(payload)
+
+
+def measure(
+    ingest: Callable[[bytes, str, str], object],
+    iterations: int,
+    body: bytes,
+    signature: str,
+    public_key: str
+) -> float:
+    st = process_time_ns()
+
+    for _ in range(iterations):
+        ingest(body, signature, public_key)
+
+    return (process_time_ns() - st) / iterations
+
+
+def dump(interaction: object) -> dict:
+    return interaction.model_dump(exclude={'response', 'followup'}, warnings=False)
+
+
+async def setup(signing_key: SigningKey) -> int:
+    from opentelemetry.sdk.resources import Resource
+
+    import plural.otel
+
+    plural.otel.otel_resource = Resource({'service.name': 'api-bench'})
+
+    from plural.db import redis_init
+
+    # ? models read redis on import, no connection is made
+    await redis_init()
+
+    from src.core.auth import INTERACTION_KEYS
+    from src.core.models import env
+
+    # ? normally read from discord by env.init
+    env._application_id = int(SAMPLE_ID)
+    env._public_key = signing_key.verify_key.encode().hex()
+    env._info_application_id = None
+    env._info_public_key = None
+
+    await INTERACTION_KEYS.get_or_load(env.application_id)
+
+    return env.application_id
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--iterations', type=int, default=5_000)
+    args = parser.parse_args()
+
+    # ? env is read on import, nothing here connects to anything
+    environ.setdefault('BOT_TOKEN', 'MTAwMDAwMDAwMDAwMDAwMDAw.GAAAAA.' + 'a' * 38)
+    environ.setdefault('DISCORD_URL', 'http://localhost')
+    environ.setdefault('REDIS_URL', 'redis://localhost:6379')
+    environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    environ.setdefault('DOMAIN', 'localhost')
+    environ.setdefault('MAX_AVATAR_SIZE', '8388608')
+    environ.setdefault('CDN_UPLOAD_TOKEN', 'bench')
+    environ.setdefault('DEV', '0')
+
+    from nacl.signing import SigningKey
+
+    signing_key = SigningKey(b'\1' * 32)
+    public_key = signing_key.verify_key.encode().hex()
+    application_id = run(setup(signing_key))
+
+    for name, payload in sample_payloads(application_id).items():
+        body = dumps(payload)
+        signature = signing_key.sign(TIMESTAMP.encode() + body).signature.hex()
+
+        if (
+            dump(legacy_ingest(body, signature, public_key)) !=
+            dump(single_parse_ingest(body, signature, public_key))
+        ):
+            raise SystemExit(f'{name} parsed differently')
+
+        # ? warm up validators
+        measure(legacy_ingest, 100, body, signature, public_key)
+        measure(single_parse_ingest, 100, body, signature, public_key)
+
+        legacy = measure(legacy_ingest, args.iterations, body, signature, public_key)
+        single = measure(single_parse_ingest, args.iterations, body, signature, public_key)
+
+        print(f'{name} interaction, {len(body)} bytes')  # noqa: T201
+        print(f'  {'four passes':<24}{legacy / 1000:10.2f} us cpu/interaction')  # noqa: T201
+        print(  # noqa: T201
+            f'  {'single parse':<24}{single / 1000:10.2f} us cpu/interaction'
+            f'{legacy / single:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
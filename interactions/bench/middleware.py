@@ -0,0 +1,172 @@
+"""
+per-request route resolution overhead of the api middleware stack
+
+    python -m bench.middleware --iterations 20000
+
+compares the ratelimiter and otel_trace middlewares each scanning every
+route, with resolving the route once and reusing it from the scope
+"""
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from time import perf_counter_ns
+from typing import TYPE_CHECKING
+from asyncio import run
+from os import environ
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from starlette.routing import BaseRoute
+    from fastapi.routing import APIRoute
+
+
+SAMPLE_ID = '123456789012345678'
+# ? both middlewares resolve the route, the router matches it again after
+MIDDLEWARES = 2
+
+
+def legacy_resolve(
+    scope: dict,
+    routes: Sequence[BaseRoute]
+) -> tuple[APIRoute, dict] | None:
+    # ? how each middleware found the route before it was resolved once
+    from starlette.routing import Match
+    from fastapi.routing import APIRoute
+
+    for route in routes:
+        match, data = route.matches(scope)
+
+        if match == Match.FULL and isinstance(route, APIRoute):
+            return route, data
+
+    return None
+
+
+def sample_scopes(routes: Sequence[BaseRoute]) -> list[dict]:
+    from fastapi.routing import APIRoute
+
+    from src.core.route import PATH_PATTERN
+
+    return [
+        {
+            'type': 'http',
+            'method': method,
+            'path': PATH_PATTERN.sub(SAMPLE_ID, route.path),
+            'root_path': '',
+            'path_params': {}
+        }
+        for route in routes
+        if isinstance(route, APIRoute)
+        for method in sorted(route.methods)
+    ]
+
+
+def measure_legacy(
+    iterations: int,
+    scopes: list[dict],
+    routes: Sequence[BaseRoute]
+) -> float:
+    st = perf_counter_ns()
+
+    for index in range(iterations):
+        scope = dict(scopes[index % len(scopes)])
+
+        for _ in range(MIDDLEWARES):
+            legacy_resolve(scope, routes)
+
+    return (perf_counter_ns() - st) / iterations
+
+
+def measure_resolver(
+    iterations: int,
+    scopes: list[dict],
+    routes: Sequence[BaseRoute]
+) -> float:
+    from src.core.route import RouteResolver
+
+    resolver = RouteResolver()
+
+    st = perf_counter_ns()
+
+    for index in range(iterations):
+        scope = dict(scopes[index % len(scopes)])
+
+        for _ in range(MIDDLEWARES):
+            resolver.resolve(scope, routes)
+
+    return (perf_counter_ns() - st) / iterations
+
+
+async def load_routes() -> list[BaseRoute]:
+    from opentelemetry.sdk.resources import Resource
+
+    import plural.otel
+
+    plural.otel.otel_resource = Resource({'service.name': 'api-bench'})
+
+    from plural.db import redis_init
+
+    # ? routers read redis on import, no connection is made
+    await redis_init()
+
+    from src.core import app
+    from src.routers import (
+        application,
+        redis_proxy,
+        userproxies,
+        autoproxy,
+        donation,
+        discord,
+        message,
+        member,
+        group,
+        user
+    )
+
+    return [
+        *app.routes,
+        *(
+            route
+            for module in (
+                application, autoproxy, discord, donation, group,
+                member, message, redis_proxy, user, userproxies)
+            for route in module.router.routes
+        )
+    ]
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--iterations', type=int, default=20_000)
+    args = parser.parse_args()
+
+    # ? env is read on import, nothing here connects to anything
+    environ.setdefault('BOT_TOKEN', 'MTAwMDAwMDAwMDAwMDAwMDAw.GAAAAA.' + 'a' * 38)
+    environ.setdefault('DISCORD_URL', 'http://localhost')
+    environ.setdefault('REDIS_URL', 'redis://localhost:6379')
+    environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    environ.setdefault('DOMAIN', 'localhost')
+    environ.setdefault('MAX_AVATAR_SIZE', '8388608')
+    environ.setdefault('CDN_UPLOAD_TOKEN', 'bench')
+    environ.setdefault('DEV', '0')
+
+    routes = run(load_routes())
+    scopes = sample_scopes(routes)
+
+    # ? warm up regex and dispatch table
+    measure_legacy(len(scopes), scopes, routes)
+    measure_resolver(len(scopes), scopes, routes)
+
+    legacy = measure_legacy(args.iterations, scopes, routes)
+    resolver = measure_resolver(args.iterations, scopes, routes)
+
+    print(f'{len(routes)} routes, {len(scopes)} sample requests')  # noqa: T201
+    print(f'{'linear scan per middleware':<28}{legacy / 1000:10.2f} us/request')  # noqa: T201
+    print(  # noqa: T201
+        f'{'resolved once':<28}{resolver / 1000:10.2f} us/request'
+        f'{legacy / resolver:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
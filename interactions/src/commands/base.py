@@ -27,6 +27,7 @@ from plural.db import (
 
 from src.core.version import VERSION, LAST_TEN_COMMITS
 from src.core.http import File, GENERAL_SESSION
+from src.core.ratelimit import redis_throttle
 from src.core.models import env
 from src.discord import (
     ApplicationCommandOptionType,
@@ -657,20 +658,17 @@ async def slash_export(
 ) -> None:
     usergroup = await interaction.get_usergroup()
 
-    # ! probably move rate limit to a dedicated function
-    response = await redis.execute_command(
-        'CL.THROTTLE',
-        f'command:export:{usergroup.id}:{format}',
-        0,
+    response = await redis_throttle(
+        f'throttle:export:{usergroup.id}:{format}',
         1,
         600
     )
 
-    if response[0]:
+    if response.block:
         raise InteractionError(
             'You can only export once every 10 minutes\n\n'
             'Please try again '
-            f'<t:{int(datetime.now(UTC).timestamp() + response[4])}:R>'
+            f'<t:{int(datetime.now(UTC).timestamp() + response.retry_after)}:R>'
         )
 
     export = await PluralExport.from_user_id(
@@ -149,9 +149,7 @@ async def button_delete_confirm(interaction: Interaction) -> None:
         '_id': {'$in': list(member_ids)}
     }).delete_many())
 
-    tasks.append(Message.find({
-        'author_id': interaction.author_id
-    }).delete_many())
+    tasks.append(Message.delete_by_author(interaction.author_id))
 
     tasks.append(Autoproxy.find({
         'user': usergroup.id,
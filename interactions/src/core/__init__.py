@@ -9,11 +9,10 @@ from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
 from fastapi import FastAPI, Response, Request, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.routing import APIRoute
-from starlette.routing import Match
-from regex import compile
 from orjson import dumps
 
+from plural.db.invalidation import invalidation_listener
+from plural.db.completion import PROXY_COMPLETIONS
 from plural.db import mongo_init, redis_init
 from plural.utils import create_strong_task
 from plural.missing import is_not_missing
@@ -23,15 +22,10 @@ from plural.otel import span
 from src.core.version import VERSION
 from src.core.models import env
 
-from .route import SUPPRESSED_PATHS, ROUTE_NAMES, suppress
+from .route import SUPPRESSED_PATHS, ROUTES, suppress
 from .stupid_openapi_patch import patched_openapi
 
 
-PATH_PATTERN = compile(
-    r'{(.*?)}'
-)
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator:
     with span(f'initializing api instance {INSTANCE}'):
@@ -76,11 +70,17 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
         app.include_router(userproxies.router)
 
     create_strong_task(install_count_loop())
+    completions = create_strong_task(PROXY_COMPLETIONS.listen())
+    invalidations = create_strong_task(invalidation_listener())
 
     yield
 
-    from src.core.http import DISCORD_SESSION, GENERAL_SESSION
+    completions.cancel()
+    invalidations.cancel()
+
+    from src.core.http import DISCORD, GENERAL_SESSION
     from src.routers.discord import RUNNING
+    from src.core.auth import BCRYPT_POOL
 
     if RUNNING:
         print(f'waiting for {len(RUNNING)} tasks to finish...')  # noqa: T201
@@ -88,9 +88,11 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
 
     await gather(
         GENERAL_SESSION.close(),
-        DISCORD_SESSION.close()
+        DISCORD.close()
     )
 
+    BCRYPT_POOL.shutdown(wait=False, cancel_futures=True)
+
 
 async def install_count_loop() -> None:
     from asyncio import sleep
@@ -216,27 +218,22 @@ async def ratelimiter(
     ):
         return await call_next(request)
 
-    for route in app.routes:
-        match, data = route.matches(request.scope)
-
-        if match == Match.FULL and isinstance(route, APIRoute):
-            break
-    else:
+    if (resolved := ROUTES.resolve(request.scope, app.routes)) is None:
         return await call_next(request)
 
-    auth, key = (
-        (True, request.headers['Authorization'].split('.')[0].strip())
-        if 'Authorization' in request.headers else
-        (False, request.scope['client'][0])
-    )
+    auth, key = 'Authorization' in request.headers, request.scope['client'][0]
 
     if auth:
         try:
-            await (
-                selfhosting_key_validator
-                if route.path in {'/userproxies'} else
-                api_key_validator
-            )(request.headers['Authorization'])
+            # ? keyed on the parsed id, the first token segment is
+            # ? the same v2 prefix for every v2 token
+            key = str(
+                (await selfhosting_key_validator(
+                    request.headers['Authorization'])).id
+                if resolved.route.path in {'/userproxies'} else
+                (await api_key_validator(
+                    request.headers['Authorization'])).app_id
+            )
         except HTTPException as e:
             return Response(
                 dumps(e.detail)
@@ -248,8 +245,8 @@ async def ratelimiter(
 
     limit_response = await ratelimit_check(
         key,
-        route.endpoint,
-        data.get('path_params', {}),
+        resolved.route.endpoint,
+        resolved.path_params,
         auth
     )
 
@@ -302,22 +299,12 @@ async def otel_trace(
     request: Request,
     call_next: Callable[..., Awaitable[Any]]
 ) -> Any:  # noqa: ANN401
-    for route in app.routes:
-        match, data = route.matches(request.scope)
-
-        if match == Match.FULL and isinstance(route, APIRoute):
-            break
-    else:
+    if (resolved := ROUTES.resolve(request.scope, app.routes)) is None:
         return await call_next(request)
 
-    if route.endpoint in SUPPRESSED_PATHS:
+    if resolved.route.endpoint in SUPPRESSED_PATHS:
         return await call_next(request)
 
-    path = ROUTE_NAMES.get(
-        route.endpoint,
-        PATH_PATTERN.sub(r':\1', route.path)
-    )
-
     parent = None
     if (
         request.headers.get('authorization') ==
@@ -326,14 +313,14 @@ async def otel_trace(
         parent = request.headers.get('traceparent')
 
     with span(
-        f'{request.method} {path}',
+        f'{request.method} {resolved.name}',
         parent=parent,
         attributes={
             'http.path': request.url.path,
             'http.method': request.method,
             'http.path_params': [
                 f'{key}={value}'
-                for key, value in data.get('path_params', {}).items()],
+                for key, value in resolved.path_params.items()],
             'http.query_params': [
                 f'{key}={value}'
                 for key, value in dict(request.query_params).items()
@@ -1,9 +1,14 @@
 from concurrent.futures import ThreadPoolExecutor
-from asyncio import get_event_loop
+from asyncio import Task, create_task, get_running_loop, shield
+from collections import OrderedDict
+from contextlib import contextmanager
+from collections.abc import Iterator
 from dataclasses import dataclass
-from typing import Annotated
+from typing import Annotated, Any
 from re import match, escape
+from time import monotonic
 from hashlib import sha256
+from os import cpu_count
 
 from fastapi import Security, HTTPException, Request, Header
 from fastapi.security.api_key import APIKeyHeader
@@ -14,7 +19,14 @@ from bcrypt import checkpw
 from orjson import loads
 
 from plural.db import ProxyMember, Group, Usergroup, Application, redis
-from plural.crypto import decode_b66, BASE66CHARS
+from plural.db.invalidation import on_invalidate
+from plural.crypto import (
+    TOKEN_V2_HASH_PREFIX,
+    TOKEN_V2_PREFIX,
+    BASE66CHARS,
+    check_token_v2,
+    decode_b66
+)
 from beanie import PydanticObjectId
 from plural.otel import span, cx
 
@@ -26,6 +38,7 @@ TOKEN_MATCH_PATTERN = ''.join([
     f'^([{escape(BASE66CHARS)}]', r'{1,16})\.',
     f'([{escape(BASE66CHARS)}]', r'{5,8})\.',
     f'([{escape(BASE66CHARS)}]', r'{20,27})$'])
+TOKEN_V2_MATCH_PATTERN = f'^{escape(TOKEN_V2_PREFIX)}{TOKEN_MATCH_PATTERN[1:]}'
 
 API_KEY = APIKeyHeader(
     name='Authorization',
@@ -55,10 +68,12 @@ class TokenData:
     app_id: PydanticObjectId
     timestamp: int
     key: int
+    version: int = 1
 
     @property
     def redis_key(self) -> str:
         return 'token:' + sha256('.'.join([
+            *(('v2',) if self.version == 2 else ()),
             str(int.from_bytes(self.app_id.binary)),
             str(self.timestamp),
             str(self.key)]).encode()
@@ -80,142 +95,394 @@ class TokenData:
         ))
 
 
+# ? bcrypt releases the gil, so a few threads check in parallel
+BCRYPT_POOL = ThreadPoolExecutor(
+    max_workers=min(4, cpu_count() or 1),
+    thread_name_prefix='bcrypt'
+)
+_CHECKING: dict[tuple[str, str], Task[bool]] = {}
+
+
+async def _checkpw(password: str, hashed: str) -> bool:
+    return await get_running_loop().run_in_executor(
+        BCRYPT_POOL,
+        checkpw,
+        password.encode(),
+        hashed.encode()
+    )
+
+
 async def acheckpw(password: str, hashed: str) -> bool:
-    with ThreadPoolExecutor() as executor:
-        return await get_event_loop(
-        ).run_in_executor(
-            executor,
-            lambda: checkpw(password.encode(), hashed.encode())
+    """concurrent checks of the same password and hash share one bcrypt run"""
+    key = (password, hashed)
+
+    if (task := _CHECKING.get(key)) is None:
+        task = _CHECKING[key] = create_task(_checkpw(password, hashed))
+        task.add_done_callback(lambda _: _CHECKING.pop(key, None))
+
+    # ? one cancelled request shouldn't cancel the check for the others
+    return await shield(task)
+
+
+class VerifiedTokens[T: (Application, Usergroup)]:
+    """
+    tokens that recently passed bcrypt, with the document they belong to,
+    dropped after `ttl` seconds or when the document changes in any process
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_size: int = 4096
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._tokens: OrderedDict[str, tuple[float, T]] = OrderedDict()
+        # ? bumped on every revocation, so a check that started before
+        # ? a token was rotated doesn't store the old document after it
+        self.generation = 0
+
+    def get(self, key: str) -> T | None:
+        if (entry := self._tokens.get(key)) is None:
+            return None
+
+        expires, document = entry
+
+        if expires < monotonic():
+            del self._tokens[key]
+            return None
+
+        self._tokens.move_to_end(key)
+        return document
+
+    def set(self, key: str, document: T, generation: int) -> None:
+        if generation != self.generation:
+            return
+
+        self._tokens[key] = (monotonic() + self.ttl, document)
+        self._tokens.move_to_end(key)
+
+        while len(self._tokens) > self.max_size:
+            self._tokens.popitem(last=False)
+
+    def revoke(self, document_id: str) -> None:
+        self.generation += 1
+
+        if document_id == '*':
+            self._tokens.clear()
+            return
+
+        for key in [
+            key
+            for key, (_, document) in self._tokens.items()
+            if str(document.id) == document_id
+        ]:
+            del self._tokens[key]
+
+
+APPLICATION_TOKENS = VerifiedTokens[Application]()
+SELFHOSTING_TOKENS = VerifiedTokens[Usergroup]()
+
+
+@on_invalidate('applications')
+def _invalidate_application(application_id: str) -> None:
+    APPLICATION_TOKENS.revoke(application_id)
+
+
+@dataclass(frozen=True, slots=True)
+class InteractionAuth:
+    verify_key: VerifyKey
+    expires: float
+    # ? the rest is only set for userproxies
+    member_id: PydanticObjectId | None = None
+    group_id: PydanticObjectId | None = None
+    account_id: PydanticObjectId | None = None
+    # ? users of the owning usergroup, and users the group is shared with
+    authorized_users: frozenset[int] = frozenset()
+
+    def depends_on(self, collection: str, document_id: str) -> bool:
+        match collection:
+            case 'members':
+                return str(self.member_id) == document_id
+            case 'groups':
+                return str(self.group_id) == document_id
+            case 'usergroups':
+                return str(self.account_id) == document_id
+
+        return False
+
+
+class InteractionKeys:
+    """
+    public keys of every application interactions are received for,
+    and who may use each userproxy, so checking a request is pure cpu
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600.0,
+        max_size: int = 16384
+    ) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._keys: OrderedDict[int, InteractionAuth] = OrderedDict()
+        self.generation = 0
+
+    def get(self, application_id: int) -> InteractionAuth | None:
+        if (auth := self._keys.get(application_id)) is None:
+            return None
+
+        if auth.expires < monotonic():
+            del self._keys[application_id]
+            return None
+
+        self._keys.move_to_end(application_id)
+        return auth
+
+    def set(
+        self,
+        application_id: int,
+        auth: InteractionAuth,
+        generation: int
+    ) -> None:
+        if generation != self.generation:
+            return
+
+        self._keys[application_id] = auth
+        self._keys.move_to_end(application_id)
+
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
+    def revoke(self, collection: str, document_id: str) -> None:
+        self.generation += 1
+
+        if document_id == '*':
+            # ? the main bots' keys never change
+            for application_id in [
+                application_id
+                for application_id, auth in self._keys.items()
+                if auth.member_id is not None
+            ]:
+                del self._keys[application_id]
+            return
+
+        for application_id in [
+            application_id
+            for application_id, auth in self._keys.items()
+            if auth.depends_on(collection, document_id)
+        ]:
+            del self._keys[application_id]
+
+    async def _load(self, application_id: int) -> InteractionAuth:
+        expires = monotonic() + self.ttl
+
+        match application_id:
+            case env.application_id:
+                return InteractionAuth(
+                    VerifyKey(bytes.fromhex(env.public_key)), expires)
+            case env.info_application_id:
+                return InteractionAuth(
+                    VerifyKey(bytes.fromhex(env.info_public_key)), expires)
+
+        # ? read past beanie's cache, this may be right after an invalidation
+        member = await ProxyMember.find_one(
+            {'userproxy.bot_id': application_id},
+            ignore_cache=True
         )
 
+        if not isinstance(member, ProxyMember) or member.userproxy is None:
+            raise HTTPException(400, 'Invalid application id')
 
-async def api_key_validator(token: str = Security(API_KEY)) -> TokenData:
-    if token == f'Bearer {env.cdn_upload_token}':
-        return TokenData(
-            app_id=PydanticObjectId(b'\0' * 12),
-            timestamp=0,
-            key=0
+        group = await member.get_group(use_cache=False)
+        usergroup = await group.get_usergroup(use_cache=False)
+
+        return InteractionAuth(
+            verify_key=VerifyKey(bytes.fromhex(member.userproxy.public_key)),
+            expires=expires,
+            member_id=member.id,
+            group_id=group.id,
+            account_id=usergroup.id,
+            authorized_users=frozenset({*usergroup.users, *group.users})
         )
 
-    regex = match(TOKEN_MATCH_PATTERN, token)
+    async def get_or_load(self, application_id: int) -> InteractionAuth:
+        if (auth := self.get(application_id)) is not None:
+            return auth
 
-    if regex is None:
-        raise INVALID_TOKEN
+        generation = self.generation
+        auth = await self._load(application_id)
+        self.set(application_id, auth, generation)
 
-    token_data = TokenData(
-        app_id=PydanticObjectId(decode_b66(regex.group(1)).to_bytes(12)),
-        timestamp=decode_b66(regex.group(2)),
-        key=decode_b66(regex.group(3))
-    )
+        return auth
 
-    if (application := await Application.get(token_data.app_id)) is None:
-        raise EXPIRED_TOKEN
 
-    cx().set_attribute('application_id', str(application.id))
+INTERACTION_KEYS = InteractionKeys()
 
-    token_data._application = application
 
-    if await redis.get(token_data.redis_key):
-        # ? token already validated, bcrypt is slow
-        return token_data
+@on_invalidate('members')
+def _invalidate_member(member_id: str) -> None:
+    INTERACTION_KEYS.revoke('members', member_id)
 
-    if not await acheckpw(token, application.token):
-        raise EXPIRED_TOKEN
 
-    await redis.set(token_data.redis_key, '1', ex=3600)
+@on_invalidate('groups')
+def _invalidate_group(group_id: str) -> None:
+    INTERACTION_KEYS.revoke('groups', group_id)
 
-    return token_data
 
+@on_invalidate('usergroups')
+def _invalidate_usergroup(usergroup_id: str) -> None:
+    SELFHOSTING_TOKENS.revoke(usergroup_id)
+    INTERACTION_KEYS.revoke('usergroups', usergroup_id)
 
-async def selfhosting_key_validator(token: str = Security(API_KEY)) -> Usergroup:
-    regex = match(TOKEN_MATCH_PATTERN, token)
+
+async def verify_token(
+    token: str,
+    token_data: TokenData,
+    hashed: str
+) -> bool:
+    if token_data.version == 2:
+        # ? an hmac is cheaper to check than a round trip to redis
+        return check_token_v2(token, hashed)
+
+    if hashed.startswith(TOKEN_V2_HASH_PREFIX):
+        # ? reset to a v2 token, this one isn't valid anymore
+        return False
+
+    # ? the redis entry holds the hash it was checked against,
+    # ? so a rotated token no longer matches it
+    if await redis.get(token_data.redis_key) == hashed:
+        return True
+
+    if not await acheckpw(token, hashed):
+        return False
+
+    await redis.set(token_data.redis_key, hashed, ex=3600)
+
+    return True
+
+
+def parse_token(token: str) -> TokenData:
+    version = 2 if token.startswith(TOKEN_V2_PREFIX) else 1
+
+    regex = match(
+        TOKEN_V2_MATCH_PATTERN if version == 2 else TOKEN_MATCH_PATTERN,
+        token
+    )
 
     if regex is None:
         raise INVALID_TOKEN
 
-    token_data = TokenData(
+    return TokenData(
         app_id=PydanticObjectId(decode_b66(regex.group(1)).to_bytes(12)),
         timestamp=decode_b66(regex.group(2)),
-        key=decode_b66(regex.group(3))
+        key=decode_b66(regex.group(3)),
+        version=version
     )
 
-    usergroup = await Usergroup.get(token_data.app_id)
 
-    if usergroup is None:
-        raise EXPIRED_TOKEN
+async def api_key_validator(token: str = Security(API_KEY)) -> TokenData:
+    if token == f'Bearer {env.cdn_upload_token}':
+        return TokenData(
+            app_id=PydanticObjectId(b'\0' * 12),
+            timestamp=0,
+            key=0
+        )
 
-    if usergroup.data.selfhosting_token is None:
-        raise INVALID_TOKEN
+    token_data = parse_token(token)
 
-    cx().set_attribute('usergroup_id', str(usergroup.id))
+    if (application := APPLICATION_TOKENS.get(token_data.redis_key)) is None:
+        generation = APPLICATION_TOKENS.generation
 
-    if await redis.get(token_data.redis_key):
-        # ? token already validated, bcrypt is slow
-        return usergroup
+        if (application := await Application.get(token_data.app_id)) is None:
+            raise EXPIRED_TOKEN
+
+        if not await verify_token(token, token_data, application.token):
+            raise EXPIRED_TOKEN
+
+        APPLICATION_TOKENS.set(token_data.redis_key, application, generation)
+
+    cx().set_attribute('application_id', str(application.id))
+
+    token_data._application = application
+
+    return token_data
+
+
+async def selfhosting_key_validator(token: str = Security(API_KEY)) -> Usergroup:
+    token_data = parse_token(token)
+
+    if (usergroup := SELFHOSTING_TOKENS.get(token_data.redis_key)) is None:
+        generation = SELFHOSTING_TOKENS.generation
+
+        usergroup = await Usergroup.get(token_data.app_id)
+
+        if usergroup is None:
+            raise EXPIRED_TOKEN
 
-    if not await acheckpw(token, usergroup.data.selfhosting_token):
-        raise EXPIRED_TOKEN
+        if usergroup.data.selfhosting_token is None:
+            raise INVALID_TOKEN
 
-    await redis.set(token_data.redis_key, '1', ex=3600)
+        if not await verify_token(
+            token,
+            token_data,
+            usergroup.data.selfhosting_token
+        ):
+            raise EXPIRED_TOKEN
+
+        SELFHOSTING_TOKENS.set(token_data.redis_key, usergroup, generation)
+
+    cx().set_attribute('usergroup_id', str(usergroup.id))
 
     return usergroup
 
 
-async def _discord_key_validator(
+async def _verified_payload(
     request: Request,
-    x_signature_ed25519: Annotated[str, Header()],
-    x_signature_timestamp: Annotated[str, Header()],
-) -> bool:
-    try:
-        request_body = (await request.body()).decode()
-    except Exception as e:
-        raise HTTPException(400, 'Invalid request body') from e
-
+    x_signature_ed25519: str,
+    x_signature_timestamp: str
+) -> tuple[dict[str, Any], InteractionAuth]:
+    """
+    the body, decoded once, after checking its signature over the raw bytes
+    """
     try:
-        application_id = int(loads(request_body)['application_id'])
+        body = await request.body()
+        payload = loads(body)
+        application_id = int(payload['application_id'])
     except Exception as e:
         raise HTTPException(400, 'Invalid request body') from e
 
-    member = None
-    match application_id:
-        case env.application_id:
-            verify_key = VerifyKey(bytes.fromhex(env.public_key))
-        case env.info_application_id:
-            verify_key = VerifyKey(bytes.fromhex(env.info_public_key))
-        case _:
-            member = await ProxyMember.find_one({
-                'userproxy.bot_id': application_id
-            })
+    interaction_auth = await INTERACTION_KEYS.get_or_load(application_id)
 
-            if not isinstance(member, ProxyMember) or member.userproxy is None:
-                raise HTTPException(400, 'Invalid application id')
+    interaction_auth.verify_key.verify(
+        x_signature_timestamp.encode() + body,
+        bytes.fromhex(x_signature_ed25519))
 
-            verify_key = VerifyKey(bytes.fromhex(member.userproxy.public_key))
+    return payload, interaction_auth
 
-    verify_key.verify(
-        f'{x_signature_timestamp}{request_body}'.encode(),
-        bytes.fromhex(x_signature_ed25519))
 
-    try:
-        WebhookEvent.model_validate_json(request_body)
-        return True
-    except ValidationError:
-        pass
+async def _interaction_validator(
+    request: Request,
+    x_signature_ed25519: str,
+    x_signature_timestamp: str
+) -> Interaction:
+    payload, interaction_auth = await _verified_payload(
+        request,
+        x_signature_ed25519,
+        x_signature_timestamp)
 
     try:
-        interaction = Interaction.model_validate_json(request_body)
+        interaction = Interaction.model_validate(payload)
     except ValidationError as invalid:
-        raise HTTPException(
-            400, 'Invalid interaction or webhook event'
-        ) from invalid
+        raise HTTPException(400, 'Invalid interaction') from invalid
 
     if (  # ? always accept pings and interactions directed at the main bots
         interaction.type.value == 1 or
         interaction.application_id in env.fp_application_ids
     ):
-        return True
+        return interaction
 
-    if member is None:
+    if interaction_auth.member_id is None:
         raise HTTPException(400, 'Invalid application id')
 
     user_id = (
@@ -229,28 +496,32 @@ async def _discord_key_validator(
     if user_id is None:
         raise HTTPException(400, 'Invalid user id')
 
-    usergroup = await Usergroup.get_by_user(user_id)
-    group = await member.get_group()
-
-    if (
-        usergroup.id != group.account and
-        user_id not in group.users
-    ):
+    if user_id not in interaction_auth.authorized_users:
         raise HTTPException(401, 'Invalid user id')
 
-    return True
+    return interaction
 
 
-async def discord_key_validator(
+async def _webhook_event_validator(
     request: Request,
-    x_signature_ed25519: Annotated[str, Header()],
-    x_signature_timestamp: Annotated[str, Header()],
-) -> bool:
+    x_signature_ed25519: str,
+    x_signature_timestamp: str
+) -> WebhookEvent:
+    payload, _ = await _verified_payload(
+        request,
+        x_signature_ed25519,
+        x_signature_timestamp)
+
     try:
-        return await _discord_key_validator(
-            request,
-            x_signature_ed25519,
-            x_signature_timestamp)
+        return WebhookEvent.model_validate(payload)
+    except ValidationError as invalid:
+        raise HTTPException(400, 'Invalid webhook event') from invalid
+
+
+@contextmanager
+def _discord_validation() -> Iterator[None]:
+    try:
+        yield
     except BadSignatureError as e:
         raise HTTPException(
             401, 'Invalid request signature'
@@ -261,6 +532,32 @@ async def discord_key_validator(
             raise e
 
 
+async def interaction_validator(
+    request: Request,
+    x_signature_ed25519: Annotated[str, Header()],
+    x_signature_timestamp: Annotated[str, Header()],
+) -> Interaction:
+    """the verified interaction, routes use it instead of parsing the body"""
+    with _discord_validation():
+        return await _interaction_validator(
+            request,
+            x_signature_ed25519,
+            x_signature_timestamp)
+
+
+async def webhook_event_validator(
+    request: Request,
+    x_signature_ed25519: Annotated[str, Header()],
+    x_signature_timestamp: Annotated[str, Header()],
+) -> WebhookEvent:
+    """the verified webhook event, routes use it instead of parsing the body"""
+    with _discord_validation():
+        return await _webhook_event_validator(
+            request,
+            x_signature_ed25519,
+            x_signature_timestamp)
+
+
 async def internal_key_validator(
     request: Request,  # noqa: ARG001
     authorization: Annotated[str, Header()]
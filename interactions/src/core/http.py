@@ -1,33 +1,19 @@
 from __future__ import annotations
 
-from inspect import currentframe, getframeinfo
 from typing import Any, TYPE_CHECKING
 from re import match, IGNORECASE
 from urllib.parse import quote
 from base64 import b64decode
 from sys import version_info
-from os.path import relpath
-from asyncio import sleep
 
-from orjson import loads, dumps
 from aiohttp import (
     __version__ as aiohttp_version,
-    ServerDisconnectedError,
-    ClientResponse,
-    ClientSession,
-    FormData
+    ClientSession
 )
 
-from plural.otel import inject
-from plural.errors import (
-    InteractionError,
-    HTTPException,
-    Unauthorized,
-    ServerError,
-    BadRequest,
-    Forbidden,
-    NotFound
-)
+from plural.http import DiscordClient
+from plural.utils import call_site
+from plural.errors import InteractionError
 
 from src.core.version import VERSION
 from src.core.models import env
@@ -44,7 +30,7 @@ USER_AGENT = ' '.join([
 ])
 
 
-DISCORD_SESSION = ClientSession()
+DISCORD = DiscordClient(USER_AGENT)
 GENERAL_SESSION = ClientSession()
 
 
@@ -71,6 +57,7 @@ class Route:
         **params  # noqa: ANN003
     ) -> None:
         self.method = method
+        self.bucket = f'{method} {path}'
         self.token = token
         self.silent = silent
 
@@ -153,19 +140,6 @@ class File:
         }
 
 
-def get_context() -> str:
-    frame = currentframe()
-    for _ in range(2):
-        if frame is None:
-            return 'unknown'
-
-        frame = frame.f_back
-
-    info = getframeinfo(frame)
-
-    return f'{relpath(info.filename)}:{info.lineno} {info.function}'.removeprefix('src/')
-
-
 async def request(
     route: Route,
     files: Sequence[File] | None = None,
@@ -174,94 +148,19 @@ async def request(
     data: Any | None = None,  # noqa: ANN401
     reason: str | None = None,
     params: dict[str, Any] | None = None,
+    context: str | None = None,
     **request_kwargs  # noqa: ANN003
 ) -> dict[str, Any] | str | None:
-    headers = {
-        'User-Agent': USER_AGENT,
-        'X-Context': get_context()
-    }
-
-    if route.token is not None:
-        headers['Authorization'] = f'Bot {route.token}'
-
-    if route.silent:
-        headers['X-Suppress-Tracer'] = '1'
-
-    # ? this is a stupid way of doing this but imma keep it
-    if sum((json is not None, data is not None, form is not None)) > 1:
-        raise InteractionError('json, data, and form are mutually exclusive')
-
-    if json is not None:
-        headers['Content-Type'] = 'application/json'
-        data = dumps(json)
-
-    if reason:
-        headers['X-Audit-Log-Reason'] = quote(reason, safe='/ ')
-
-    if form:
-        form_data = FormData(quote_fields=False)
-        for param in form:
-            form_data.add_field(**param)
-        data = form_data
-
-    response: ClientResponse | None = None
-
-    for tries in range(5):
-        for f in files or []:
-            f.reset(seek=tries)
-
-        try:
-            async with DISCORD_SESSION.request(
-                route.method,
-                route.url,
-                headers=inject(headers),
-                data=data,
-                params=params,
-                **request_kwargs
-            ) as response:
-                resp_data = await response.text()
-
-                if response.headers.get('Content-Type') == 'application/json':
-                    resp_data = loads(resp_data)
-
-                if 300 > response.status >= 200:
-                    return resp_data
-
-                if response.status == 429:
-                    raise NotImplementedError(
-                        'encountered 429 but rate limiting is handled by the egress proxy')
-
-                if response.status in {500, 502, 503, 504}:
-                    await sleep(1 + tries * 2)
-                    continue
-
-                match response.status:
-                    case 400:
-                        raise BadRequest(resp_data)
-                    case 401:
-                        raise Unauthorized(resp_data)
-                    case 403:
-                        raise Forbidden(resp_data)
-                    case 404:
-                        raise NotFound(resp_data)
-                    case _ if response.status >= 500:
-                        raise ServerError(resp_data)
-                    case _:
-                        raise HTTPException(resp_data)
-
-        except (OSError, ServerDisconnectedError) as e:
-            if isinstance(e, ServerDisconnectedError):
-                continue
-
-            if tries < 4 and e.errno in (54, 10054):
-                await sleep(1 + tries * 2)
-                continue
-            raise
-
-    if response is not None:
-        if response.status >= 500:
-            raise ServerError(data)
-
-        raise HTTPException(data)
-
-    raise RuntimeError('unreachable code in http handling')
+    return await DISCORD.request(
+        route,
+        files=files,
+        form=form,
+        json=json,
+        data=data,
+        reason=reason,
+        params=params,
+        context=(
+            context or call_site()
+            if env.context_header else None),
+        **request_kwargs
+    )
@@ -1,9 +1,21 @@
-from collections.abc import Callable
-from datetime import timedelta
-from typing import NamedTuple
+from __future__ import annotations
+
+from asyncio import Task, TimerHandle, create_task, get_running_loop
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import NamedTuple, TYPE_CHECKING
 from hashlib import sha256
+from math import ceil
 from time import time
 
+from redis.exceptions import RedisError
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from datetime import timedelta
+
+    from redis.commands.core import AsyncScript
+
 
 class RateLimit(NamedTuple):
     limit: int
@@ -11,6 +23,13 @@ class RateLimit(NamedTuple):
     keys: list[str]
 
 
+class Throttle(NamedTuple):
+    block: bool
+    remaining: int
+    retry_after: float
+    reset_after: float
+
+
 class RateLimitResponse(NamedTuple):
     block: bool
     limit: int
@@ -55,18 +74,241 @@ def ratelimit(
     return decorator
 
 
+# ? gcra, times are in seconds, the value of each key is its theoretical arrival time
+THROTTLE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local emission = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local allow_at = tat + emission - emission * limit
+if now < allow_at then
+    return {1, 0, tostring(allow_at - now), tostring(tat - now)}
+end
+tat = tat + emission
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+return {0, math.floor((now - allow_at) / emission), '0', tostring(tat - now)}
+"""
+
+SYNC_SCRIPT = """
+local now = tonumber(ARGV[1])
+local result = {}
+for index, key in ipairs(KEYS) do
+    local count = tonumber(ARGV[index * 2])
+    local emission = tonumber(ARGV[index * 2 + 1])
+    local tat = math.max(tonumber(redis.call('GET', key) or now), now) + count * emission
+    if tat > now then
+        redis.call('SET', key, tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+    end
+    result[index] = tostring(tat)
+end
+return result
+"""
+
+_SCRIPTS: dict[str, AsyncScript] = {}
+
+
+def _script(source: str) -> AsyncScript:
+    if (script := _SCRIPTS.get(source)) is None:
+        from plural.db import redis
+
+        script = _SCRIPTS[source] = redis.register_script(source)
+
+    return script
+
+
+def gcra(
+    tat: float,
+    now: float,
+    emission: float,
+    limit: int
+) -> tuple[Throttle, float]:
+    """the result of a request, and the new theoretical arrival time"""
+    tat = max(tat, now)
+    allow_at = tat + emission - emission * limit
+
+    if now < allow_at:
+        return Throttle(True, 0, allow_at - now, tat - now), tat
+
+    return Throttle(
+        False,
+        int((now - allow_at) / emission),
+        0,
+        tat + emission - now
+    ), tat + emission
+
+
+async def redis_throttle(
+    key: str,
+    limit: int,
+    interval: int
+) -> Throttle:
+    """gcra decided in redis, for limits that have to be exact across instances"""
+    block, remaining, retry_after, reset_after = await _script(THROTTLE_SCRIPT)(
+        keys=[key],
+        args=[time(), interval / limit, limit]
+    )
+
+    return Throttle(
+        block == 1,
+        remaining,
+        float(retry_after),
+        float(reset_after)
+    )
+
+
+@dataclass(slots=True)
+class _Bucket:
+    tat: float
+    emission: float
+    synced_at: float
+    pending: int = 0
+
+
+class RateLimiter:
+    """
+    gcra decided in-process, for keys this instance has seen recently
+
+    requests allowed here are sent to redis in batches, which returns the
+    arrival time including every other instance, so limits stay
+    approximately global; keys that are new, or weren't synced recently,
+    are read from redis first
+    """
+
+    def __init__(
+        self,
+        sync_interval: float = 0.05,
+        stale_after: float = 1.0,
+        max_keys: int = 65_536
+    ) -> None:
+        self.sync_interval = sync_interval
+        self.stale_after = stale_after
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, _Bucket] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._timer: TimerHandle | None = None
+        self._syncing: set[Task] = set()
+
+    async def _load(self, key: str, emission: float) -> _Bucket:
+        tat, = await _script(SYNC_SCRIPT)(
+            keys=[key],
+            args=[time(), 0, emission]
+        )
+
+        # ? another request may have loaded it while we were waiting
+        if (bucket := self._buckets.get(key)) is not None:
+            bucket.tat = max(bucket.tat, float(tat))
+            bucket.synced_at = time()
+            return bucket
+
+        bucket = self._buckets[key] = _Bucket(float(tat), emission, time())
+
+        return bucket
+
+    async def throttle(
+        self,
+        key: str,
+        limit: int,
+        interval: int
+    ) -> Throttle:
+        emission = interval / limit
+
+        bucket = self._buckets.get(key)
+
+        if bucket is None or (
+            not bucket.pending and
+            time() - bucket.synced_at > self.stale_after
+        ):
+            bucket = await self._load(key, emission)
+
+        self._buckets.move_to_end(key)
+
+        result, bucket.tat = gcra(bucket.tat, time(), emission, limit)
+
+        if not result.block:
+            bucket.pending += 1
+            self._dirty.add(key)
+            self._schedule()
+
+        return result
+
+    def _schedule(self) -> None:
+        if self._timer is None:
+            self._timer = get_running_loop().call_later(
+                self.sync_interval,
+                self._start_sync)
+
+    def _start_sync(self) -> None:
+        self._timer = None
+
+        counts: dict[str, tuple[int, float]] = {}
+
+        for key in self._dirty:
+            if (bucket := self._buckets.get(key)) is not None and bucket.pending:
+                counts[key] = (bucket.pending, bucket.emission)
+                bucket.pending = 0
+
+        self._dirty.clear()
+
+        if not counts:
+            return
+
+        task = create_task(self._sync(counts))
+        self._syncing.add(task)
+        task.add_done_callback(self._syncing.discard)
+
+    async def _sync(self, counts: dict[str, tuple[int, float]]) -> None:
+        try:
+            tats = await _script(SYNC_SCRIPT)(
+                keys=list(counts),
+                args=[
+                    time(),
+                    *(
+                        value
+                        for count, emission in counts.values()
+                        for value in (count, emission))]
+            )
+        except RedisError:
+            # ? sent again with the next batch
+            for key, (count, _emission) in counts.items():
+                if (bucket := self._buckets.get(key)) is not None:
+                    bucket.pending += count
+                    self._dirty.add(key)
+
+            self._schedule()
+            return
+
+        now = time()
+
+        for key, tat in zip(counts, tats, strict=True):
+            if (bucket := self._buckets.get(key)) is None:
+                continue
+
+            # ? requests allowed while this was in flight aren't in redis yet
+            bucket.tat = max(bucket.tat, float(tat) + bucket.pending * bucket.emission)
+            bucket.synced_at = now
+
+        while len(self._buckets) > self.max_keys:
+            key, bucket = next(iter(self._buckets.items()))
+
+            if bucket.pending:
+                break
+
+            del self._buckets[key]
+
+
+RATELIMITER = RateLimiter()
+
+
 async def ratelimit_check(
     key: str,
     function: Callable,
     params: dict[str, str],
     auth: bool
 ) -> RateLimitResponse | None:
-    from plural.db import redis
-
     if (function, auth) not in RATELIMITS:
         return None
 
-    limit = RATELIMITS.get((function, auth))
+    limit = RATELIMITS[(function, auth)]
 
     keys = ':'.join([
         value
@@ -74,26 +316,21 @@ async def ratelimit_check(
         if key in limit.keys
     ])
 
-    base_key, bucket = (
-        f'ratelimit:{key}:',
-        sha256(
-            f'{function.__name__}:{int(auth)}:{keys}'.encode()
-        ).hexdigest()[:32]
-    )
+    bucket = sha256(
+        f'{function.__name__}:{int(auth)}:{keys}'.encode()
+    ).hexdigest()[:32]
 
-    response = await redis.execute_command(
-        'CL.THROTTLE',
-        base_key + bucket,
-        limit.limit - 1,
+    result = await RATELIMITER.throttle(
+        f'ratelimit:gcra:{key}:{bucket}',
         limit.limit,
         limit.interval
     )
 
     return RateLimitResponse(
-        block=response[0] == 1,
-        limit=response[1],
-        remaining=response[2],
-        retry_after=response[3],
-        reset=int(time() + response[4]),
+        block=result.block,
+        limit=limit.limit,
+        remaining=result.remaining,
+        retry_after=ceil(result.retry_after),
+        reset=int(time() + result.reset_after),
         bucket=bucket
     )
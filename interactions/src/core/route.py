@@ -1,8 +1,24 @@
-from collections.abc import Callable
+from __future__ import annotations
+
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+from starlette._utils import get_route_path
+from fastapi.routing import APIRoute
+from regex import compile
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    from starlette.routing import BaseRoute
+    from starlette.types import Scope
 
 
 ROUTE_NAMES: dict[Callable, str] = {}
 SUPPRESSED_PATHS: set[Callable] = set()
+ROUTE_SCOPE_KEY = 'plural.route'
+PATH_PATTERN = compile(
+    r'{(.*?)}'
+)
 
 
 def name(name: str) -> Callable:
@@ -19,3 +35,120 @@ def suppress() -> Callable:
         return function
 
     return decorator
+
+
+class ResolvedRoute(NamedTuple):
+    route: APIRoute
+    path_params: dict[str, Any]
+    name: str
+
+
+class _Candidate(NamedTuple):
+    route: APIRoute
+    # ? paths without parameters are compared directly, no regex needed
+    static_path: str | None
+    name: str
+
+
+def _first_segment(path: str) -> str:
+    return path[1:].split('/', 1)[0]
+
+
+class RouteResolver:
+    """
+    matches a request to its APIRoute once, the result is stored on the
+    scope so every middleware can reuse it
+
+    routes are grouped by method and first path segment, only the routes
+    in that group are tried, in the order they were added
+    """
+
+    def __init__(self) -> None:
+        self._routes: Sequence[BaseRoute] | None = None
+        self._size = 0
+        self._table: dict[tuple[str, str | None], list[_Candidate]] = {}
+
+    def _build(self, routes: Sequence[BaseRoute]) -> None:
+        api_routes = [
+            route
+            for route in routes
+            if isinstance(route, APIRoute)
+        ]
+
+        table: dict[tuple[str, str | None], list[_Candidate]] = {}
+
+        # ? routes starting with a parameter are tried for every first segment
+        segments = {
+            _first_segment(route.path)
+            for route in api_routes
+            if not _first_segment(route.path).startswith('{')
+        }
+
+        for route in api_routes:
+            candidate = _Candidate(
+                route,
+                None if route.param_convertors else route.path,
+                ROUTE_NAMES.get(
+                    route.endpoint,
+                    PATH_PATTERN.sub(r':\1', route.path))
+            )
+
+            segment = _first_segment(route.path)
+
+            for method in route.methods or ():
+                if not segment.startswith('{'):
+                    table.setdefault((method, segment), []).append(candidate)
+                    continue
+
+                for key in (None, *segments):
+                    table.setdefault((method, key), []).append(candidate)
+
+        self._routes = routes
+        self._size = len(routes)
+        self._table = table
+
+    def resolve(
+        self,
+        scope: Scope,
+        routes: Sequence[BaseRoute]
+    ) -> ResolvedRoute | None:
+        if ROUTE_SCOPE_KEY in scope:
+            return scope[ROUTE_SCOPE_KEY]
+
+        # ? routers are included during startup, after the first build
+        if routes is not self._routes or len(routes) != self._size:
+            self._build(routes)
+
+        path = get_route_path(scope)
+
+        candidates = self._table.get(
+            (scope['method'], _first_segment(path))
+        ) or self._table.get((scope['method'], None), ())
+
+        resolved = None
+
+        for candidate in candidates:
+            if candidate.static_path is not None:
+                if candidate.static_path == path:
+                    resolved = ResolvedRoute(candidate.route, {}, candidate.name)
+                    break
+
+                continue
+
+            if (match := candidate.route.path_regex.match(path)) is not None:
+                resolved = ResolvedRoute(
+                    candidate.route,
+                    {
+                        key: candidate.route.param_convertors[key].convert(value)
+                        for key, value in match.groupdict().items()
+                    },
+                    candidate.name
+                )
+                break
+
+        scope[ROUTE_SCOPE_KEY] = resolved
+
+        return resolved
+
+
+ROUTES = RouteResolver()
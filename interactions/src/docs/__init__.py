@@ -1,7 +1,12 @@
 from .autoproxy import autoproxy_response, autoproxy_put_request
 from .member import member_response, multi_member_response
 from .group import group_response, multi_group_response
-from .message import message_response, author_response
+from .message import (
+    message_status_response,
+    message_status_request,
+    message_response,
+    author_response
+)
 from .application import application_response
 from .user import usergroup_response
 from .base import Example, response
@@ -16,6 +21,8 @@ __all__ = (
     'group_response',
     'member_response',
     'message_response',
+    'message_status_request',
+    'message_status_response',
     'multi_group_response',
     'multi_member_response',
     'response',
@@ -1,8 +1,14 @@
 from beanie import PydanticObjectId
 
-from src.models.message import MessageModel, AuthorModel
+from src.models.message import (
+    MessageStatusRequest,
+    MessageStatusModel,
+    MessageStatusQuery,
+    MessageModel,
+    AuthorModel
+)
 
-from .base import Example, response
+from .base import Example, response, request
 
 
 message_response = response(
@@ -171,3 +177,39 @@ author_response = response(
         )
     ]
 )
+
+
+message_status_request = request([
+    Example(
+        name='Deleted messages',
+        value=MessageStatusRequest(
+            messages=[
+                MessageStatusQuery(
+                    channel_id=1307354421394669608,
+                    message_id=1353206395104923681),
+                MessageStatusQuery(
+                    channel_id=1307354421394669608,
+                    message_id=1353206395104923700)]
+        ).model_dump(mode='json'))
+])
+
+
+message_status_response = response(
+    description='Message statuses, in the order they were requested',
+    model=list[MessageStatusModel],
+    examples=[
+        Example(
+            name='Deleted messages',
+            value=[
+                MessageStatusModel(
+                    channel_id='1307354421394669608',
+                    message_id='1353206395104923681',
+                    status=200
+                ).model_dump(mode='json'),
+                MessageStatusModel(
+                    channel_id='1307354421394669608',
+                    message_id='1353206395104923700',
+                    status=404
+                ).model_dump(mode='json')])
+    ]
+)
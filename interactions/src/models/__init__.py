@@ -1,5 +1,10 @@
 from .autoproxy import AutoproxyModel, AutoproxyPutModel, AutoproxyPatchModel
-from .message import MessageModel, AuthorModel
+from .message import (
+    MessageStatusRequest,
+    MessageStatusModel,
+    MessageModel,
+    AuthorModel
+)
 from .member import MemberModel, UserproxySync
 from .application import ApplicationModel
 from .usergroup import UsergroupModel
@@ -15,6 +20,8 @@ __all__ = (
     'GroupModel',
     'MemberModel',
     'MessageModel',
+    'MessageStatusModel',
+    'MessageStatusRequest',
     'UserProxyModel',
     'UsergroupModel',
     'UserproxySync',
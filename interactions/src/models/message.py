@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from beanie import PydanticObjectId  # noqa: TC002
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from plural.db.enums import SupporterTier
 
@@ -54,6 +54,25 @@ class MessageModel(BaseModel):
         )
 
 
+class MessageStatusQuery(BaseModel):
+    channel_id: int
+    message_id: int
+
+
+class MessageStatusRequest(BaseModel):
+    messages: list[MessageStatusQuery] = Field(
+        min_length=1,
+        max_length=100,
+        description='the messages to check, up to 100')
+
+
+class MessageStatusModel(BaseModel):
+    channel_id: str
+    message_id: str
+    status: int = Field(
+        description='the status code the HEAD endpoint would return for this message')
+
+
 class AuthorModel(BaseModel):
     id: PydanticObjectId
     name: str
@@ -1,11 +1,12 @@
 from collections.abc import Coroutine
 from asyncio import Task, create_task
+from typing import Annotated
 from time import time
 
 from fastapi.responses import Response, JSONResponse
 from fastapi import APIRouter, Depends
 
-from src.core.auth import discord_key_validator
+from src.core.auth import interaction_validator, webhook_event_validator
 from src.core.models import env
 from src.discord import (
     EventWebhooksType,
@@ -37,18 +38,13 @@ def create_strong_task(coroutine: Coroutine) -> Task:
     return task
 
 
-@router.post(
-    '/interaction',
-    dependencies=[Depends(discord_key_validator)])
-@router.post(  # ? legacy route
-    '/discord/interaction',
-    dependencies=[Depends(discord_key_validator)])
-@router.post(  # ? legacy route
-    '/userproxy/interaction',
-    dependencies=[Depends(discord_key_validator)])
+@router.post('/interaction')
+@router.post('/discord/interaction')  # ? legacy route
+@router.post('/userproxy/interaction')  # ? legacy route
 @suppress()
 async def post__interaction(
-    interaction: Interaction
+    # ? parsed once while verifying, the body isn't read again
+    interaction: Annotated[Interaction, Depends(interaction_validator)]
 ) -> Response:
     # ? immediately pong for pings
     if interaction.type == InteractionType.PING:
@@ -70,16 +66,12 @@ async def post__interaction(
     return Response(status_code=202)
 
 
-@router.post(
-    '/event',
-    dependencies=[Depends(discord_key_validator)])
-@router.post(  # ? legacy route
-    '/discord/event',
-    dependencies=[Depends(discord_key_validator)])
+@router.post('/event')
+@router.post('/discord/event')  # ? legacy route
 @name('/event')
 @suppress()
 async def post__event(
-    event: WebhookEvent
+    event: Annotated[WebhookEvent, Depends(webhook_event_validator)]
 ) -> Response:
     if event.type == WebhookEventType.PING:
         return Response(status_code=204)
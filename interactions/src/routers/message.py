@@ -1,18 +1,28 @@
 from datetime import datetime, timedelta, UTC
+from typing import Annotated
 
-from fastapi import APIRouter, Response, Security
+from fastapi import APIRouter, Body, Response, Security
+from asyncio import gather, shield, wait_for
+from contextlib import suppress
 from textwrap import dedent
-from asyncio import sleep
 from orjson import dumps
 
+from plural.db.completion import PROXY_COMPLETIONS
 from plural.db import redis, Message, ProxyMember
 
 from src.core.auth import api_key_validator, TokenData
-from src.models import MessageModel, AuthorModel
+from src.models import (
+    MessageStatusRequest,
+    MessageStatusModel,
+    MessageModel,
+    AuthorModel
+)
 from src.core.ratelimit import ratelimit
 from src.core.route import name
 
 from src.docs import (
+    message_status_response,
+    message_status_request,
     message_response,
     author_response,
     response,
@@ -21,6 +31,7 @@ from src.docs import (
 
 
 router = APIRouter(prefix='/messages', tags=['Messages'])
+PENDING_PROXY_TIMEOUT = 5
 
 
 def _snowflake_to_age(snowflake: int) -> float:
@@ -31,6 +42,39 @@ def _snowflake_to_age(snowflake: int) -> float:
     ).total_seconds()
 
 
+def _age_status(message_id: int) -> int | None:
+    """the status of a message decided by its age alone, if any"""
+    age = _snowflake_to_age(message_id)
+
+    if age > 604_800:  # 7 days
+        return 410
+
+    if age < -30:
+        return 400
+
+    return None
+
+
+async def _wait_for_message(
+    channel_id: int,
+    message_id: int
+) -> tuple[Message | None, bool]:
+    """the message, waiting for it if a proxy is pending, and whether one was"""
+    with PROXY_COMPLETIONS.waiter(channel_id, message_id) as completion:
+        pending = await redis.exists(f'pending_proxy:{channel_id}:{message_id}')
+
+        message = await Message.find_by_id(channel_id, message_id)
+
+        if message is not None or not pending:
+            return message, bool(pending)
+
+        # ? the future is shared with every other request for this message
+        with suppress(TimeoutError):
+            await wait_for(shield(completion), PENDING_PROXY_TIMEOUT)
+
+        return await Message.find_by_id(channel_id, message_id), True
+
+
 @router.head(
     '/{channel_id}/{message_id}',
     name='Check Message',
@@ -80,13 +124,7 @@ async def head__message(
             headers={'Cache-Control': 'public, max-age=604800'}
         )
 
-    message = await Message.find_one({
-        'channel_id': channel_id,
-        '$or': [
-            {'original_id': message_id},
-            {'proxy_id': message_id}
-        ]
-    })
+    message = await Message.find_by_id(channel_id, message_id)
 
     if message is None:
         return Response(
@@ -158,15 +196,7 @@ async def get__message(
             )
         )
 
-    pending = await redis.exists(f'pending_proxy:{channel_id}:{message_id}')
-
-    message = await Message.find_one({
-        'channel_id': channel_id,
-        '$or': [
-            {'original_id': message_id},
-            {'proxy_id': message_id}
-        ]
-    })
+    message, pending = await _wait_for_message(channel_id, message_id)
 
     if message is None and not pending:
         return Response(
@@ -176,18 +206,6 @@ async def get__message(
             content=dumps({'detail': 'Message not found'})
         )
 
-    limit = 50
-    while message is None and limit > 0:
-        await sleep(0.1)
-        limit -= 1
-        message = await Message.find_one({
-            'channel_id': channel_id,
-            '$or': [
-                {'original_id': message_id},
-                {'proxy_id': message_id}
-            ]
-        })
-
     if message is None:
         return Response(
             status_code=408,
@@ -281,15 +299,7 @@ async def get__message_member(
             )
         )
 
-    pending = await redis.exists(f'pending_proxy:{channel_id}:{message_id}')
-
-    message = await Message.find_one({
-        'channel_id': channel_id,
-        '$or': [
-            {'original_id': message_id},
-            {'proxy_id': message_id}
-        ]
-    })
+    message, pending = await _wait_for_message(channel_id, message_id)
 
     if message is None and not pending:
         return Response(
@@ -299,18 +309,6 @@ async def get__message_member(
             content=dumps({'detail': 'Message not found'})
         )
 
-    limit = 50
-    while message is None and limit > 0:
-        await sleep(0.1)
-        limit -= 1
-        message = await Message.find_one({
-            'channel_id': channel_id,
-            '$or': [
-                {'original_id': message_id},
-                {'proxy_id': message_id}
-            ]
-        })
-
     if message is None:
         return Response(
             status_code=408,
@@ -342,3 +340,64 @@ async def get__message_member(
             member
         ).model_dump(mode='json'))
     )
+
+
+@router.post(
+    '/status',
+    name='Check Messages',
+    description=dedent("""
+    Check if up to 100 messages were either deleted or created by /plu/ral
+
+    Each message gets the status code `HEAD /messages/:id/:id` would return for it, in the order they were requested.
+
+    This endpoint *can* be used unauthorized, but rate limits are much higher when an auth token is provided."""),
+    responses={
+        200: message_status_response,
+        422: response(
+            description='Validation Error',
+            content=None)})
+@name('/messages/status')
+@ratelimit(2, timedelta(seconds=5), auth=False)
+@ratelimit(10, timedelta(seconds=10))
+async def post__message_status(
+    body: Annotated[MessageStatusRequest, Body(
+        openapi_examples=message_status_request)]
+) -> Response:
+    statuses = {
+        (query.channel_id, query.message_id): _age_status(query.message_id)
+        for query in body.messages
+    }
+
+    unresolved = [
+        pair
+        for pair, status in statuses.items()
+        if status is None
+    ]
+
+    if unresolved:
+        pipeline = redis.pipeline(transaction=False)
+
+        for channel_id, message_id in unresolved:
+            pipeline.exists(f'pending_proxy:{channel_id}:{message_id}')
+
+        pending, found = await gather(
+            pipeline.execute(),
+            Message.find_proxied(unresolved)
+        )
+
+        # ? a pending proxy is reported as found, same as HEAD
+        for pair, is_pending in zip(unresolved, pending, strict=True):
+            statuses[pair] = 200 if is_pending or pair in found else 404
+
+    return Response(
+        status_code=200,
+        media_type='application/json',
+        content=dumps([
+            MessageStatusModel(
+                channel_id=str(query.channel_id),
+                message_id=str(query.message_id),
+                status=statuses[query.channel_id, query.message_id]
+            ).model_dump(mode='json')
+            for query in body.messages
+        ])
+    )
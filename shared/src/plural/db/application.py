@@ -1,14 +1,10 @@
 from typing import ClassVar, Self
 from datetime import timedelta
-from secrets import token_hex
-from hashlib import sha256
-from time import time
 
 from beanie import PydanticObjectId
-from bcrypt import hashpw, gensalt
 from pydantic import Field
 
-from plural.crypto import encode_b66, TOKEN_EPOCH
+from plural.crypto import new_token
 
 from .enums import ApplicationScope
 from .base import BaseDocument
@@ -24,6 +20,9 @@ class Application(BaseDocument):
             'developer'
         ]
 
+    # ? the api caches verified tokens with their application
+    publish_invalidations: ClassVar[bool] = True
+
     id: PydanticObjectId = Field(
         default_factory=PydanticObjectId,
         description='the id of the application')
@@ -57,11 +56,7 @@ class Application(BaseDocument):
     ) -> tuple[Self, str]:
         id = PydanticObjectId()
 
-        token = '.'.join([
-            encode_b66(int.from_bytes(id.binary)),
-            encode_b66(int((time()*1000)-TOKEN_EPOCH)),
-            encode_b66(int(token_hex(20), 16))
-        ])
+        token, hashed = new_token(id)
 
         return (
             cls(
@@ -70,27 +65,17 @@ class Application(BaseDocument):
                 description=description,
                 icon=None,
                 developer=developer,
-                token=hashpw(token.encode(), gensalt()).decode(),
+                token=hashed,
                 scope=scope),
             token
         )
 
     async def update_token(self) -> str:
-        from . import redis
-
-        token = '.'.join([
-            encode_b66(int.from_bytes(self.id.binary)),
-            encode_b66(int((time()*1000)-TOKEN_EPOCH)),
-            encode_b66(int(token_hex(20), 16))
-        ])
-
-        await redis.delete(
-            'token:' + sha256(
-                '.'.join(self.token.split('.')[:2]).encode()
-            ).hexdigest()
-        )
-
-        self.token = hashpw(token.encode(), gensalt()).decode()
+        # ? saving publishes an invalidation, revoking the old token
+        # ? everywhere it was cached, verified tokens in redis are
+        # ? tied to the old hash, so they stop matching too
+        # ? old format tokens are replaced with v2 ones, if a key is set
+        token, self.token = new_token(self.id)
 
         await self.save()
 
@@ -33,3 +33,11 @@ class Autoproxy(BaseDocument):
         description='the member to proxy to')
     ts: datetime | None = Field(
         description='time when autoproxy will expire; None if never')
+
+    publish_invalidations: ClassVar[bool] = True
+
+    def invalidation_targets(self) -> list[tuple[str, str]]:
+        return [
+            *super().invalidation_targets(),
+            ('usergroups', str(self.user))
+        ]
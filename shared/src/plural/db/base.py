@@ -1,12 +1,14 @@
 from collections import OrderedDict
 from datetime import timedelta
-from typing import Self, Any
+from typing import ClassVar, Self, Any
 from functools import wraps
 
 from beanie.odm.cache import CachedItem
 from pymongo import IndexModel
 from beanie import Document
 
+from .invalidation import publish_invalidation
+
 
 def ttl(
     days: float | int = 0,
@@ -58,6 +60,14 @@ def invalidate_cache(
 
 
 class BaseDocument(Document):
+    # ? when true, saves and deletes are published to other processes
+    # ? so they can drop anything derived from this document
+    publish_invalidations: ClassVar[bool] = False
+
+    def invalidation_targets(self) -> list[tuple[str, str]]:
+        """(collection, id) pairs published when this document changes"""
+        return [(self.get_collection_name(), str(self.id))]
+
     @wraps(Document.save)
     async def save(
         self,
@@ -72,4 +82,22 @@ class BaseDocument(Document):
                 self.id
             )
 
-        return await super().save(*args, **kwargs)
+        result = await super().save(*args, **kwargs)
+
+        if self.publish_invalidations:
+            await publish_invalidation(*self.invalidation_targets())
+
+        return result
+
+    @wraps(Document.delete)
+    async def delete(
+        self,
+        *args,  # noqa: ANN002
+        **kwargs  # noqa: ANN003
+    ) -> Any:  # noqa: ANN401
+        result = await super().delete(*args, **kwargs)
+
+        if self.publish_invalidations:
+            await publish_invalidation(*self.invalidation_targets())
+
+        return result
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from asyncio import Task, TimerHandle, create_task, gather, get_running_loop, sleep
+from typing import TYPE_CHECKING
+
+from pymongo.errors import BulkWriteError
+
+from plural.otel import span
+
+from .proxy_log import ProxyLog
+from .message import Message
+
+if TYPE_CHECKING:
+    from .base import BaseDocument
+
+
+__all__ = (
+    'MESSAGES',
+    'PROXY_LOGS',
+    'InsertBuffer',
+    'flush_buffers',
+)
+
+
+class InsertBuffer[T: BaseDocument]:
+    """
+    coalesces inserts into a single insert_many, sent once `size`
+    documents are waiting or `delay` seconds after the first one
+
+    documents that have to be readable before they reach mongo
+    should be written somewhere else too, e.g. `Message.index`
+    """
+
+    def __init__(
+        self,
+        document: type[T],
+        size: int = 100,
+        delay: float = 0.005
+    ) -> None:
+        self.document = document
+        self.size = size
+        self.delay = delay
+        self.pending: list[T] = []
+        self._timer: TimerHandle | None = None
+        self._flushing: set[Task] = set()
+
+    def insert(self, document: T) -> None:
+        self.pending.append(document)
+
+        if len(self.pending) >= self.size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = get_running_loop().call_later(
+                self.delay,
+                self._start_flush)
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self.pending:
+            return
+
+        documents, self.pending = self.pending, []
+
+        task = create_task(self._insert(documents))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _insert(self, documents: list[T]) -> None:
+        with span(
+            f'inserting {len(documents)} {self.document.get_collection_name()}'
+        ) as current_span:
+            try:
+                await self.document.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                # ? duplicates won't succeed on retry, anything else was inserted
+                current_span.record_exception(e)
+            except Exception as e:  # noqa: BLE001
+                current_span.record_exception(e)
+                await sleep(0.5)
+
+                try:
+                    await self.document.insert_many(documents, ordered=False)
+                except Exception as e:  # noqa: BLE001
+                    current_span.record_exception(e)
+
+    async def flush(self) -> None:
+        self._start_flush()
+
+        while self._flushing:
+            await gather(*self._flushing, return_exceptions=True)
+
+
+MESSAGES = InsertBuffer(Message)
+
+PROXY_LOGS = InsertBuffer(ProxyLog)
+
+
+async def flush_buffers() -> None:
+    await gather(
+        MESSAGES.flush(),
+        PROXY_LOGS.flush()
+    )
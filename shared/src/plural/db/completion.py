@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from asyncio import Future, get_running_loop, sleep
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from redis.exceptions import ConnectionError
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from redis.asyncio.client import Pipeline
+
+    from .message import Message
+
+
+__all__ = (
+    'COMPLETION_CHANNEL',
+    'PROXY_COMPLETIONS',
+    'ProxyCompletions',
+    'publish_proxy_completion',
+)
+
+
+COMPLETION_CHANNEL = 'plural:proxy_complete'
+
+
+def publish_proxy_completion(
+    pipeline: Pipeline,
+    message: Message
+) -> None:
+    """
+    notify anyone waiting on the original message that its proxy was saved,
+    should be in the same pipeline as `Message.index`, so it can be read
+    as soon as this is received
+    """
+    pipeline.publish(
+        COMPLETION_CHANNEL,
+        f'{message.channel_id}:{message.original_id}'
+    )
+
+
+class ProxyCompletions:
+    """
+    waiters for pending proxies, every request waiting on the same message
+    shares one future, resolved by a single pubsub listener per process
+    """
+
+    def __init__(self) -> None:
+        self._waiters: dict[tuple[int, int], tuple[Future[None], int]] = {}
+
+    @contextmanager
+    def waiter(
+        self,
+        channel_id: int,
+        message_id: int
+    ) -> Iterator[Future[None]]:
+        """
+        a future resolved when the proxy of the message completes,
+        entered before checking for the message, so a completion
+        in between isn't missed
+        """
+        key = (channel_id, message_id)
+
+        future, count = self._waiters.get(key) or (
+            get_running_loop().create_future(), 0)
+        self._waiters[key] = (future, count + 1)
+
+        try:
+            yield future
+        finally:
+            future, count = self._waiters[key]
+
+            if count > 1:
+                self._waiters[key] = (future, count - 1)
+            else:
+                del self._waiters[key]
+                future.cancel()
+
+    def complete(
+        self,
+        channel_id: int,
+        message_id: int
+    ) -> None:
+        waiter = self._waiters.get((channel_id, message_id))
+
+        if waiter is not None and not waiter[0].done():
+            waiter[0].set_result(None)
+
+    async def listen(self) -> None:
+        from . import redis
+
+        while True:
+            try:
+                async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(COMPLETION_CHANNEL)
+
+                    async for message in pubsub.listen():
+                        channel_id, message_id = message['data'].split(':', 1)
+
+                        if message_id.isdigit():
+                            self.complete(int(channel_id), int(message_id))
+            except ConnectionError:
+                # ? waiters check mongo again once they time out
+                await sleep(1)
+
+
+PROXY_COMPLETIONS = ProxyCompletions()
@@ -80,6 +80,17 @@ class Group(BaseDocument):
         description='the members of the group'
     )
 
+    publish_invalidations: ClassVar[bool] = True
+
+    def invalidation_targets(self) -> list[tuple[str, str]]:
+        # ? new groups aren't in anything derived yet,
+        # ? so the owner and sharees are invalidated too
+        return [
+            *super().invalidation_targets(),
+            ('usergroups', str(self.account)),
+            *(('users', str(user_id)) for user_id in self.users)
+        ]
+
     @property
     def avatar_url(self) -> str | None:
         return env.avatar_url.format(
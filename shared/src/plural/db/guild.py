@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import Self
+from typing import ClassVar, Self
 
 from pydantic import Field, BaseModel
 
@@ -13,6 +13,8 @@ class Guild(BaseDocument):
         use_cache = True
         cache_expiration_time = timedelta(milliseconds=500)
 
+    publish_invalidations: ClassVar[bool] = True
+
     class Config(BaseModel):
         logclean: bool = Field(
             default=False,
@@ -44,3 +46,18 @@ class Guild(BaseDocument):
                 id=guild_id
             ).save()
         )
+
+    @classmethod
+    async def logclean_guild_ids(cls) -> set[int]:
+        return {
+            guild.id
+            for guild in
+            await Guild.find(
+                {'config.logclean': True},
+                projection_model=IdOnlyGuild
+            ).to_list()
+        }
+
+
+class IdOnlyGuild(BaseModel):
+    id: int = Field(alias='_id')
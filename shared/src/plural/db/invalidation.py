@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from traceback import print_exc
+from asyncio import sleep
+
+from redis.exceptions import ConnectionError
+
+from plural.env import INSTANCE
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from redis.asyncio.client import Pipeline
+
+
+__all__ = (
+    'INVALIDATION_CHANNEL',
+    'invalidation_listener',
+    'on_invalidate',
+    'publish_invalidation',
+    'track_derived',
+)
+
+
+INVALIDATION_CHANNEL = 'plural:invalidate'
+INVALIDATE_SCRIPT = '''
+for index, key in ipairs(KEYS) do
+    local derived = redis.call('SMEMBERS', key)
+    if #derived > 0 then
+        redis.call('DEL', unpack(derived))
+    end
+    redis.call('DEL', key)
+    redis.call('PUBLISH', ARGV[1], ARGV[2] .. ':' .. ARGV[index + 2])
+end
+'''
+
+_LISTENERS: dict[str, list[Callable[[str], None]]] = {}
+
+
+def on_invalidate(
+    collection: str
+) -> Callable[[Callable[[str], None]], Callable[[str], None]]:
+    """
+    register a callback that receives the id of every document in
+    `collection` that was saved or deleted, in any process
+
+    the id is `*` when every document should be considered stale
+    """
+    def decorator(function: Callable[[str], None]) -> Callable[[str], None]:
+        _LISTENERS.setdefault(collection, []).append(function)
+        return function
+
+    return decorator
+
+
+def _dispatch(collection: str, document_id: str) -> None:
+    for listener in _LISTENERS.get(collection, []):
+        try:
+            listener(document_id)
+        except Exception:  # noqa: BLE001
+            print_exc()
+
+
+def _derived_key(collection: str, document_id: str) -> str:
+    return f'invalidation:{collection}:{document_id}'
+
+
+def track_derived(
+    pipeline: Pipeline,
+    key: str,
+    targets: Iterable[tuple[str, str]],
+    expire: int
+) -> None:
+    """
+    mark the redis `key` as derived from every (collection, id) in
+    `targets`, so it's deleted when any of them are invalidated
+    """
+    for collection, document_id in targets:
+        pipeline.sadd(_derived_key(collection, document_id), key)
+        pipeline.expire(_derived_key(collection, document_id), expire)
+
+
+async def publish_invalidation(
+    *targets: tuple[str, str]
+) -> None:
+    from . import redis
+
+    # ? listeners in this process are called immediately,
+    # ? other processes get it through pubsub
+    for collection, document_id in targets:
+        _dispatch(collection, document_id)
+
+    await redis.register_script(INVALIDATE_SCRIPT)(
+        keys=[
+            _derived_key(collection, document_id)
+            for collection, document_id in targets
+        ],
+        args=[
+            INVALIDATION_CHANNEL,
+            INSTANCE,
+            *[
+                f'{collection}:{document_id}'
+                for collection, document_id in targets
+            ]
+        ]
+    )
+
+
+async def invalidation_listener() -> None:
+    from . import redis
+
+    while True:
+        try:
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                async for message in pubsub.listen():
+                    instance, collection, document_id = (
+                        message['data'].split(':', 2)
+                    )
+
+                    if instance == INSTANCE:
+                        continue
+
+                    _dispatch(collection, document_id)
+        except ConnectionError:
+            # ? anything cached while disconnected may be stale
+            for collection in _LISTENERS:
+                _dispatch(collection, '*')
+
+            await sleep(1)
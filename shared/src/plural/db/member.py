@@ -35,6 +35,8 @@ class ProxyMember(BaseDocument):
             'avatar'
         ]
 
+    publish_invalidations: ClassVar[bool] = True
+
     def __eq__(self, other: object) -> bool:
         return isinstance(other, type(self)) and self.id == other.id
 
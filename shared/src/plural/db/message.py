@@ -1,11 +1,23 @@
+from __future__ import annotations
+
 from datetime import datetime, timedelta, UTC
-from typing import ClassVar
+from typing import ClassVar, Self, TYPE_CHECKING
 
 from beanie import PydanticObjectId
-from pydantic import Field
+from pydantic import BaseModel, Field
+from orjson import dumps, loads
 
 from .base import BaseDocument, ttl
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from redis.asyncio.client import Pipeline
+
+
+# ? matches the ttl index, so index entries expire with their documents
+INDEX_TTL = timedelta(days=7)
+
 
 class Message(BaseDocument):
     class Settings:
@@ -61,3 +73,162 @@ class Message(BaseDocument):
         return (
             self.ts.replace(tzinfo=UTC) + timedelta(minutes=14, seconds=30)
         ) < datetime.now(UTC)
+
+    def index(self, pipeline: Pipeline) -> None:
+        """
+        write the message to the redis index, by original and proxy id,
+        so it can be found without mongo (and before a buffered insert)
+        """
+        expires = int((
+            self.ts.replace(tzinfo=UTC) + INDEX_TTL - datetime.now(UTC)
+        ).total_seconds())
+
+        if expires <= 0:
+            return
+
+        entry = dumps([
+            str(self.id),
+            self.original_id,
+            self.proxy_id,
+            self.author_id,
+            str(self.user),
+            self.channel_id,
+            str(self.member_id),
+            self.reason,
+            self.webhook_id,
+            self.reference_id,
+            self.ts.isoformat()
+        ])
+
+        for message_id in (self.original_id, self.proxy_id):
+            if message_id is not None:
+                pipeline.set(f'message_index:{message_id}', entry, ex=expires)
+
+    @classmethod
+    async def find_indexed(
+        cls,
+        channel_id: int,
+        message_id: int
+    ) -> Self | None:
+        from . import redis
+
+        if (entry := await redis.get(f'message_index:{message_id}')) is None:
+            return None
+
+        (
+            id_, original_id, proxy_id, author_id, user, channel_id_,
+            member_id, reason, webhook_id, reference_id, ts
+        ) = loads(entry)
+
+        if channel_id_ != channel_id:
+            return None
+
+        return cls(
+            id=id_,
+            original_id=original_id,
+            proxy_id=proxy_id,
+            author_id=author_id,
+            user=user,
+            channel_id=channel_id_,
+            member_id=member_id,
+            reason=reason,
+            webhook_id=webhook_id,
+            reference_id=reference_id,
+            ts=ts
+        )
+
+    @classmethod
+    async def find_proxied(
+        cls,
+        ids: Sequence[tuple[int, int]]
+    ) -> set[tuple[int, int]]:
+        """
+        which (channel id, message id) pairs are messages, by original or
+        proxy id, from the redis index, then a single mongo query
+        """
+        from . import redis
+
+        if not ids:
+            return set()
+
+        found = {
+            (channel_id, message_id)
+            for (channel_id, message_id), entry in zip(
+                ids,
+                await redis.mget([
+                    f'message_index:{message_id}'
+                    for _, message_id in ids]),
+                strict=True)
+            # ? the sixth field of an index entry is the channel id
+            if entry is not None and loads(entry)[5] == channel_id
+        }
+
+        if not (missing := [pair for pair in ids if pair not in found]):
+            return found
+
+        message_ids = list({message_id for _, message_id in missing})
+
+        async for message in cls.find({
+            '$or': [
+                {'original_id': {'$in': message_ids}},
+                {'proxy_id': {'$in': message_ids}}
+            ]},
+            projection_model=MessageIds
+        ):
+            found.add((message.channel_id, message.proxy_id))
+
+            if message.original_id is not None:
+                found.add((message.channel_id, message.original_id))
+
+        return found.intersection(ids)
+
+    @classmethod
+    async def find_by_id(
+        cls,
+        channel_id: int,
+        message_id: int
+    ) -> Self | None:
+        """by original or proxy id, from the redis index, then mongo"""
+        return (
+            await cls.find_indexed(channel_id, message_id) or
+            await cls.find_one({
+                'channel_id': channel_id,
+                '$or': [
+                    {'original_id': message_id},
+                    {'proxy_id': message_id}
+                ]
+            })
+        )
+
+    @classmethod
+    async def delete_by_author(cls, author_id: int) -> None:
+        """
+        delete every message by `author_id`, and their redis index entries,
+        which would otherwise be served until they expire
+        """
+        from . import redis
+
+        keys = [
+            f'message_index:{message_id}'
+            async for message in cls.find(
+                {'author_id': author_id},
+                projection_model=MessageIds)
+            for message_id in (message.original_id, message.proxy_id)
+            if message_id is not None
+        ]
+
+        if keys:
+            pipeline = redis.pipeline()
+
+            for index in range(0, len(keys), 1000):
+                pipeline.delete(*keys[index:index + 1000])
+
+            await pipeline.execute()
+
+        await cls.find({'author_id': author_id}).delete_many()
+
+
+class MessageIds(BaseModel):
+    original_id: int | None
+    proxy_id: int
+    channel_id: int
@@ -1,14 +1,10 @@
 from typing import ClassVar, Self
 from datetime import timedelta
-from secrets import token_hex
-from hashlib import sha256
-from time import time
 
 from pydantic import BaseModel, Field
 from beanie import PydanticObjectId
-from bcrypt import hashpw, gensalt
 
-from plural.crypto import encode_b66, TOKEN_EPOCH
+from plural.crypto import new_token
 
 from .enums import ReplyFormat, SupporterTier, ApplicationScope, PaginationStyle
 from .member import ProxyMember
@@ -136,6 +132,15 @@ class Usergroup(BaseDocument):
         default_factory=Data,
         description='the user data')
 
+    publish_invalidations: ClassVar[bool] = True
+
+    def invalidation_targets(self) -> list[tuple[str, str]]:
+        # ? users may have been cached as unregistered before this existed
+        return [
+            *super().invalidation_targets(),
+            *(('users', str(user_id)) for user_id in self.users)
+        ]
+
     @classmethod
     async def get_by_user(
         cls,
@@ -179,26 +184,8 @@ class Usergroup(BaseDocument):
         return len(avatars)
 
     async def update_token(self) -> str:
-        from . import redis
-
-        token = '.'.join([
-            encode_b66(int.from_bytes(self.id.binary)),
-            encode_b66(int((time()*1000)-TOKEN_EPOCH)),
-            encode_b66(int(token_hex(20), 16))
-        ])
-
-        if self.data.selfhosting_token:
-            await redis.delete(
-                'token:' + sha256(
-                    '.'.join(self.data.selfhosting_token.split(
-                        '.')[:2]).encode()
-                ).hexdigest()
-            )
-
-        self.data.selfhosting_token = hashpw(
-            token.encode(),
-            gensalt()
-        ).decode()
+        # ? the save below revokes the old token, see Application.update_token
+        token, self.data.selfhosting_token = new_token(self.id)
 
         await self.save()
 
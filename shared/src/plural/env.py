@@ -22,6 +22,8 @@ class Env(BaseModel):
     admins: set[int]
     patreon_secret: str
     info_bot_token: str
+    context_header: bool
+    token_hmac_key: str
 
     @classmethod
     def new(cls) -> Self:
@@ -38,7 +40,9 @@ class Env(BaseModel):
                 set(map(int, environ.get('ADMINS', '').split(',')))
                 if environ.get('ADMINS') else set()),
             'patreon_secret': environ.get('PATREON_SECRET', ''),
-            'info_bot_token': environ.get('INFO_BOT_TOKEN', '')
+            'info_bot_token': environ.get('INFO_BOT_TOKEN', ''),
+            'context_header': environ.get('DISCORD_CONTEXT_HEADER', '1') != '0',
+            'token_hmac_key': environ.get('TOKEN_HMAC_KEY', '')
         })
 
     @property
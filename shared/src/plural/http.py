@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+from typing import Any, Protocol, TYPE_CHECKING
+from dataclasses import dataclass
+from urllib.parse import quote
+from time import monotonic
+from random import uniform
+from asyncio import sleep
+
+from orjson import loads, dumps
+from aiohttp import (
+    ServerDisconnectedError,
+    ClientSession,
+    TCPConnector,
+    FormData
+)
+
+from .otel import (
+    inject,
+    get_counter,
+    get_histogram,
+    get_up_down_counter
+)
+from .errors import (
+    InteractionError,
+    HTTPException,
+    Unauthorized,
+    ServerError,
+    BadRequest,
+    Forbidden,
+    NotFound
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from opentelemetry.metrics import Counter, Histogram, UpDownCounter
+
+
+__all__ = (
+    'CircuitBreaker',
+    'ClientMetrics',
+    'DiscordClient',
+    'DiscordRoute',
+    'Payload',
+    'Resettable',
+    'RetryBudget',
+)
+
+
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+# ? connection reset by peer, on macos and windows
+RESET_ERRNOS = frozenset({54, 10054})
+
+
+class DiscordRoute(Protocol):
+    method: str
+    url: str
+    token: str | None
+    silent: bool
+    # ? method and unformatted path, routes in a bucket share a circuit breaker
+    bucket: str
+
+
+class Resettable(Protocol):
+    def reset(self) -> None: ...
+
+
+@dataclass(frozen=True, slots=True)
+class Payload:
+    """
+    request body, json is encoded once, multipart bodies are rebuilt
+    on every attempt so files are streamed from their own buffers
+    """
+    body: Any
+    content_type: str | None = None
+    form: tuple[dict[str, Any], ...] | None = None
+
+    @classmethod
+    def encode(
+        cls,
+        json: dict[str, Any] | list[Any] | None = None,
+        data: Any | None = None,  # noqa: ANN401
+        form: Iterable[dict[str, Any]] | None = None
+    ) -> Payload:
+        if sum((json is not None, data is not None, form is not None)) > 1:
+            raise InteractionError('json, data, and form are mutually exclusive')
+
+        if json is not None:
+            return cls(dumps(json), 'application/json')
+
+        if form:
+            # ? payload_json is already encoded by the caller,
+            # ? files stay as streams, which may be spooled to disk
+            return cls(None, form=tuple(form))
+
+        return cls(data)
+
+    def data(self) -> Any:  # noqa: ANN401
+        if self.form is None:
+            return self.body
+
+        form_data = FormData(quote_fields=False)
+        for param in self.form:
+            form_data.add_field(**param)
+
+        return form_data
+
+
+@dataclass(frozen=True, slots=True)
+class ClientMetrics:
+    requests: Counter
+    retries: Counter
+    retry_budget_exhausted: Counter
+    circuit_rejections: Counter
+    in_flight: UpDownCounter
+    saturation: Histogram
+
+    @classmethod
+    def create(cls) -> ClientMetrics:
+        return cls(
+            requests=get_counter('discord.requests'),
+            retries=get_counter('discord.retries'),
+            retry_budget_exhausted=get_counter('discord.retry_budget_exhausted'),
+            circuit_rejections=get_counter('discord.circuit_rejections'),
+            in_flight=get_up_down_counter('discord.pool.in_flight'),
+            saturation=get_histogram('discord.pool.saturation')
+        )
+
+
+class RetryBudget:
+    """
+    retries allowed as a share of requests, plus a small steady allowance,
+    so an unhealthy upstream isn't sent a multiple of the normal load
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        per_second: float = 5.0,
+        max_tokens: float = 100.0
+    ) -> None:
+        self.ratio = ratio
+        self.per_second = per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._updated = monotonic()
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        now = monotonic()
+
+        self.tokens = min(
+            self.max_tokens,
+            self.tokens + (now - self._updated) * self.per_second
+        )
+        self._updated = now
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    opened after `threshold` consecutive server errors on a route,
+    once `cooldown` has passed a single request is let through to probe it
+    """
+
+    def __init__(
+        self,
+        threshold: int = 5,
+        cooldown: float = 10.0
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probed_at: float | None = None
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+
+        now = monotonic()
+
+        if now - self.opened_at < self.cooldown:
+            return False
+
+        # ? a probe that never finished (e.g. cancelled) expires after a cooldown
+        if self._probed_at is not None and now - self._probed_at < self.cooldown:
+            return False
+
+        self._probed_at = now
+        return True
+
+    def succeeded(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probed_at = None
+
+    def failed(self) -> None:
+        self.failures += 1
+        self._probed_at = None
+
+        if self.failures >= self.threshold:
+            self.opened_at = monotonic()
+
+
+class DiscordClient:
+    """
+    discord api client shared by the bot and the api
+
+    one pooled session with cached dns and kept-alive connections,
+    retries of server errors with jittered backoff from a shared budget,
+    and a circuit breaker per route
+    """
+
+    def __init__(
+        self,
+        user_agent: str,
+        *,
+        limit: int = 512,
+        limit_per_host: int = 256,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 60.0,
+        max_attempts: int = 5,
+        max_backoff: float = 8.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 10.0
+    ) -> None:
+        self.user_agent = user_agent
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.budget = RetryBudget()
+        self.in_flight = 0
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._session: ClientSession | None = None
+        self._metrics: ClientMetrics | None = None
+
+    @property
+    def metrics(self) -> ClientMetrics:
+        # ? the otel resource is set after import, so instruments are made on first use
+        if self._metrics is None:
+            self._metrics = ClientMetrics.create()
+
+        return self._metrics
+
+    @property
+    def session(self) -> ClientSession:
+        # ? connectors need a running loop, so the session is made on first use
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_ttl,
+                    keepalive_timeout=self.keepalive_timeout),
+                headers={'User-Agent': self.user_agent}
+            )
+
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    def breaker(self, bucket: str) -> CircuitBreaker:
+        if (breaker := self._breakers.get(bucket)) is None:
+            breaker = self._breakers[bucket] = CircuitBreaker(
+                self.breaker_threshold,
+                self.breaker_cooldown
+            )
+
+        return breaker
+
+    def backoff(self, attempt: int) -> float:
+        return uniform(0, min(self.max_backoff, 2 ** attempt))
+
+    async def _retry(
+        self,
+        route: DiscordRoute,
+        attempt: int,
+        reason: str
+    ) -> bool:
+        if attempt + 1 >= self.max_attempts:
+            return False
+
+        if not self.budget.withdraw():
+            self.metrics.retry_budget_exhausted.add(
+                1, {'route': route.bucket})
+            return False
+
+        self.metrics.retries.add(
+            1, {'route': route.bucket, 'reason': reason})
+
+        await sleep(self.backoff(attempt))
+
+        return True
+
+    async def request(
+        self,
+        route: DiscordRoute,
+        files: Sequence[Resettable] | None = None,
+        form: Iterable[dict[str, Any]] | None = None,
+        json: dict[str, Any] | list[Any] | None = None,
+        data: Any | None = None,  # noqa: ANN401
+        reason: str | None = None,
+        params: dict[str, Any] | None = None,
+        context: str | None = None,
+        **request_kwargs  # noqa: ANN003
+    ) -> dict[str, Any] | str | None:
+        headers: dict[str, str] = {}
+
+        if context is not None:
+            headers['X-Context'] = context
+
+        if route.token is not None:
+            headers['Authorization'] = f'Bot {route.token}'
+
+        if route.silent:
+            headers['X-Suppress-Tracer'] = '1'
+
+        if reason:
+            headers['X-Audit-Log-Reason'] = quote(reason, safe='/ ')
+
+        payload = Payload.encode(json, data, form)
+
+        if payload.content_type is not None:
+            headers['Content-Type'] = payload.content_type
+
+        breaker = self.breaker(route.bucket)
+        self.budget.deposit()
+
+        metrics = self.metrics
+        metrics.requests.add(1, {'route': route.bucket})
+
+        error: HTTPException | None = None
+
+        for attempt in range(self.max_attempts):
+            if not breaker.allow():
+                metrics.circuit_rejections.add(
+                    1, {'route': route.bucket})
+                raise error or ServerError({
+                    'message': f'circuit open for {route.bucket}'})
+
+            for f in files or ():
+                f.reset()
+
+            self.in_flight += 1
+            metrics.in_flight.add(1)
+            metrics.saturation.record(
+                self.in_flight / self.limit_per_host)
+
+            try:
+                async with self.session.request(
+                    route.method,
+                    route.url,
+                    headers=inject(headers.copy()),
+                    data=payload.data(),
+                    params=params,
+                    **request_kwargs
+                ) as response:
+                    resp_data = (
+                        loads(await response.read())
+                        if response.headers.get('Content-Type') == 'application/json'
+                        else await response.text()
+                    )
+            except (OSError, ServerDisconnectedError) as e:
+                if (
+                    isinstance(e, OSError) and
+                    e.errno not in RESET_ERRNOS
+                ):
+                    raise
+
+                breaker.failed()
+
+                if await self._retry(route, attempt, type(e).__name__):
+                    continue
+
+                raise
+            finally:
+                self.in_flight -= 1
+                metrics.in_flight.add(-1)
+
+            if response.status in RETRY_STATUSES:
+                breaker.failed()
+                error = ServerError(resp_data)
+
+                if await self._retry(route, attempt, str(response.status)):
+                    continue
+
+                raise error
+
+            breaker.succeeded()
+
+            if 300 > response.status >= 200:
+                return resp_data
+
+            match response.status:
+                case 429:
+                    raise NotImplementedError(
+                        'encountered 429 but rate limiting is handled by the egress proxy')
+                case 400:
+                    raise BadRequest(resp_data)
+                case 401:
+                    raise Unauthorized(resp_data)
+                case 403:
+                    raise Forbidden(resp_data)
+                case 404:
+                    raise NotFound(resp_data)
+                case _ if response.status >= 500:
+                    raise ServerError(resp_data)
+                case _:
+                    raise HTTPException(resp_data)
+
+        raise RuntimeError('unreachable code in http handling')
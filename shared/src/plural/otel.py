@@ -31,8 +31,11 @@ from opentelemetry.sdk.metrics.export import (
     PeriodicExportingMetricReader
 )
 from opentelemetry.sdk.metrics import (
+    UpDownCounter,
     MeterProvider,
-    Counter
+    Histogram,
+    Counter,
+    Meter
 )
 from opentelemetry.metrics import (
     get_meter as _get_meter,
@@ -132,11 +135,23 @@ def get_tracer(name: str | None = None) -> Tracer:
     return _get_tracer(name or '')
 
 
-def get_counter(name: str) -> Counter:
+def get_meter() -> Meter:
     return _get_meter(
         otel_resource.attributes.get('service.name'),
         otel_resource.attributes.get('service.version')
-    ).create_counter(name)
+    )
+
+
+def get_counter(name: str) -> Counter:
+    return get_meter().create_counter(name)
+
+
+def get_up_down_counter(name: str) -> UpDownCounter:
+    return get_meter().create_up_down_counter(name)
+
+
+def get_histogram(name: str, unit: str = '') -> Histogram:
+    return get_meter().create_histogram(name, unit)
 
 
 def span(
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 from asyncio import create_task
+from sys import _getframe
+from os.path import relpath
 
 if TYPE_CHECKING:
     from collections.abc import Coroutine
@@ -9,10 +11,14 @@ if TYPE_CHECKING:
 
 
 __all__ = (
+    'call_site',
     'create_strong_task',
 )
 
 
+_CALL_SITES: dict[tuple[str, int], str] = {}
+
+
 def create_strong_task(coroutine: Coroutine) -> Task:
     """
     create a task that will not be cancelled by the event loop
@@ -24,3 +30,24 @@ def create_strong_task(coroutine: Coroutine) -> Task:
     task.add_done_callback(tasks.discard)
 
     return task
+
+
+def call_site(depth: int = 1) -> str:
+    """
+    `file:line function` of the frame `depth` levels above the caller,
+    resolved once per code location
+    """
+    try:
+        frame = _getframe(depth + 1)
+    except ValueError:
+        return 'unknown'
+
+    # ? code objects are slow to hash, filenames cache theirs
+    key = (frame.f_code.co_filename, frame.f_lineno)
+
+    if (site := _CALL_SITES.get(key)) is None:
+        site = _CALL_SITES[key] = (
+            f'{relpath(key[0])}:{key[1]} {frame.f_code.co_name}'
+        ).removeprefix('src/')
+
+    return site